@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import time
+from collections import Counter
+from types import SimpleNamespace
+import numpy as np
+from benchmarks.synthetic_corpus import SyntheticCorpus
+from providers.vector_store import VectorStore
+
+# Modules of the vector index, in the order their embeddings are derived from a trial
+INDEX_MODULES = ["eligibilityModule", "conditionsModule", "outcomesModule", "identificationModule"]
+
+
+class FakeOpenAIClient:
+    """
+    Stand-in for `OpenAIClient` embedding texts into the synthetic corpus, after `latency` seconds per request.
+    """
+
+    def __init__(self, corpus: SyntheticCorpus, calls: Counter, latency: float = 0.0) -> None:
+        self.corpus = corpus
+        self.calls = calls
+        self.latency = latency
+
+    async def generate_embeddings_async(self, text: str, model: str = "text-embedding-3-small") -> dict:
+        self.calls["openai.embeddings"] += 1
+        await asyncio.sleep(self.latency)
+        return {"success": True, "message": "Successfully generated embedding.",
+                "data": self.corpus.text_embedding(text).reshape(1, -1)}
+
+    async def generate_batch_embeddings_async(self, texts: list[str], model: str = "text-embedding-3-small") -> dict:
+        self.calls["openai.embeddings"] += 1
+        self.calls["openai.embedded_texts"] += len(texts)
+        await asyncio.sleep(self.latency)
+        return {"success": True, "message": f"Successfully generated {len(texts)} embeddings.",
+                "data": np.array([self.corpus.text_embedding(text) for text in texts])}
+
+
+class FakeVectorStore(VectorStore):
+    """
+    Stand-in for the Pinecone index over the synthetic corpus, answering after `latency` seconds per query.
+
+    A query is answered from the topic closest to the query vector: `k` trials of that topic are
+    drawn with a generator seeded by the vector, and scored with their cosine similarity to it. Only
+    the `module` filter is applied.
+    """
+
+    def __init__(self, corpus: SyntheticCorpus, calls: Counter, latency: float = 0.0) -> None:
+        self.corpus = corpus
+        self.calls = calls
+        self.latency = latency
+        self.index_name = f"synthetic-{corpus.trials}"
+
+    def _matches(self, vector, filters: dict, k: int, include_values: bool) -> dict:
+        query = np.asarray(vector, dtype=np.float64)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        topic = int(np.argmax(self.corpus.centers @ query))
+        seed = int.from_bytes(hashlib.sha256(query.tobytes()).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+
+        module = (filters or {}).get("module", {}).get("$eq")
+        topic_rows = self.corpus.topic_rows(topic)
+        picks = rng.choice(topic_rows, min(k, topic_rows), replace=False) if topic_rows else []
+        matches = []
+        for pick in picks:
+            row = topic + int(pick) * self.corpus.topics
+            match_module = module or INDEX_MODULES[int(rng.integers(len(INDEX_MODULES)))]
+            values = self.corpus.trial_embedding(row, INDEX_MODULES.index(match_module)) \
+                if match_module in INDEX_MODULES else self.corpus.trial_embedding(row, 0)
+            match = {
+                "id": f"{self.corpus.nct_id(row)}#{match_module}#0",
+                "score": float(values @ query / np.linalg.norm(values)),
+                "metadata": {"nctId": self.corpus.nct_id(row), "module": match_module},
+            }
+            if include_values:
+                match["values"] = values.tolist()
+            matches.append(match)
+        matches.sort(key=lambda match: -match["score"])
+        self.calls["vector_store.matches"] += len(matches)
+        return {"matches": matches}
+
+    def query(self, vector, filters=None, k=5, include_values=True, namespace=None):
+        self.calls["vector_store.query"] += 1
+        time.sleep(self.latency)
+        return self._matches(vector, filters, k, include_values)
+
+    async def query_async(self, vector, filters=None, k=5, include_values=True, namespace=None):
+        self.calls["vector_store.query"] += 1
+        await asyncio.sleep(self.latency)
+        return self._matches(vector, filters, k, include_values)
+
+    def vector_count(self) -> int:
+        return self.corpus.trials * len(INDEX_MODULES)
+
+
+class FakeMongoDAO:
+    """
+    Stand-in for `AsyncMongoDBDAO`, serving the synthetic corpus and acknowledging every write,
+    after `latency` seconds per operation.
+
+    Reads of trial_facets, t2dm_final_data_samples_processed_embeddings and
+    t2dm_final_data_samples_processed are answered from the corpus (queries must be an
+    `{"<field>": {"$in": [...]}}` lookup); every other read finds nothing.
+    """
+
+    def __init__(self, corpus: SyntheticCorpus, calls: Counter, latency: float = 0.0) -> None:
+        self.corpus = corpus
+        self.calls = calls
+        self.latency = latency
+        self.readers = {
+            "trial_facets": corpus.facet_record,
+            "t2dm_final_data_samples_processed_embeddings": corpus.embedding_document,
+            "t2dm_final_data_samples_processed": corpus.trial_document,
+        }
+
+    async def _operation(self, name: str, collection_name: str) -> None:
+        self.calls[f"mongo.{name}:{collection_name}"] += 1
+        await asyncio.sleep(self.latency)
+
+    async def find(self, collection_name, query, projection=None):
+        await self._operation("find", collection_name)
+        reader = self.readers.get(collection_name)
+        condition = next(iter(query.values()), None) if len(query) == 1 else None
+        if reader is None or not isinstance(condition, dict) or "$in" not in condition:
+            return []
+        documents = [reader(nct_id) for nct_id in condition["$in"] if self.corpus.contains(nct_id)]
+        self.calls["mongo.documents_read"] += len(documents)
+        return documents
+
+    async def find_one(self, collection_name, query, projection=None, sort=None):
+        await self._operation("find_one", collection_name)
+        return None
+
+    async def insert(self, collection_name, document):
+        await self._operation("insert", collection_name)
+        return SimpleNamespace(inserted_id=document.get("_id"))
+
+    async def update(self, collection_name, query, update_values, upsert=False):
+        await self._operation("update", collection_name)
+        return SimpleNamespace(matched_count=1, modified_count=1)
+
+    async def upsert(self, collection_name, query, update_values, insert_values=None):
+        await self._operation("upsert", collection_name)
+        return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+
+    async def bulk_write(self, collection_name, operations, ordered=False):
+        await self._operation("bulk_write", collection_name)
+        self.calls["mongo.bulk_operations"] += len(operations)
+        return SimpleNamespace(bulk_api_result={})
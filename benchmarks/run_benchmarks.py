@@ -0,0 +1,303 @@
+"""
+Benchmarks the document search pipeline and each of its stages offline, against deterministic fakes.
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --trials 1000 100000 --repeat 20 --openai-latency 0.2 --output run.json
+    python -m benchmarks.run_benchmarks --output after.json --compare before.json
+
+OpenAI, the vector index and MongoDB are replaced with the stand-ins of `benchmarks.fakes`, serving
+a `SyntheticCorpus` of each requested size after a configurable latency per call. Every stage runs
+in isolation on the output of the previous one, computed once beforehand:
+
+    embedding            build_embedding_bundle
+    retrieval            fetch_similar_documents_using_pinecone
+    combine              combine_and_ensure_unique_documents
+    filter_enrichment    fetch_trial_filters
+    process_filters      process_filters
+    scoring              calculate_weighted_similarity_scores
+    sort                 rank_trial_documents
+    persistence          store_similar_trials_and_update_status (queueing the writes)
+    persistence_flush    flushing the queued writes
+    end_to_end           fetch_similar_trail_documents
+
+and is reported with its wall time over the timed runs (after one warm-up run), the calls made to
+each fake during one run, and the memory allocated by one extra run traced with tracemalloc. The
+search result cache is disabled. The report is written as JSON; `--compare` prints the median wall
+time ratio of every stage against an earlier report.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+import numpy as np
+from benchmarks.fakes import FakeMongoDAO, FakeOpenAIClient, FakeVectorStore
+from benchmarks.synthetic_corpus import SyntheticCorpus
+from database.trial_analysis.write_behind_queue import bookkeeping_writer
+from providers.provider_registry import provider_registry
+from trial_document_search.services.similar_trail_documents_reterival_service import fetch_similar_trail_documents
+from trial_document_search.utils.logger_setup import logger
+from trial_document_search.utils.search_result_cache import search_result_cache
+from trial_document_search.utils.similar_trial_documents_utils.build_embedding_bundle import build_embedding_bundle
+from trial_document_search.utils.similar_trial_documents_utils.calculate_weighted_similarity_scores import calculate_weighted_similarity_scores
+from trial_document_search.utils.similar_trial_documents_utils.combine_and_ensure_unique_documents import combine_and_ensure_unique_documents
+from trial_document_search.utils.similar_trial_documents_utils.fetch_similar_document_using_pinecone import fetch_similar_documents_using_pinecone
+from trial_document_search.utils.similar_trial_documents_utils.fetch_trial_filters import fetch_trial_filters
+from trial_document_search.utils.similar_trial_documents_utils.process_trial_filters import process_filters
+from trial_document_search.utils.similar_trial_documents_utils.rank_trial_documents import rank_trial_documents
+from trial_document_search.utils.similar_trial_documents_utils.store_similar_trials_and_update_status import store_similar_trials_and_update_status
+
+SEARCH_KEYS = {
+    "inclusionCriteria": "Adults aged 18 to 75 with type 2 diabetes mellitus and HbA1c between 7.0% and 10.5% on stable metformin",
+    "exclusionCriteria": "Type 1 diabetes, history of diabetic ketoacidosis, eGFR below 30 mL/min/1.73m2, pregnancy",
+    "rationale": "Evaluate whether adding a once-weekly GLP-1 receptor agonist improves glycemic control",
+    "condition": "Type 2 Diabetes Mellitus",
+    "trialOutcomes": "Change from baseline in HbA1c at week 26",
+    "title": "A Randomized Trial of a Weekly GLP-1 Receptor Agonist Added to Metformin in Type 2 Diabetes",
+}
+WEIGHTS = {"inclusionCriteria": 0.3, "exclusionCriteria": 0.2, "condition": 0.2, "title": 0.1, "trialOutcomes": 0.2}
+FILTERS = {
+    "none": {"phases": [], "locations": [], "countryLogic": "OR", "startDate": None, "endDate": None,
+             "sponsorType": None, "sampleSizeMin": None, "sampleSizeMax": None},
+    "typical": {"phases": ["PHASE2", "PHASE3", "PHASE4"], "locations": ["United States", "Canada", "Germany", "France"],
+                "countryLogic": "OR",
+                "startDate": "2005-01-01", "endDate": "2030-12-31", "sponsorType": None,
+                "sampleSizeMin": 50, "sampleSizeMax": 1500},
+}
+USER_DATA = {"ecid": "benchmark", "userName": "benchmark"}
+
+
+def _summarize(samples: list) -> dict:
+    """Summarizes wall times (seconds) in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "min": round(ordered[0] * 1000, 3),
+        "median": round(statistics.median(ordered) * 1000, 3),
+        "mean": round(statistics.fmean(ordered) * 1000, 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def _call(function, args: tuple):
+    result = function(*args)
+    return await result if asyncio.iscoroutine(result) else result
+
+
+async def measure_stage(function, make_args, calls: Counter, repeat: int) -> dict:
+    """
+    Times a stage over `repeat` runs after a warm-up run, then traces the allocations of one more run.
+
+    Args:
+        function: The stage (a function or coroutine function).
+        make_args: Returns fresh stage arguments for every run; not timed.
+        calls (Counter): Call counter shared by the fakes.
+        repeat (int): Timed runs.
+
+    Returns:
+        dict: Wall time summary (ms), calls per run, traced allocations and the size of the stage output.
+    """
+    await _call(function, make_args())
+
+    samples = []
+    for _ in range(repeat):
+        args = make_args()
+        calls_before = Counter(calls)
+        started_at = time.perf_counter()
+        result = await _call(function, args)
+        samples.append(time.perf_counter() - started_at)
+    run_calls = {name: count for name, count in (calls - calls_before).items()}
+
+    args = make_args()
+    tracemalloc.start()
+    try:
+        traced_before, _ = tracemalloc.get_traced_memory()
+        await _call(function, args)
+        traced_after, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wallMs": _summarize(samples),
+        "calls": dict(sorted(run_calls.items())),
+        "allocatedPeakBytes": traced_peak - traced_before,
+        "allocatedRetainedBytes": traced_after - traced_before,
+        "outputSize": len(result) if isinstance(result, (list, dict)) else None,
+    }
+
+
+def install_fakes(corpus: SyntheticCorpus, calls: Counter, openai_latency: float, vector_latency: float,
+                  mongo_latency: float) -> None:
+    """Points the provider registry at the fakes of a corpus."""
+    provider_registry._openai_client = FakeOpenAIClient(corpus, calls, openai_latency)
+    provider_registry._vector_store = FakeVectorStore(corpus, calls, vector_latency)
+    provider_registry._trials_dao = FakeMongoDAO(corpus, calls, mongo_latency)
+    provider_registry._app_dao = FakeMongoDAO(corpus, calls, mongo_latency)
+    provider_registry._embedding_store = None
+    provider_registry._embedding_store_loaded = True
+
+
+async def benchmark_corpus(trials: int, dimension: int, filters: dict, repeat: int, openai_latency: float,
+                           vector_latency: float, mongo_latency: float) -> dict:
+    """
+    Benchmarks every stage and the whole search over one synthetic corpus.
+
+    Returns:
+        dict: Corpus size, candidate counts and the measurements of every stage.
+    """
+    calls = Counter()
+    corpus = SyntheticCorpus(trials, dimension=dimension)
+    install_fakes(corpus, calls, openai_latency, vector_latency, mongo_latency)
+
+    # Stage inputs, computed once from the output of the previous stage
+    bundle = await build_embedding_bundle(SEARCH_KEYS)
+    criteria_documents, _ = await fetch_similar_documents_using_pinecone(SEARCH_KEYS, bundle, filters)
+    unique_documents = combine_and_ensure_unique_documents(criteria_documents)
+    enriched = (await fetch_trial_filters([dict(doc) for doc in unique_documents.values()]))["data"]
+    filtered = process_filters([dict(doc) for doc in enriched], filters)
+    scored = [dict(doc) for doc in filtered]
+    await calculate_weighted_similarity_scores(scored, SEARCH_KEYS, WEIGHTS, bundle)
+    ranked = rank_trial_documents(scored, k=100)
+    response = {"success": True, "message": "Successfully fetched similar documents extended.", "data": ranked}
+    await bookkeeping_writer.close()
+
+    async def persist():
+        await store_similar_trials_and_update_status(USER_DATA, SEARCH_KEYS | filters, ranked, response)
+
+    async def persist_and_flush():
+        await persist()
+        await bookkeeping_writer.close()
+
+    async def retrieve(*args):
+        return (await fetch_similar_documents_using_pinecone(*args))[0]
+
+    async def search():
+        return await fetch_similar_trail_documents(SEARCH_KEYS, WEIGHTS, filters, USER_DATA)
+
+    stages = {
+        "embedding": (build_embedding_bundle, lambda: (SEARCH_KEYS,)),
+        "retrieval": (retrieve, lambda: (SEARCH_KEYS, bundle, filters)),
+        "combine": (combine_and_ensure_unique_documents, lambda: (criteria_documents,)),
+        "filter_enrichment": (fetch_trial_filters, lambda: ([dict(doc) for doc in unique_documents.values()],)),
+        "process_filters": (process_filters, lambda: ([dict(doc) for doc in enriched], filters)),
+        "scoring": (calculate_weighted_similarity_scores,
+                    lambda: ([dict(doc) for doc in filtered], SEARCH_KEYS, WEIGHTS, bundle)),
+        "sort": (rank_trial_documents, lambda: (scored, 100)),
+        "persistence": (persist, tuple),
+        "persistence_flush": (persist_and_flush, tuple),
+        "end_to_end": (search, tuple),
+    }
+    results = {}
+    for name, (function, make_args) in stages.items():
+        results[name] = await measure_stage(function, make_args, calls, repeat)
+        await bookkeeping_writer.close()
+
+    return {
+        "trials": trials,
+        "candidates": {"retrieved": len(criteria_documents), "unique": len(unique_documents),
+                       "filtered": len(filtered), "ranked": len(ranked)},
+        "stages": results,
+    }
+
+
+async def run_benchmarks(trials: list, dimension: int = 1536, filters: str = "typical", repeat: int = 10,
+                         openai_latency: float = 0.0, vector_latency: float = 0.0, mongo_latency: float = 0.0,
+                         flush_interval: float = 0.0) -> dict:
+    """
+    Benchmarks the search pipeline over synthetic corpora of the given sizes.
+
+    Args:
+        trials (list): Corpus sizes.
+        dimension (int, optional): Embedding dimension. Defaults to 1536.
+        filters (str, optional): Document filters, "none" or "typical". Defaults to "typical".
+        repeat (int, optional): Timed runs per stage. Defaults to 10.
+        openai_latency (float, optional): Seconds per embeddings request. Defaults to 0.
+        vector_latency (float, optional): Seconds per vector index query. Defaults to 0.
+        mongo_latency (float, optional): Seconds per MongoDB operation. Defaults to 0.
+        flush_interval (float, optional): Write-behind batching window in seconds. Defaults to 0.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    search_result_cache.enabled = False
+    bookkeeping_writer.flush_interval = flush_interval
+    config = {"trials": trials, "dimension": dimension, "filters": filters, "repeat": repeat,
+              "openaiLatency": openai_latency, "vectorLatency": vector_latency, "mongoLatency": mongo_latency,
+              "flushInterval": flush_interval}
+    report = {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()},
+        "config": config,
+        "corpora": [],
+    }
+    for corpus_trials in trials:
+        corpus_report = await benchmark_corpus(corpus_trials, dimension, FILTERS[filters], repeat, openai_latency,
+                                               vector_latency, mongo_latency)
+        report["corpora"].append(corpus_report)
+        medians = ", ".join(f"{name} {stage['wallMs']['median']}" for name, stage in corpus_report["stages"].items())
+        print(f"{corpus_trials} trials (median ms): {medians}")
+    return report
+
+
+def compare_reports(report: dict, baseline: dict) -> None:
+    """Prints the median wall time of every stage against a baseline report."""
+    baseline_corpora = {corpus["trials"]: corpus for corpus in baseline["corpora"]}
+    for corpus in report["corpora"]:
+        baseline_corpus = baseline_corpora.get(corpus["trials"])
+        if baseline_corpus is None:
+            continue
+        print(f"{corpus['trials']} trials: stage, baseline ms, current ms, ratio")
+        for name, stage in corpus["stages"].items():
+            baseline_stage = baseline_corpus["stages"].get(name)
+            if baseline_stage is None:
+                continue
+            before, after = baseline_stage["wallMs"]["median"], stage["wallMs"]["median"]
+            ratio = f"{after / before:.2f}x" if before else "n/a"
+            print(f"  {name:<18} {before:>10.3f} {after:>10.3f} {ratio:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the document search stages against local fakes.")
+    parser.add_argument("--trials", type=int, nargs="+", default=[1000, 10000, 100000], help="Corpus sizes")
+    parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--filters", choices=sorted(FILTERS), default="typical", help="Document filters")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per stage")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="Seconds per embeddings request")
+    parser.add_argument("--vector-latency", type=float, default=0.0, help="Seconds per vector index query")
+    parser.add_argument("--mongo-latency", type=float, default=0.0, help="Seconds per MongoDB operation")
+    parser.add_argument("--flush-interval", type=float, default=0.0, help="Write-behind batching window in seconds")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Earlier JSON report to compare against")
+    parser.add_argument("--log-level", default="WARNING", help="Level of the search pipeline logger")
+    args = parser.parse_args()
+
+    logger.setLevel(args.log_level.upper())
+    for handler in logger.handlers:
+        handler.setLevel(args.log_level.upper())
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_benchmarks(
+        trials=args.trials, dimension=args.dimension, filters=args.filters, repeat=args.repeat,
+        openai_latency=args.openai_latency, vector_latency=args.vector_latency, mongo_latency=args.mongo_latency,
+        flush_interval=args.flush_interval,
+    ))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare_reports(report, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import hashlib
+import numpy as np
+from database.embedding_store.local_embedding_store import EMBEDDING_SECTIONS
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import (
+    PHASE_CODES, SPONSOR_CODES, encode_trial_facets
+)
+
+COUNTRIES = ["United States", "Canada", "Germany", "France", "United Kingdom", "Spain", "Italy", "India", "China",
+             "Japan", "Brazil", "Mexico", "Australia", "Poland", "Netherlands", "South Africa"]
+PHASES = [phase for phase in PHASE_CODES if phase != "Unknown"]
+SPONSOR_TYPES = [sponsor for sponsor in SPONSOR_CODES if sponsor not in ("Unknown", "UNKNOWN")]
+
+
+class SyntheticCorpus:
+    """
+    A deterministic synthetic trial corpus, generated on demand so that 100k trials fit in memory.
+
+    Trials are spread over `topics` clusters: the embeddings of trial `row` are the center of
+    topic `row % topics` plus a noise vector drawn from a fixed table, and a text is embedded into
+    the topic its hash selects. Search texts therefore retrieve trials with realistic (high,
+    clustered) cosine scores. Facets are drawn from a generator seeded by the row. The same seed
+    always yields the same corpus. Generated documents are memoized, so that repeated benchmark runs
+    measure the pipeline rather than the generator.
+    """
+
+    def __init__(self, trials: int, dimension: int = 1536, topics: int = 64, noise_scale: float = 0.6,
+                 seed: int = 0) -> None:
+        """
+        Args:
+            trials (int): Number of trials.
+            dimension (int, optional): Embedding dimension. Defaults to 1536.
+            topics (int, optional): Number of topic clusters. Defaults to 64.
+            noise_scale (float, optional): Noise added to the topic centers (1.0 is as long as a center).
+            seed (int, optional): Random seed. Defaults to 0.
+        """
+        self.trials = trials
+        self.dimension = dimension
+        self.topics = topics
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.centers = self._normalize(rng.normal(size=(topics, dimension)))
+        self.noise = self._normalize(rng.normal(size=(4096, dimension))) * noise_scale
+        self.documents = {}
+
+    def _memoized(self, kind: str, nct_id: str, build) -> dict:
+        key = (kind, nct_id)
+        if key not in self.documents:
+            self.documents[key] = build(nct_id)
+        return self.documents[key]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+    @staticmethod
+    def nct_id(row: int) -> str:
+        return f"NCT{row:08d}"
+
+    @staticmethod
+    def row(nct_id: str) -> int:
+        return int(nct_id[3:])
+
+    def contains(self, nct_id: str) -> bool:
+        return nct_id.startswith("NCT") and nct_id[3:].isdigit() and self.row(nct_id) < self.trials
+
+    def topic_rows(self, topic: int) -> int:
+        """Number of trials in a topic (rows topic, topic + topics, ...)."""
+        return max(0, (self.trials - topic + self.topics - 1) // self.topics)
+
+    def text_embedding(self, text: str) -> np.ndarray:
+        """Embeds a text next to the center of the topic its hash selects."""
+        digest = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return self.centers[digest % self.topics] + self.noise[(digest >> 16) % len(self.noise)]
+
+    def trial_embedding(self, row: int, section: int) -> np.ndarray:
+        """Embedding of section `section` (an index into EMBEDDING_SECTIONS or a module) of a trial."""
+        return self.centers[row % self.topics] + self.noise[(row * 7 + section * 131) % len(self.noise)]
+
+    def embedding_document(self, nct_id: str) -> dict:
+        """The t2dm_final_data_samples_processed_embeddings document of a trial."""
+        return self._memoized("embeddings", nct_id, lambda nct_id: {"nctId": nct_id, **{
+            section: self.trial_embedding(self.row(nct_id), position).tolist()
+            for position, section in enumerate(EMBEDDING_SECTIONS)
+        }})
+
+    def facets(self, nct_id: str) -> dict:
+        """Facets of a trial, as returned by `extract_trial_facets`."""
+        return self._memoized("facets", nct_id, self._generate_facets)
+
+    def _generate_facets(self, nct_id: str) -> dict:
+        rng = np.random.default_rng((self.seed, self.row(nct_id)))
+        start_year = int(rng.integers(2000, 2024))
+        return {
+            "locations": [COUNTRIES[index] for index in rng.choice(len(COUNTRIES), int(rng.integers(1, 4)), replace=False)],
+            "phases": [PHASES[int(rng.integers(len(PHASES)))]],
+            "enrollmentCount": int(rng.integers(10, 2000)),
+            "startDate": f"{start_year}-{int(rng.integers(1, 13)):02d}-01",
+            "endDate": f"{start_year + int(rng.integers(1, 6))}-{int(rng.integers(1, 13)):02d}",
+            "sponsorType": SPONSOR_TYPES[int(rng.integers(len(SPONSOR_TYPES)))],
+        }
+
+    def facet_record(self, nct_id: str) -> dict:
+        """The trial_facets record of a trial."""
+        return self._memoized("facet_record", nct_id, lambda nct_id: encode_trial_facets(nct_id, self.facets(nct_id)))
+
+    def trial_document(self, nct_id: str) -> dict:
+        """A small t2dm_final_data_samples_processed document, as returned when results are hydrated."""
+        return self._memoized("trial", nct_id, lambda nct_id: {
+            "nctId": nct_id, "officialTitle": f"Synthetic trial {nct_id}", **self.facets(nct_id)
+        })
@@ -0,0 +1,144 @@
+"""
+Exports t2dm_final_data_samples_processed_embeddings into a versioned, memory-mapped embedding store.
+
+Usage:
+    python -m database.embedding_store.build_embedding_store --output /data/embedding_store
+    python -m database.embedding_store.build_embedding_store --output /data/embedding_store --version 2025-04-01 --no-activate
+
+The new version is written to a temporary directory, renamed into place once complete and then
+made current, so a running service never sees a half-written store.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import numpy as np
+from dotenv import load_dotenv
+from database.mongo_db_connection import MongoDBDAO
+from database.embedding_store.vector_encoding import decode_vector
+from database.embedding_store.local_embedding_store import (
+    EMBEDDING_SECTIONS, MANIFEST_FILE, NCT_IDS_FILE, PRESENT_FILE, CURRENT_FILE
+)
+
+
+def build_embedding_store(output: str, version: str = None, database_name: str = "SSP-dev",
+                          collection_name: str = "t2dm_final_data_samples_processed_embeddings",
+                          dimension: int = 1536, batch_size: int = 500, activate: bool = True) -> dict:
+    """
+    Streams the embeddings collection into float32 matrices, one per section.
+
+    Args:
+        output (str): Store root directory.
+        version (str, optional): Version name. Defaults to a UTC timestamp.
+        database_name (str, optional): Source database. Defaults to "SSP-dev".
+        collection_name (str, optional): Source collection.
+        dimension (int, optional): Embedding dimension. Defaults to 1536.
+        batch_size (int, optional): Cursor batch size. Defaults to 500.
+        activate (bool, optional): Whether to point CURRENT at the new version. Defaults to True.
+
+    Returns:
+        dict: Manifest of the written version.
+    """
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    final_path = os.path.join(output, version)
+    if os.path.exists(final_path):
+        raise FileExistsError(f"Embedding store version already exists: {final_path}")
+
+    staging_path = os.path.join(output, f".{version}.tmp")
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+
+    collection = MongoDBDAO(database_name).database[collection_name]
+    capacity = collection.count_documents({})
+    matrices = {
+        section: np.lib.format.open_memmap(os.path.join(staging_path, f"{section}.npy"), mode="w+",
+                                           dtype=np.float32, shape=(capacity, dimension))
+        for section in EMBEDDING_SECTIONS
+    }
+    present = np.zeros((capacity, len(EMBEDDING_SECTIONS)), dtype=bool)
+
+    started_at = time.perf_counter()
+    nct_ids = []
+    seen = set()
+    projection = {"_id": 0, "nctId": 1, **{section: 1 for section in EMBEDDING_SECTIONS}}
+    for document in collection.find({}, projection, batch_size=batch_size):
+        nct_id = document.get("nctId")
+        # Documents inserted after count_documents() are left for the next export
+        if not nct_id or nct_id in seen or len(nct_ids) >= capacity:
+            continue
+
+        row = len(nct_ids)
+        for column, section in enumerate(EMBEDDING_SECTIONS):
+            vector = decode_vector(document.get(section), dimension)
+            if vector is not None:
+                matrices[section][row] = vector
+                present[row, column] = True
+        nct_ids.append(nct_id)
+        seen.add(nct_id)
+
+        if len(nct_ids) % 1000 == 0:
+            print(f"Exported {len(nct_ids)}/{capacity} trials")
+
+    # Trim the preallocated matrices to the rows actually written
+    row_count = len(nct_ids)
+    for section in EMBEDDING_SECTIONS:
+        matrix = matrices.pop(section)
+        matrix.flush()
+        if row_count < capacity:
+            trimmed = np.array(matrix[:row_count])
+            del matrix
+            trimmed_path = os.path.join(staging_path, f"{section}.trimmed.npy")
+            np.save(trimmed_path, trimmed)
+            os.replace(trimmed_path, os.path.join(staging_path, f"{section}.npy"))
+    np.save(os.path.join(staging_path, PRESENT_FILE), present[:row_count])
+
+    manifest = {
+        "version": version,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "database": database_name,
+        "collection": collection_name,
+        "dimension": dimension,
+        "count": row_count,
+        "dtype": "float32",
+        "sections": EMBEDDING_SECTIONS,
+    }
+    with open(os.path.join(staging_path, NCT_IDS_FILE), "w") as nct_ids_file:
+        json.dump(nct_ids, nct_ids_file)
+    with open(os.path.join(staging_path, MANIFEST_FILE), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    os.rename(staging_path, final_path)
+    if activate:
+        current_tmp = os.path.join(output, f".{CURRENT_FILE}.tmp")
+        with open(current_tmp, "w") as current_file:
+            current_file.write(version)
+        os.replace(current_tmp, os.path.join(output, CURRENT_FILE))
+
+    print(f"Exported {row_count} trials to {final_path} in {time.perf_counter() - started_at:.1f}s")
+    return manifest
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build a memory-mapped trial embedding store from MongoDB.")
+    parser.add_argument("--output", default=os.getenv("EMBEDDING_STORE_PATH"), help="Store root directory")
+    parser.add_argument("--version", default=None, help="Version name (defaults to a UTC timestamp)")
+    parser.add_argument("--database", default="SSP-dev", help="Source database")
+    parser.add_argument("--collection", default="t2dm_final_data_samples_processed_embeddings",
+                        help="Source collection")
+    parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--batch-size", type=int, default=500, help="Mongo cursor batch size")
+    parser.add_argument("--no-activate", action="store_true", help="Do not make the new version current")
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("--output is required when EMBEDDING_STORE_PATH is not set")
+
+    build_embedding_store(output=args.output, version=args.version, database_name=args.database,
+                          collection_name=args.collection, dimension=args.dimension,
+                          batch_size=args.batch_size, activate=not args.no_activate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+import os
+import numpy as np
+
+# Embedding fields of t2dm_final_data_samples_processed_embeddings exported to the store
+EMBEDDING_SECTIONS = ["inclusionCriteria", "exclusionCriteria", "officialTitle", "primaryOutcomes", "conditions"]
+
+MANIFEST_FILE = "manifest.json"
+NCT_IDS_FILE = "nct_ids.json"
+PRESENT_FILE = "present.npy"
+CURRENT_FILE = "CURRENT"
+
+
+class LocalEmbeddingStore:
+    """
+    A read-only, memory-mapped store of trial section embeddings.
+
+    A store root holds one directory per exported version and a CURRENT file naming the active
+    one. Each version directory contains:
+        - manifest.json: version, source collection, dimension, row count and section names
+        - nct_ids.json: the nctId of every row
+        - <section>.npy: one (rows, dimension) float32 matrix per section
+        - present.npy: (rows, sections) booleans, False where a trial has no embedding for a section
+
+    Matrices are opened with `mmap_mode="r"`, so reading candidate vectors is a row gather on
+    the mapped file: nothing is decoded and only the gathered rows are paged in.
+    """
+
+    def __init__(self, root: str, version: str = None) -> None:
+        """
+        Opens a store version.
+
+        Args:
+            root (str): Store root directory.
+            version (str, optional): Version to open. Defaults to the version named in CURRENT.
+
+        Raises:
+            FileNotFoundError: If the store or the requested version does not exist.
+        """
+        if version is None:
+            with open(os.path.join(root, CURRENT_FILE)) as current_file:
+                version = current_file.read().strip()
+
+        self.root = root
+        self.path = os.path.join(root, version)
+        with open(os.path.join(self.path, MANIFEST_FILE)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        with open(os.path.join(self.path, NCT_IDS_FILE)) as nct_ids_file:
+            self.nct_ids = json.load(nct_ids_file)
+
+        self.version = self.manifest["version"]
+        self.dimension = self.manifest["dimension"]
+        self.sections = self.manifest["sections"]
+        self.row_index = {nct_id: row for row, nct_id in enumerate(self.nct_ids)}
+        self.present = np.load(os.path.join(self.path, PRESENT_FILE), mmap_mode="r")
+        self.matrices = {
+            section: np.load(os.path.join(self.path, f"{section}.npy"), mmap_mode="r")
+            for section in self.sections
+        }
+
+    def __len__(self) -> int:
+        return len(self.nct_ids)
+
+    def gather(self, nct_ids: list, sections: list) -> tuple:
+        """
+        Reads the embeddings of the requested trials for the requested sections.
+
+        Args:
+            nct_ids (list): NCT IDs to read.
+            sections (list): Section names to read (see EMBEDDING_SECTIONS).
+
+        Returns:
+            tuple: (NCT IDs having every requested section,
+                    dict of section -> (n, dimension) float32 matrix in the same order,
+                    NCT IDs absent from the store)
+        """
+        stored_ids = [nct_id for nct_id in nct_ids if nct_id in self.row_index]
+        missing_ids = [nct_id for nct_id in nct_ids if nct_id not in self.row_index]
+
+        rows = np.fromiter((self.row_index[nct_id] for nct_id in stored_ids), dtype=np.int64, count=len(stored_ids))
+        columns = [self.sections.index(section) for section in sections]
+        complete = self.present[rows][:, columns].all(axis=1) if len(rows) else np.zeros(0, dtype=bool)
+        rows = rows[complete]
+
+        found_ids = [nct_id for nct_id, is_complete in zip(stored_ids, complete) if is_complete]
+        return found_ids, {section: self.matrices[section][rows] for section in sections}, missing_ids
+
+
+def open_embedding_store(root: str = None) -> LocalEmbeddingStore | None:
+    """
+    Opens the current version of the configured embedding store.
+
+    Args:
+        root (str, optional): Store root directory. Defaults to the EMBEDDING_STORE_PATH environment variable.
+
+    Returns:
+        LocalEmbeddingStore | None: The opened store, or None if no store is configured or it cannot be opened.
+    """
+    root = root or os.getenv("EMBEDDING_STORE_PATH")
+    if not root:
+        return None
+    try:
+        return LocalEmbeddingStore(root)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Failed to open embedding store at {root}: {e}")
+        return None
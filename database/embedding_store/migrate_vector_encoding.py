@@ -0,0 +1,116 @@
+"""
+Re-encodes the section embeddings of t2dm_final_data_samples_processed_embeddings.
+
+Usage:
+    python -m database.embedding_store.migrate_vector_encoding --encoding float32
+    python -m database.embedding_store.migrate_vector_encoding --encoding int8 --batch-size 200 --dry-run
+
+Embeddings are stored as BSON arrays of doubles, about 20 KB per 1536-dimension vector and decoded
+into Python floats on every read. The migration rewrites them as packed binary (see `encode_vector`):
+float32 (6 KB), float16 (3 KB) or int8 with a per-vector scale (1.6 KB). Documents are processed in
+_id order and only those holding a section in another encoding are selected, so an interrupted
+migration can simply be restarted. Readers accept every encoding, so the service keeps working
+during the migration. Set EMBEDDING_VECTOR_ENCODING to the same encoding for newly ingested trials.
+"""
+import argparse
+import time
+import bson
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from database.mongo_db_connection import MongoDBDAO
+from database.embedding_store.local_embedding_store import EMBEDDING_SECTIONS
+from database.embedding_store.vector_encoding import (
+    ARRAY_ENCODING, VECTOR_ENCODINGS, decode_vector, encode_vector
+)
+
+
+def _pending_query(encoding: str) -> dict:
+    """Matches the documents holding at least one section in another encoding."""
+    if encoding == ARRAY_ENCODING:
+        return {"$or": [{f"{section}.encoding": {"$exists": True}} for section in EMBEDDING_SECTIONS]}
+    return {"$or": [
+        {section: {"$exists": True}, f"{section}.encoding": {"$ne": encoding}} for section in EMBEDDING_SECTIONS
+    ]}
+
+
+def migrate_vector_encoding(encoding: str, database_name: str = "SSP-dev",
+                            collection_name: str = "t2dm_final_data_samples_processed_embeddings",
+                            batch_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    Rewrites every section embedding of the collection in the given encoding.
+
+    Args:
+        encoding (str): Target encoding: "float32", "float16", "int8" or "array".
+        database_name (str, optional): Database of the collection. Defaults to "SSP-dev".
+        collection_name (str, optional): Embeddings collection.
+        batch_size (int, optional): Documents read and written per batch. Defaults to 500.
+        dry_run (bool, optional): Encode a single batch and report the sizes without writing.
+
+    Returns:
+        dict: Migrated and skipped document counts, BSON bytes before and after, and elapsed seconds.
+    """
+    dao = MongoDBDAO(database_name)
+    collection = dao.database[collection_name]
+    query = _pending_query(encoding)
+    projection = {section: 1 for section in EMBEDDING_SECTIONS}
+    counts = {"migrated": 0, "skipped": 0, "bytesBefore": 0, "bytesAfter": 0}
+    started_at = time.perf_counter()
+
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        documents = list(collection.find(batch_query, projection).sort("_id", 1).limit(batch_size))
+        if not documents:
+            break
+        last_id = documents[-1]["_id"]
+
+        operations = []
+        for document in documents:
+            updates = {}
+            for section in EMBEDDING_SECTIONS:
+                if section not in document:
+                    continue
+                vector = decode_vector(document[section])
+                if vector is None:
+                    continue
+                updates[section] = encode_vector(vector, encoding)
+            if not updates:
+                counts["skipped"] += 1
+                continue
+
+            counts["bytesBefore"] += len(bson.encode({section: document[section] for section in updates}))
+            counts["bytesAfter"] += len(bson.encode(updates))
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": updates}))
+
+        if dry_run:
+            counts["migrated"] += len(operations)
+            break
+        if operations:
+            dao.bulk_write(collection_name, operations)
+            counts["migrated"] += len(operations)
+        print(f"Migrated {counts['migrated']} documents "
+              f"({counts['bytesBefore'] / 1e6:.1f} MB -> {counts['bytesAfter'] / 1e6:.1f} MB, "
+              f"{time.perf_counter() - started_at:.1f}s)")
+
+    counts["seconds"] = round(time.perf_counter() - started_at, 1)
+    print(f"Vector encoding {'dry run' if dry_run else 'migration'} to {encoding} completed: {counts}")
+    return counts
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Re-encode the stored section embeddings.")
+    parser.add_argument("--encoding", choices=VECTOR_ENCODINGS, required=True, help="Target encoding")
+    parser.add_argument("--database", default="SSP-dev", help="Database holding the embeddings collection")
+    parser.add_argument("--collection", default="t2dm_final_data_samples_processed_embeddings",
+                        help="Embeddings collection")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per batch")
+    parser.add_argument("--dry-run", action="store_true", help="Encode one batch and report sizes only")
+    args = parser.parse_args()
+
+    migrate_vector_encoding(encoding=args.encoding, database_name=args.database, collection_name=args.collection,
+                            batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
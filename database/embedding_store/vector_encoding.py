@@ -0,0 +1,77 @@
+import os
+import numpy as np
+from bson.binary import Binary
+
+# Binary encodings of a stored embedding, and the NumPy type of their packed components
+VECTOR_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Legacy layout: a BSON array of doubles
+ARRAY_ENCODING = "array"
+VECTOR_ENCODINGS = [ARRAY_ENCODING, *VECTOR_DTYPES]
+
+
+def default_vector_encoding() -> str:
+    """Encoding of newly written embeddings (EMBEDDING_VECTOR_ENCODING, default "float32")."""
+    encoding = os.getenv("EMBEDDING_VECTOR_ENCODING", "float32").lower()
+    if encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Unknown EMBEDDING_VECTOR_ENCODING: {encoding}")
+    return encoding
+
+
+def encode_vector(vector, encoding: str = "float32"):
+    """
+    Encodes an embedding for storage in MongoDB.
+
+    The binary encodings store the packed little-endian components as a
+    {"encoding", "dimension", "data"} subdocument. "int8" quantizes symmetrically with one scale per
+    vector (component = int8 value * "scale"), which keeps cosine similarities within about 1e-4.
+
+    Args:
+        vector: The embedding (list or NumPy array).
+        encoding (str, optional): "float32", "float16", "int8" or "array" (a plain list of doubles).
+            Defaults to "float32".
+
+    Returns:
+        dict | list: The stored value.
+    """
+    values = np.asarray(vector, dtype=np.float64).ravel()
+    if encoding == ARRAY_ENCODING:
+        return values.tolist()
+    if encoding not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector encoding: {encoding}")
+
+    stored = {"encoding": encoding, "dimension": len(values)}
+    if encoding == "int8":
+        peak = float(np.abs(values).max()) if len(values) else 0.0
+        scale = peak / 127 if peak > 0 else 1.0
+        values = np.clip(np.rint(values / scale), -127, 127)
+        stored["scale"] = scale
+    stored["data"] = Binary(values.astype(np.dtype(VECTOR_DTYPES[encoding]).newbyteorder("<")).tobytes())
+    return stored
+
+
+def decode_vector(value, dimension: int = None) -> np.ndarray | None:
+    """
+    Reads a stored embedding, in any encoding, straight into a float64 NumPy vector.
+
+    Args:
+        value: The stored value (a list of doubles or an encoded subdocument).
+        dimension (int, optional): Expected dimension; a vector of another dimension is rejected.
+
+    Returns:
+        np.ndarray | None: The vector, or None if the value is missing, malformed or of the wrong dimension.
+    """
+    if isinstance(value, list):
+        vector = np.asarray(value, dtype=np.float64)
+    elif isinstance(value, dict) and value.get("encoding") in VECTOR_DTYPES and isinstance(value.get("data"), bytes):
+        dtype = np.dtype(VECTOR_DTYPES[value["encoding"]]).newbyteorder("<")
+        if len(value["data"]) % dtype.itemsize:
+            return None
+        vector = np.frombuffer(value["data"], dtype=dtype).astype(np.float64)
+        if value["encoding"] == "int8":
+            vector *= value.get("scale", 1.0)
+    else:
+        return None
+
+    if vector.ndim != 1 or (dimension is not None and len(vector) != dimension):
+        return None
+    return vector
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from observability.metrics import dependency_call
 
 
 class MongoDBDAO:
@@ -16,13 +18,68 @@ class MongoDBDAO:
         self.database = self.client[self.database_name]
 
     def find(self, collection_name, query, projection=None):
-        return list(self.database[collection_name].find(query, projection))
+        with dependency_call("mongo", "find", collection_name):
+            return list(self.database[collection_name].find(query, projection))
 
-    def find_one(self, collection_name, query, projection=None):
-        return self.database[collection_name].find_one(query, projection)
+    def find_one(self, collection_name, query, projection=None, sort=None):
+        with dependency_call("mongo", "find_one", collection_name):
+            return self.database[collection_name].find_one(query, projection, sort=sort)
 
     def insert(self, collection_name, document):
-        return self.database[collection_name].insert_one(document)
+        with dependency_call("mongo", "insert", collection_name):
+            return self.database[collection_name].insert_one(document)
 
     def update(self, collection_name, query, update_values, upsert=False):
-        return self.database[collection_name].update_one(query, {'$set': update_values}, upsert=upsert)
\ No newline at end of file
+        with dependency_call("mongo", "update", collection_name):
+            return self.database[collection_name].update_one(query, {'$set': update_values}, upsert=upsert)
+
+    def upsert(self, collection_name, query, update_values, insert_values=None):
+        update = {'$set': update_values}
+        if insert_values:
+            update['$setOnInsert'] = insert_values
+        with dependency_call("mongo", "upsert", collection_name):
+            return self.database[collection_name].update_one(query, update, upsert=True)
+
+    def bulk_write(self, collection_name, operations, ordered=False):
+        with dependency_call("mongo", "bulk_write", collection_name):
+            return self.database[collection_name].bulk_write(operations, ordered=ordered)
+
+
+class AsyncMongoDBDAO:
+    def __init__(self, database_name: str = None):
+        """
+        Initializes an asynchronous MongoDB DAO backed by motor, for use inside the event loop.
+        """
+        # Load environment variables
+        load_dotenv()
+        self.uri = os.getenv("DATABASE_URL")
+        self.client = AsyncIOMotorClient(self.uri)
+        self.database_name = database_name if database_name is not None else os.getenv("DATABASE_NAME")
+        self.database = self.client[self.database_name]
+
+    async def find(self, collection_name, query, projection=None):
+        with dependency_call("mongo", "find", collection_name):
+            return await self.database[collection_name].find(query, projection).to_list(length=None)
+
+    async def find_one(self, collection_name, query, projection=None, sort=None):
+        with dependency_call("mongo", "find_one", collection_name):
+            return await self.database[collection_name].find_one(query, projection, sort=sort)
+
+    async def insert(self, collection_name, document):
+        with dependency_call("mongo", "insert", collection_name):
+            return await self.database[collection_name].insert_one(document)
+
+    async def update(self, collection_name, query, update_values, upsert=False):
+        with dependency_call("mongo", "update", collection_name):
+            return await self.database[collection_name].update_one(query, {'$set': update_values}, upsert=upsert)
+
+    async def upsert(self, collection_name, query, update_values, insert_values=None):
+        update = {'$set': update_values}
+        if insert_values:
+            update['$setOnInsert'] = insert_values
+        with dependency_call("mongo", "upsert", collection_name):
+            return await self.database[collection_name].update_one(query, update, upsert=True)
+
+    async def bulk_write(self, collection_name, operations, ordered=False):
+        with dependency_call("mongo", "bulk_write", collection_name):
+            return await self.database[collection_name].bulk_write(operations, ordered=ordered)
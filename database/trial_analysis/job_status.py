@@ -1,81 +1,97 @@
-from database.mongo_db_connection import MongoDBDAO
+from pymongo.errors import DuplicateKeyError
+from providers.provider_registry import provider_registry
 from datetime import datetime
 from trial_document_search.models.db_models import JobLog, JobStatus
 
-# Initialize MongoDB Data Access Object (DAO)
-dao = MongoDBDAO()
 
-def create_empty_job(ecid: str, user_name: str) -> dict:
+# Job id -> name of the job entry in the job log
+JOB_NAMES = {
+    1: "documentSearch",
+    2: "criteriaCreation"
+}
+
+
+async def start_job(ecid: str, user_name: str, job_id: int) -> dict:
     """
-    Creates an empty job log with None for job statuses.
+    Creates the job log of an ECID if needed and (re)starts one of its jobs, in a single idempotent upsert.
+
+    The job log is unique per ECID (see `ensure_bookkeeping_indexes`). When two upserts for a new ECID
+    race, the one that loses the insert fails with a duplicate key error and is applied again as an update.
     """
     final_response = {
         "success": False,
-        "message": f"Failed to create job log for ECID: {ecid}",
+        "message": f"Failed to start job for ECID: {ecid}",
         "data": None
     }
     try:
-        job_log = JobLog(ecid=ecid, userName=user_name, createdAt=datetime.now(), updatedAt=datetime.now())
-        dao.insert("job_status", job_log.model_dump())
+        job_name = JOB_NAMES[job_id]
+        now = datetime.now()
+        job_status = JobStatus(jobName=job_name, startedAt=now, message=f"{job_name} Job Started")
+        job_log = JobLog(ecid=ecid, userName=user_name, createdAt=now, updatedAt=now).model_dump()
+        upsert_arguments = (
+            "job_status", {"ecid": ecid},
+            {job_name: job_status.model_dump(), "userName": user_name, "updatedAt": now},
+            {key: value for key, value in job_log.items() if key not in (job_name, "userName", "updatedAt")}
+        )
+        try:
+            await provider_registry.app_dao.upsert(*upsert_arguments)
+        except DuplicateKeyError:
+            # A concurrent request created the job log first: the upsert now matches it
+            await provider_registry.app_dao.upsert(*upsert_arguments)
         final_response["success"] = True
-        final_response["message"] = "Job log created successfully"
-        final_response["data"] = job_log.model_dump()
+        final_response["message"] = "Job started successfully"
+        final_response["data"] = job_status.model_dump()
     except Exception as e:
-        final_response["message"] = f"Error creating job log: {str(e)}"
+        final_response["message"] = f"Error starting job: {str(e)}"
     return final_response
 
-def add_job(ecid: str, job_id: int) -> dict:
+def job_update_query(ecid: str, job_id: int, update_fields: dict) -> dict:
+    """
+    Returns the filter of a job update: it only matches an existing job, and a started one if finishedAt is set.
+    """
+    job_type = JOB_NAMES[job_id]
+    query = {"ecid": ecid, job_type: {"$ne": None}}
+    if any(field.endswith("finishedAt") for field in update_fields):
+        query[f"{job_type}.startedAt"] = {"$ne": None}
+    return query
+
+async def get_job(ecid: str) -> dict:
     """
-    Adds a new job to the job log.
+    Fetches the most recent job log of an ECID.
     """
     final_response = {
         "success": False,
-        "message": f"Failed to add job for ECID: {ecid}",
+        "message": f"Job log not found for ECID: {ecid}",
         "data": None
     }
     try:
-        id2name = {
-            1: "documentSearch",
-            2: "criteriaCreation"
-        }
-
-        job_name = id2name[job_id]
-        job_status = JobStatus(jobName=job_name, startedAt=datetime.now(), message=f"{job_name} Job Started")
-        dao.update("job_status", {"ecid": ecid}, {job_name: job_status.model_dump(), "updatedAt": datetime.now()})
-        final_response["success"] = True
-        final_response["message"] = "Job added successfully"
-        final_response["data"] = job_status.model_dump()
+        job_log = await provider_registry.app_dao.find_one("job_status", {"ecid": ecid}, {"_id": 0},
+                                                           sort=[("updatedAt", -1)])
+        if job_log:
+            final_response["success"] = True
+            final_response["message"] = "Job log fetched successfully"
+            final_response["data"] = job_log
     except Exception as e:
-        final_response["message"] = f"Error adding job: {str(e)}"
+        final_response["message"] = f"Error fetching job log: {str(e)}"
     return final_response
 
-def update_job(ecid: str, job_id: int, update_fields: dict) -> dict:
+async def ensure_bookkeeping_indexes() -> dict:
     """
-    Updates an existing job, ensuring finishedAt is only set if startedAt exists.
+    Creates the indexes used by the per-ECID bookkeeping queries (job log, stored results and workflow state).
     """
     final_response = {
         "success": False,
-        "message": f"Failed to update job for ECID: {ecid}",
+        "message": "Failed to create bookkeeping indexes",
         "data": None
     }
     try:
-        id2name = {
-            1: "documentSearch",
-            2: "criteriaCreation"
-        }
-        job_type = id2name[job_id]
-        job_log = dao.find_one("job_status", {"ecid": ecid})
-        if not job_log or job_type not in job_log:
-            raise ValueError("Job not found")
-
-        existing_job = job_log[job_type]
-        if "finishedAt" in update_fields and not existing_job.get("startedAt"):
-            raise ValueError("Cannot set finishedAt without a startedAt time")
-
-        dao.update("job_status", {"ecid": ecid}, {**update_fields, "updatedAt": datetime.now()})
+        database = provider_registry.app_dao.database
+        # One job log per ECID, which makes the upsert of `start_job` a single write per ECID
+        await database["job_status"].create_index([("ecid", 1)], unique=True)
+        await database["similar_trials_results"].create_index([("ecid", 1), ("createdAt", -1)])
+        await database["workflow-states"].create_index([("ecid", 1), ("step", 1)])
         final_response["success"] = True
-        final_response["message"] = "Job updated successfully"
-        final_response["data"] = update_fields
+        final_response["message"] = "Bookkeeping indexes created successfully"
     except Exception as e:
-        final_response["message"] = f"Error updating job: {str(e)}"
+        final_response["message"] = f"Error creating bookkeeping indexes: {str(e)}"
     return final_response
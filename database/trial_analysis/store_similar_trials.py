@@ -1,51 +1,52 @@
-from database.mongo_db_connection import MongoDBDAO
+from providers.provider_registry import provider_registry
 from datetime import datetime
 from trial_document_search.models.db_models import StoreSimilarTrials
 
-# Initialize MongoDB Data Access Object (DAO)
-mongo_dao = MongoDBDAO()
 
-def store_similar_trials(user_name: str, ecid: str, user_input: dict, similar_trials: list) -> dict:
+def build_similar_trials_document(user_name: str, ecid: str, user_input: dict, similar_trials: list) -> dict:
     """
-    Stores the results of similar trials in the MongoDB database.
+    Builds the similar_trials_results document of a search.
+    """
+    return StoreSimilarTrials(
+        userName=user_name,
+        ecid=ecid,
+        userInput=user_input,
+        similarTrials=similar_trials,
+        createdAt=datetime.now(),  # Timestamp for record creation
+        updatedAt=datetime.now()   # Timestamp for record update
+    ).model_dump()
+
+
+async def fetch_similar_trials(ecid: str, limit: int = 100) -> dict:
+    """
+    Fetches the most recently stored similar trials results of an ECID.
 
     Args:
-        user_name (str): The name of the user performing the operation.
         ecid (str): The ECID (Electronic Case Identifier) for the trial.
-        user_input (dict): The user-provided input details.
-        similar_trials (list): A list of similar trial results to be stored.
+        limit (int, optional): Number of top ranked similar trials to return. Defaults to 100.
 
     Returns:
-        dict: A dictionary containing the status of the operation, message, and stored data if successful.
+        dict: A dictionary containing the status of the operation, message, and stored results if found.
     """
     final_response = {
         "success": False,
-        "message": "Failed to store similar trials results",
+        "message": f"No similar trials results found for ECID: {ecid}",
         "data": None
     }
 
     try:
-        # Create a document instance using the StoreSimilarTrials model
-        document = StoreSimilarTrials(
-            userName=user_name,
-            ecid=ecid,
-            userInput=user_input,
-            similarTrials=similar_trials,
-            createdAt=datetime.now(),  # Timestamp for record creation
-            updatedAt=datetime.now()   # Timestamp for record update
+        document = await provider_registry.app_dao.find_one(
+            "similar_trials_results",
+            {"ecid": ecid},
+            {"_id": 0, "similarTrials": {"$slice": limit}},
+            sort=[("createdAt", -1)]
         )
-
-        # Insert the document into the MongoDB collection using DAO
-        db_response = mongo_dao.insert("similar_trials_results", document.model_dump())
-
-        # Check if the document was successfully inserted
-        if db_response:
+        if document:
             final_response["success"] = True
-            final_response["message"] = f"Successfully stored similar trials results: {db_response.inserted_id}"
-            final_response["data"] = db_response
+            final_response["message"] = f"Successfully fetched similar trials results for ECID: {ecid}"
+            final_response["data"] = document
 
     except Exception as e:
-        # Handle any exceptions and update the response with the error message
-        final_response["message"] = f"Error storing similar trials criteria results: {e}"
+        final_response["message"] = f"Error fetching similar trials results: {e}"
 
     return final_response
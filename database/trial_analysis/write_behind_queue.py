@@ -0,0 +1,200 @@
+import asyncio
+import os
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.logger_setup import logger
+
+# MongoDB duplicate key error: the write already succeeded in an earlier attempt
+DUPLICATE_KEY_ERROR = 11000
+# Write error codes worth retrying (elections, shutdowns, network and time limit errors); any other
+# write error (validation, document too large, ...) fails the same way again and is dropped at once
+TRANSIENT_WRITE_ERRORS = {6, 7, 50, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+class WriteBehindQueue:
+    """
+    Buffers application database writes and applies them in the background with bulk writes.
+
+    Writes are queued in memory (at most `max_pending`; producers wait when the queue is full) and a
+    single background task drains up to `max_batch` of them at a time, waiting at most
+    `flush_interval` seconds to fill a batch. Each batch is written with one ordered `bulk_write` per
+    collection, in `collection_order` first, so a search's results are stored before its job is marked
+    finished. Failed writes are retried with exponential backoff. Inserted documents get their `_id`
+    when queued, which makes a retried insert a no-op. Writes still failing after `max_retries`, and
+    writes rejected with a non-transient error, are logged and dropped.
+
+    An insert can carry follow-up updates that are only queued once the insert is written, and
+    fallback updates that are queued instead if it is dropped.
+    """
+
+    def __init__(self, max_pending: int = None, max_batch: int = None, flush_interval: float = None,
+                 max_retries: int = None, retry_backoff: float = 0.5, collection_order: list = None,
+                 enabled: bool = None) -> None:
+        """
+        Args:
+            max_pending (int, optional): Queued writes (WRITE_BEHIND_MAX_PENDING, default 10000).
+            max_batch (int, optional): Writes per batch (WRITE_BEHIND_MAX_BATCH, default 500).
+            flush_interval (float, optional): Seconds to fill a batch (WRITE_BEHIND_FLUSH_INTERVAL, default 0.2).
+            max_retries (int, optional): Retries of a failed write (WRITE_BEHIND_MAX_RETRIES, default 5).
+            retry_backoff (float, optional): Seconds before the first retry, doubled at every retry.
+            collection_order (list, optional): Collections written first within a batch, in this order.
+            enabled (bool, optional): Whether writes are deferred (WRITE_BEHIND_ENABLED, default true).
+                When disabled, every write is applied immediately.
+        """
+        load_dotenv()
+        self.enabled = enabled if enabled is not None else os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+        self.max_batch = max_batch if max_batch is not None else int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.2"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+        self.retry_backoff = retry_backoff
+        self.collection_order = collection_order or []
+        self.written = 0
+        self.dropped = 0
+        self._queue = None
+        self._worker = None
+
+    async def insert(self, collection_name: str, document: dict, then: list = None, otherwise: list = None) -> None:
+        """
+        Queues the insert of a document.
+
+        Args:
+            collection_name (str): Collection to insert into.
+            document (dict): Document to insert.
+            then (list, optional): `(collection_name, query, update_values)` updates applied once the
+                insert is written.
+            otherwise (list, optional): `(collection_name, query, update_values)` updates applied
+                instead if the insert is dropped.
+        """
+        document.setdefault("_id", ObjectId())
+        await self._submit((collection_name, InsertOne(document), self._updates(then), self._updates(otherwise)))
+
+    async def update(self, collection_name: str, query: dict, update_values: dict) -> None:
+        """Queues a `$set` of `update_values` on the first document matching `query`."""
+        await self._submit(*self._updates([(collection_name, query, update_values)]))
+
+    @staticmethod
+    def _updates(updates: list = None) -> list:
+        """Builds the queued writes of `(collection_name, query, update_values)` updates."""
+        return [(collection_name, UpdateOne(query, {"$set": update_values}), [], [])
+                for collection_name, query, update_values in updates or []]
+
+    async def _submit(self, write: tuple) -> None:
+        if not self.enabled:
+            await self._flush([write])
+            return
+
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue(maxsize=self.max_pending)
+            self._worker = asyncio.create_task(self._run())
+        await self._queue.put(write)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(batch)} queued writes: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: list) -> None:
+        """
+        Writes a batch with one ordered bulk write per collection, then the follow-up writes of its
+        written inserts and the fallback writes of its dropped ones.
+        """
+        writes = {collection_name: [] for collection_name in self.collection_order}
+        for write in batch:
+            writes.setdefault(write[0], []).append(write)
+
+        follow_ups = []
+        for collection_name, collection_writes in writes.items():
+            if not collection_writes:
+                continue
+            dropped = await self._write(collection_name, [operation for _, operation, _, _ in collection_writes])
+            for _, operation, then, otherwise in collection_writes:
+                follow_ups.extend(otherwise if id(operation) in dropped else then)
+        if follow_ups:
+            await self._flush(follow_ups)
+
+    async def _write(self, collection_name: str, operations: list) -> set:
+        """
+        Bulk writes the operations in order, retrying from the first failed one.
+
+        Returns:
+            set: The ids (`id()`) of the dropped operations.
+        """
+        dropped = set()
+        attempt = 0
+        while operations:
+            try:
+                await provider_registry.app_dao.bulk_write(collection_name, operations, ordered=True)
+                self.written += len(operations)
+                break
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors") or []
+                if write_errors:
+                    write_error = write_errors[0]
+                    failed_index = write_error["index"]
+                    self.written += failed_index
+                    if write_error["code"] == DUPLICATE_KEY_ERROR:
+                        self.written += 1
+                        operations = operations[failed_index + 1:]
+                        continue
+                    if write_error["code"] not in TRANSIENT_WRITE_ERRORS:
+                        self.dropped += 1
+                        dropped.add(id(operations[failed_index]))
+                        logger.error(f"Dropped a write to {collection_name}: {write_error.get('errmsg')}")
+                        operations = operations[failed_index + 1:]
+                        attempt = 0
+                        continue
+                    operations = operations[failed_index:]
+                    failure = write_error.get("errmsg")
+                else:
+                    failure = e.details.get("writeConcernErrors")
+            except Exception as e:
+                failure = e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self.dropped += len(operations)
+                dropped.update(id(operation) for operation in operations)
+                logger.error(f"Dropped {len(operations)} writes to {collection_name} after {self.max_retries} retries: {failure}")
+                break
+            logger.error(f"Failed to write {len(operations)} operations to {collection_name} (attempt {attempt}): {failure}")
+            await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        return dropped
+
+    def stats(self) -> dict:
+        """Returns the number of queued, written and dropped writes."""
+        return {"pending": self._queue.qsize() if self._queue else 0, "written": self.written, "dropped": self.dropped}
+
+    async def close(self, timeout: float = 30) -> None:
+        """Flushes the queued writes (waiting at most `timeout` seconds) and stops the background task."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind flush timed out with {self._queue.qsize()} writes pending")
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._queue = None
+
+
+# Process-wide queue of the search bookkeeping writes, flushed by the FastAPI lifespan in main.py
+bookkeeping_writer = WriteBehindQueue(collection_order=["similar_trials_results", "workflow-states", "job_status"])
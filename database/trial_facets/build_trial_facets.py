@@ -0,0 +1,142 @@
+"""
+Builds and incrementally refreshes the trial_facets collection from t2dm_data_preprocessed.
+
+Usage:
+    python -m database.trial_facets.build_trial_facets --full      # rebuild every record
+    python -m database.trial_facets.build_trial_facets             # refresh changed and missing trials
+
+trial_facets holds one small record per nctId (see `encode_trial_facets`), so filter enrichment reads a
+few hundred bytes per trial instead of the whole source document. An incremental refresh re-encodes
+trials whose lastUpdatePostDate is on or after the previous refresh watermark, plus any trial that has
+no facet record yet. It then rewrites the Pinecone filter metadata of the refreshed trials' vectors (see
+`refresh_filter_metadata`), so filter pushdown does not drift from the facets; pass --no-vector-metadata
+to skip it. A full build leaves the vectors to `providers.pinecone.backfill_filter_metadata --force`.
+"""
+import argparse
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReplaceOne
+from database.mongo_db_connection import MongoDBDAO
+from providers.pinecone.backfill_filter_metadata import refresh_filter_metadata
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import (
+    FACET_SOURCE_PROJECTION, encode_trial_facets, extract_trial_facets
+)
+
+SOURCE_COLLECTION = "t2dm_data_preprocessed"
+FACETS_COLLECTION = "trial_facets"
+FACETS_STATE_COLLECTION = "trial_facets_state"
+NCT_ID_FIELD = "protocolSection.identificationModule.nctId"
+LAST_UPDATE_FIELD = "protocolSection.statusModule.lastUpdatePostDateStruct.date"
+
+
+def _write_facets(dao: MongoDBDAO, source_query: dict, batch_size: int) -> list:
+    """Encodes the matching source trials, upserts their facet records in bulk and returns their NCT IDs."""
+    written = []
+    operations = []
+    cursor = dao.database[SOURCE_COLLECTION].find(source_query, FACET_SOURCE_PROJECTION, batch_size=batch_size)
+    for doc in cursor:
+        protocol = doc["protocolSection"]
+        nct_id = protocol["identificationModule"]["nctId"]
+        record = encode_trial_facets(nct_id, extract_trial_facets(protocol))
+        record["sourceUpdatedAt"] = protocol.get("statusModule", {}).get("lastUpdatePostDateStruct", {}).get("date")
+        record["refreshedAt"] = datetime.now()
+        operations.append(ReplaceOne({"nctId": nct_id}, record, upsert=True))
+        written.append(nct_id)
+
+        if len(operations) >= batch_size:
+            dao.bulk_write(FACETS_COLLECTION, operations)
+            operations = []
+
+    if operations:
+        dao.bulk_write(FACETS_COLLECTION, operations)
+    return written
+
+
+def refresh_trial_facets(nct_ids: list, database_name: str = "SSP-dev", batch_size: int = 1000,
+                         dao: MongoDBDAO = None) -> int:
+    """
+    Re-encodes the facet records of specific trials, e.g. right after they were ingested or updated.
+
+    Args:
+        nct_ids (list): NCT IDs to refresh.
+        database_name (str, optional): Database holding the source and facets collections. Defaults to "SSP-dev".
+        batch_size (int, optional): Records written per bulk request. Defaults to 1000.
+        dao (MongoDBDAO, optional): Existing DAO on `database_name` to reuse, e.g. across ingestion batches.
+
+    Returns:
+        int: Number of facet records written.
+    """
+    return len(_write_facets(dao or MongoDBDAO(database_name), {NCT_ID_FIELD: {"$in": list(nct_ids)}}, batch_size))
+
+
+def build_trial_facets(full: bool = False, database_name: str = "SSP-dev", batch_size: int = 1000,
+                       vector_metadata: bool = True) -> dict:
+    """
+    Builds (full) or incrementally refreshes the trial_facets collection.
+
+    Args:
+        full (bool, optional): Re-encode every source trial. Defaults to False.
+        database_name (str, optional): Database holding the source and facets collections. Defaults to "SSP-dev".
+        batch_size (int, optional): Records written per bulk request. Defaults to 1000.
+        vector_metadata (bool, optional): After an incremental refresh, also rewrite the Pinecone filter
+            metadata of the refreshed trials. Defaults to True.
+
+    Returns:
+        dict: Number of records written, the new watermark, the vectors updated and elapsed seconds.
+    """
+    started_at = time.perf_counter()
+    dao = MongoDBDAO(database_name)
+    dao.database[FACETS_COLLECTION].create_index([("nctId", ASCENDING)], unique=True)
+
+    state = dao.find_one(FACETS_STATE_COLLECTION, {"_id": FACETS_COLLECTION}) or {}
+    watermark = None if full else state.get("watermark")
+
+    # The newest source update becomes the next watermark; records changed at that date are refreshed again
+    newest = dao.database[SOURCE_COLLECTION].find_one(
+        {LAST_UPDATE_FIELD: {"$exists": True}}, {"_id": 0, LAST_UPDATE_FIELD: 1}, sort=[(LAST_UPDATE_FIELD, -1)]
+    )
+    new_watermark = (newest or {}).get("protocolSection", {}).get("statusModule", {}) \
+        .get("lastUpdatePostDateStruct", {}).get("date", watermark)
+
+    if watermark is None:
+        written = _write_facets(dao, {}, batch_size)
+    else:
+        written = _write_facets(dao, {LAST_UPDATE_FIELD: {"$gte": watermark}}, batch_size)
+
+        # Trials without a facet record (e.g. inserted with an older lastUpdatePostDate)
+        source_ids = set(dao.database[SOURCE_COLLECTION].distinct(NCT_ID_FIELD))
+        facet_ids = set(dao.database[FACETS_COLLECTION].distinct("nctId"))
+        missing_ids = list(source_ids - facet_ids)
+        for offset in range(0, len(missing_ids), batch_size):
+            written += _write_facets(dao, {NCT_ID_FIELD: {"$in": missing_ids[offset:offset + batch_size]}}, batch_size)
+
+    vectors_updated = 0
+    if watermark is not None and vector_metadata and written:
+        vectors_updated = refresh_filter_metadata(written, dao=dao)["updated"]
+
+    dao.update(FACETS_STATE_COLLECTION, {"_id": FACETS_COLLECTION},
+               {"watermark": new_watermark, "refreshedAt": datetime.now(), "full": watermark is None}, upsert=True)
+
+    result = {"written": len(written), "watermark": new_watermark, "vectorsUpdated": vectors_updated,
+              "seconds": round(time.perf_counter() - started_at, 1)}
+    print(f"Trial facets {'built' if watermark is None else 'refreshed'}: {result}")
+    return result
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build or refresh the trial_facets collection.")
+    parser.add_argument("--full", action="store_true", help="Rebuild every facet record")
+    parser.add_argument("--database", default="SSP-dev", help="Database holding the trial collections")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Records written per bulk request")
+    parser.add_argument("--vector-metadata", action=argparse.BooleanOptionalAction, default=True,
+                        help="Rewrite the Pinecone filter metadata of the refreshed trials after an incremental refresh")
+    args = parser.parse_args()
+
+    build_trial_facets(full=args.full, database_name=args.database, batch_size=args.batch_size,
+                       vector_metadata=args.vector_metadata)
+
+
+if __name__ == "__main__":
+    main()
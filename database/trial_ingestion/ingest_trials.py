@@ -0,0 +1,377 @@
+"""
+Ingests new or updated ClinicalTrials.gov studies into the vector index and the trial collections.
+
+Usage:
+    python -m database.trial_ingestion.ingest_trials --source studies.jsonl
+    python -m database.trial_ingestion.ingest_trials --source /data/studies --requests-per-minute 500 --restart
+
+The source is a JSON Lines file, a JSON file (one study, a list of studies or an API response with
+"studies"), or a directory of such files read in name order. For every batch of studies the module
+chunks (see `build_module_chunks`) and the sections of t2dm_final_data_samples_processed_embeddings
+are embedded with a few large embeddings requests under a request and token rate limit. The vectors
+are then upserted into the index, the studies, their section texts and their section embeddings are
+bulk written to t2dm_data_preprocessed, t2dm_final_data_samples_processed (read when search results
+are hydrated) and t2dm_final_data_samples_processed_embeddings, and their trial_facets records are
+refreshed. Writes of one batch overlap with the embedding of the next.
+
+Every write is keyed by NCT ID (or by a vector id derived from it), so re-ingesting a study replaces
+it. The chunk count of every module is recorded with the section embeddings, and the vectors of
+chunks a re-ingested study no longer has are deleted from the index. The number of source records
+consumed is checkpointed in trial_ingestion_state after each batch has been written, and a re-run of
+an interrupted ingestion resumes from there.
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from dotenv import load_dotenv
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from pymongo import ReplaceOne, UpdateOne
+from database.mongo_db_connection import MongoDBDAO
+from database.embedding_store.vector_encoding import VECTOR_ENCODINGS, default_vector_encoding, encode_vector
+from database.trial_facets.build_trial_facets import NCT_ID_FIELD, SOURCE_COLLECTION, refresh_trial_facets
+from database.trial_ingestion.trial_chunks import build_module_chunks, build_section_texts
+from providers.openai.embedding_batches import MAX_EMBEDDING_REQUEST_TOKENS, estimate_tokens, split_embedding_batches
+from providers.openai.openai_connection import OpenAIClient
+from providers.pinecone.module_namespaces import MODULE_NAMESPACES, module_namespaces_enabled, module_namespaces_exist
+from providers.pinecone.pinecone_connection import PineconeVectorStore
+from trial_document_search.utils.similar_trial_documents_utils.compile_pinecone_filter import build_filter_metadata
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import extract_trial_facets
+
+EMBEDDINGS_COLLECTION = "t2dm_final_data_samples_processed_embeddings"
+PROCESSED_COLLECTION = "t2dm_final_data_samples_processed"
+INGESTION_STATE_COLLECTION = "trial_ingestion_state"
+
+
+class RateLimiter:
+    """
+    Blocks until a request fits within a requests-per-minute and tokens-per-minute budget.
+
+    Requests made during the last minute are kept in a sliding window. Token counts are estimates
+    (see `estimate_tokens`), so the budgets should leave some headroom below the account limits.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = deque()
+        self.window_tokens = 0
+
+    def acquire(self, tokens: int) -> None:
+        """
+        Waits until a request of `tokens` tokens can be made, then records it.
+
+        Raises:
+            ValueError: If the request alone exceeds the tokens-per-minute budget, so it could never be made.
+        """
+        if tokens > self.tokens_per_minute:
+            raise ValueError(f"A request of {tokens} tokens exceeds the budget of {self.tokens_per_minute} tokens per minute")
+        while True:
+            now = time.monotonic()
+            while self.window and now - self.window[0][0] >= 60:
+                self.window_tokens -= self.window.popleft()[1]
+            if len(self.window) < self.requests_per_minute and self.window_tokens + tokens <= self.tokens_per_minute:
+                self.window.append((now, tokens))
+                self.window_tokens += tokens
+                return
+            time.sleep(max(0.01, 60 - (now - self.window[0][0])))
+
+
+def iter_source_studies(source: str):
+    """
+    Yields the studies of a source file or directory, in a stable order.
+
+    Args:
+        source (str): JSON Lines file, JSON file or directory of such files.
+
+    Yields:
+        dict: One study (a ClinicalTrials.gov record with a "protocolSection").
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith((".json", ".jsonl", ".ndjson")):
+                yield from iter_source_studies(os.path.join(source, name))
+        return
+
+    with open(source) as source_file:
+        if source.endswith((".jsonl", ".ndjson")):
+            for line in source_file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        content = json.load(source_file)
+
+    if isinstance(content, dict):
+        content = content.get("studies", [content])
+    yield from content
+
+
+def find_stale_vector_ids(index, nct_id: str, chunk_counts: dict, previous_chunk_counts: dict = None,
+                          namespace: str = "") -> list:
+    """
+    Returns the ids of the vectors of a re-ingested trial that its new chunks no longer overwrite.
+
+    Args:
+        index: Pinecone index holding the trial's vectors.
+        nct_id (str): NCT ID of the trial.
+        chunk_counts (dict): Module -> number of chunks of the trial now.
+        previous_chunk_counts (dict, optional): Module -> number of chunks recorded at the previous
+            ingestion. When missing, the trial's vectors are listed from the index instead.
+        namespace (str, optional): Namespace to list. Defaults to the default namespace.
+
+    Returns:
+        list: Vector ids ("<nctId>#<module>#<position>") to delete.
+    """
+    if previous_chunk_counts is not None:
+        return [
+            f"{nct_id}#{module}#{position}"
+            for module, count in previous_chunk_counts.items()
+            for position in range(chunk_counts.get(module, 0), count)
+        ]
+    current_ids = {f"{nct_id}#{module}#{position}" for module, count in chunk_counts.items() for position in range(count)}
+    return [vector_id for page_ids in index.list(prefix=f"{nct_id}#", namespace=namespace)
+            for vector_id in page_ids if vector_id not in current_ids]
+
+
+def embed_texts(openai_client: OpenAIClient, texts: list, rate_limiter: RateLimiter, batch_size: int,
+                model: str = "text-embedding-3-small", max_retries: int = 6) -> list:
+    """
+    Embeds texts with as few embeddings requests as the batch size and the request token limit allow.
+
+    Rate limited, timed out and failed requests are retried with exponential backoff. The embedding
+    cache is bypassed, since ingested texts are not searched for again.
+
+    Args:
+        openai_client (OpenAIClient): OpenAI client.
+        texts (list): Texts to embed.
+        rate_limiter (RateLimiter): Request and token budget shared by every request.
+        batch_size (int): Texts per request (at most MAX_EMBEDDING_INPUTS). Requests are also split so
+            that their estimated tokens stay within MAX_EMBEDDING_REQUEST_TOKENS and the rate limiter budget.
+        model (str, optional): Embedding model. Defaults to "text-embedding-3-small".
+        max_retries (int, optional): Retries of a failed request. Defaults to 6.
+
+    Returns:
+        list: One embedding (list of floats) per text, in input order.
+    """
+    embeddings = []
+    max_tokens = min(MAX_EMBEDDING_REQUEST_TOKENS, rate_limiter.tokens_per_minute)
+    for batch in split_embedding_batches(texts, batch_size, max_tokens):
+        for attempt in range(max_retries + 1):
+            rate_limiter.acquire(sum(estimate_tokens(text) for text in batch))
+            try:
+                response = openai_client.client.embeddings.create(input=batch, model=model)
+                break
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt == max_retries:
+                    raise
+                print(f"Embeddings request failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(min(2 ** attempt, 60))
+        embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return embeddings
+
+
+def ingest_trials(source: str, run_id: str = None, database_name: str = "SSP-dev", namespace: str = "",
+                  batch_size: int = 200, embedding_batch_size: int = 1000, upsert_batch_size: int = 100,
+                  workers: int = 8, requests_per_minute: int = 3000, tokens_per_minute: int = 1000000,
+                  vector_encoding: str = None, module_namespaces: bool = None, restart: bool = False) -> dict:
+    """
+    Ingests the studies of a source into the vector index, the trial collections and trial_facets.
+
+    Args:
+        source (str): JSON Lines file, JSON file or directory of such files.
+        run_id (str, optional): Checkpoint key. Defaults to the absolute source path.
+        database_name (str, optional): Database holding the trial collections. Defaults to "SSP-dev".
+        namespace (str, optional): Vector index namespace. Defaults to the default namespace.
+        batch_size (int, optional): Studies per batch (and per checkpoint). Defaults to 200.
+        embedding_batch_size (int, optional): Texts per embeddings request. Defaults to 1000.
+        upsert_batch_size (int, optional): Vectors per upsert request. Defaults to 100.
+        workers (int, optional): Concurrent upsert requests. Defaults to 8.
+        requests_per_minute (int, optional): Embeddings request budget. Defaults to 3000.
+        tokens_per_minute (int, optional): Embeddings token budget. Defaults to 1000000.
+        vector_encoding (str, optional): Encoding of the stored section embeddings (see `encode_vector`).
+            Defaults to the EMBEDDING_VECTOR_ENCODING environment variable, or "float32".
+        module_namespaces (bool, optional): Also upsert the vectors of every routed module into its module
+            namespace (see `MODULE_NAMESPACES`). Defaults to true when PINECONE_MODULE_NAMESPACES is enabled or
+            the index already has a module namespace, so trials ingested between the migration and enabling
+            the flag are not missing from the namespaces.
+        restart (bool, optional): Ignore the checkpoint and start from the first study.
+
+    Returns:
+        dict: Counts of ingested and skipped studies, vectors written, elapsed seconds and trials per second.
+    """
+    run_id = run_id or os.path.abspath(source)
+    vector_encoding = vector_encoding or default_vector_encoding()
+    dao = MongoDBDAO(database_name)
+    vector_store = PineconeVectorStore()
+    if module_namespaces is None:
+        module_namespaces = module_namespaces_enabled() or module_namespaces_exist(vector_store.pinecone_index)
+    openai_client = OpenAIClient()
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+    state = {} if restart else dao.find_one(INGESTION_STATE_COLLECTION, {"_id": run_id}) or {}
+    position = state.get("position", 0)
+    if position:
+        print(f"Resuming ingestion {run_id} after {position} source records")
+
+    counts = {"ingested": 0, "skipped": 0, "vectors": 0}
+    started_at = time.perf_counter()
+
+    def write_batch(studies: list, vectors: list, section_texts: dict, sections: dict, batch_position: int) -> None:
+        nct_ids = [study["protocolSection"]["identificationModule"]["nctId"] for study in studies]
+        chunk_counts = {nct_id: {} for nct_id in nct_ids}
+        for vector in vectors:
+            module_counts = chunk_counts[vector["metadata"]["nctId"]]
+            module_counts[vector["metadata"]["module"]] = module_counts.get(vector["metadata"]["module"], 0) + 1
+        previous_chunk_counts = {
+            document["nctId"]: document.get("chunkCounts")
+            for document in dao.find(EMBEDDINGS_COLLECTION, {"nctId": {"$in": nct_ids}}, {"_id": 0, "nctId": 1, "chunkCounts": 1})
+        } if nct_ids else {}
+
+        namespace_vectors = {namespace: vectors}
+        if module_namespaces:
+            for vector in vectors:
+                module_namespace = MODULE_NAMESPACES.get(vector["metadata"]["module"])
+                if module_namespace is not None:
+                    namespace_vectors.setdefault(module_namespace, []).append(vector)
+        upserts = [
+            executor.submit(vector_store.pinecone_index.upsert,
+                            vectors=target_vectors[offset:offset + upsert_batch_size], namespace=target_namespace)
+            for target_namespace, target_vectors in namespace_vectors.items()
+            for offset in range(0, len(target_vectors), upsert_batch_size)
+        ]
+        for upsert in upserts:
+            upsert.result()
+
+        # Delete the vectors of chunks that re-ingested trials no longer have
+        stale_ids = {namespace: []}
+        for nct_id, previous_counts in previous_chunk_counts.items():
+            for vector_id in find_stale_vector_ids(vector_store.pinecone_index, nct_id, chunk_counts[nct_id],
+                                                   previous_counts, namespace):
+                stale_ids[namespace].append(vector_id)
+                module_namespace = MODULE_NAMESPACES.get(vector_id.split("#")[1]) if module_namespaces else None
+                if module_namespace is not None:
+                    stale_ids.setdefault(module_namespace, []).append(vector_id)
+        deletes = [
+            executor.submit(vector_store.pinecone_index.delete, ids=target_ids[offset:offset + 1000], namespace=target_namespace)
+            for target_namespace, target_ids in stale_ids.items()
+            for offset in range(0, len(target_ids), 1000)
+        ]
+        for delete in deletes:
+            delete.result()
+
+        now = datetime.now()
+        source_operations = [
+            ReplaceOne({NCT_ID_FIELD: nct_id}, study, upsert=True) for nct_id, study in zip(nct_ids, studies)
+        ]
+        embedding_operations = [
+            UpdateOne({"nctId": nct_id}, {"$set": {
+                "nctId": nct_id,
+                **{section: encode_vector(vector, vector_encoding) for section, vector in sections[nct_id].items()},
+                "chunkCounts": chunk_counts[nct_id],
+                "updatedAt": now,
+            }}, upsert=True)
+            for nct_id in nct_ids
+        ]
+        processed_operations = [
+            UpdateOne({"nctId": nct_id}, {"$set": {"nctId": nct_id, **section_texts[nct_id], "updatedAt": now}}, upsert=True)
+            for nct_id in nct_ids
+        ]
+        # A batch without any valid study has nothing to write, but its position is still checkpointed
+        if source_operations:
+            dao.bulk_write(SOURCE_COLLECTION, source_operations)
+        if embedding_operations:
+            dao.bulk_write(EMBEDDINGS_COLLECTION, embedding_operations)
+        if processed_operations:
+            dao.bulk_write(PROCESSED_COLLECTION, processed_operations)
+        if nct_ids:
+            refresh_trial_facets(nct_ids, database_name, dao=dao)
+
+        # Only checkpoint once every store holds the batch
+        counts["ingested"] += len(studies)
+        counts["vectors"] += len(vectors)
+        dao.update(INGESTION_STATE_COLLECTION, {"_id": run_id},
+                   {"source": source, "position": batch_position, "updatedAt": now}, upsert=True)
+        elapsed = time.perf_counter() - started_at
+        print(f"Ingested {counts['ingested']} trials, {counts['vectors']} vectors, position {batch_position} "
+              f"({counts['ingested'] / elapsed:.1f} trials/s)")
+
+    studies_iterator = islice(iter_source_studies(source), position, None)
+    with ThreadPoolExecutor(max_workers=workers) as executor, ThreadPoolExecutor(max_workers=1) as writer:
+        pending_write = None
+        while batch := list(islice(studies_iterator, batch_size)):
+            position += len(batch)
+            studies = [study for study in batch
+                       if study.get("protocolSection", {}).get("identificationModule", {}).get("nctId")]
+            counts["skipped"] += len(batch) - len(studies)
+
+            chunks, sections = [], {}
+            for study in studies:
+                protocol = study["protocolSection"]
+                filter_metadata = build_filter_metadata(extract_trial_facets(protocol))
+                for chunk in build_module_chunks(protocol):
+                    chunks.append({**chunk, "metadata": {"nctId": chunk["nctId"], "module": chunk["module"],
+                                                         **filter_metadata}})
+                sections[protocol["identificationModule"]["nctId"]] = build_section_texts(protocol)
+
+            # Embed every distinct text of the batch once
+            texts = list(dict.fromkeys(
+                [chunk["text"] for chunk in chunks] + [text for section_texts in sections.values() for text in section_texts.values()]
+            ))
+            embeddings = dict(zip(texts, embed_texts(openai_client, texts, rate_limiter, embedding_batch_size)))
+            vectors = [{"id": chunk["id"], "values": embeddings[chunk["text"]], "metadata": chunk["metadata"]}
+                       for chunk in chunks]
+            section_embeddings = {
+                nct_id: {section: embeddings[text] for section, text in section_texts.items()}
+                for nct_id, section_texts in sections.items()
+            }
+
+            if pending_write is not None:
+                pending_write.result()
+            pending_write = writer.submit(write_batch, studies, vectors, sections, section_embeddings, position)
+
+        if pending_write is not None:
+            pending_write.result()
+
+    dao.update(INGESTION_STATE_COLLECTION, {"_id": run_id},
+               {"source": source, "position": position, "completedAt": datetime.now()}, upsert=True)
+    elapsed = time.perf_counter() - started_at
+    result = {**counts, "seconds": round(elapsed, 1), "trialsPerSecond": round(counts["ingested"] / max(elapsed, 1e-9), 2)}
+    print(f"Ingestion completed: {result}")
+    return result
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Ingest ClinicalTrials.gov studies into the search corpus.")
+    parser.add_argument("--source", required=True, help="JSON Lines file, JSON file or directory of studies")
+    parser.add_argument("--run-id", default=None, help="Checkpoint key (defaults to the absolute source path)")
+    parser.add_argument("--database", default="SSP-dev", help="Database holding the trial collections")
+    parser.add_argument("--namespace", default="", help="Vector index namespace (default namespace if omitted)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Studies per batch and checkpoint")
+    parser.add_argument("--embedding-batch-size", type=int, default=1000, help="Texts per embeddings request")
+    parser.add_argument("--upsert-batch-size", type=int, default=100, help="Vectors per upsert request")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent upsert requests")
+    parser.add_argument("--requests-per-minute", type=int, default=3000, help="Embeddings request budget")
+    parser.add_argument("--tokens-per-minute", type=int, default=1000000, help="Embeddings token budget")
+    parser.add_argument("--vector-encoding", choices=VECTOR_ENCODINGS, default=None,
+                        help="Encoding of the stored section embeddings (defaults to EMBEDDING_VECTOR_ENCODING)")
+    parser.add_argument("--module-namespaces", action=argparse.BooleanOptionalAction, default=None,
+                        help="Also write every module's vectors to its namespace (defaults to PINECONE_MODULE_NAMESPACES, "
+                             "or to whether the index already has module namespaces)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    ingest_trials(source=args.source, run_id=args.run_id, database_name=args.database, namespace=args.namespace,
+                  batch_size=args.batch_size, embedding_batch_size=args.embedding_batch_size,
+                  upsert_batch_size=args.upsert_batch_size, workers=args.workers,
+                  requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute,
+                  vector_encoding=args.vector_encoding, module_namespaces=args.module_namespaces,
+                  restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import re
+
+# Protocol modules embedded into the vector index, one or more chunks each
+INDEXED_MODULES = [
+    "identificationModule",
+    "descriptionModule",
+    "conditionsModule",
+    "designModule",
+    "armsInterventionsModule",
+    "outcomesModule",
+    "eligibilityModule",
+]
+
+# Longest chunk text, well below the 8191 token input limit of the embedding model
+MAX_CHUNK_CHARS = 6000
+
+EXCLUSION_HEADING = re.compile(r"exclusion criteria\s*:?", re.IGNORECASE)
+INCLUSION_HEADING = re.compile(r"^\s*inclusion criteria\s*:?", re.IGNORECASE)
+
+
+def _flatten(value, prefix: str = "") -> list:
+    """Renders a (nested) protocol module as "path: value" lines."""
+    if isinstance(value, dict):
+        return [line for key, item in value.items() for line in _flatten(item, f"{prefix}{key}.")]
+    if isinstance(value, list):
+        if all(not isinstance(item, (dict, list)) for item in value):
+            return [f"{prefix.rstrip('.')}: {', '.join(str(item) for item in value)}"] if value else []
+        return [line for item in value for line in _flatten(item, prefix)]
+    if value is None or value == "":
+        return []
+    return [f"{prefix.rstrip('.')}: {value}"]
+
+
+def _split_chunks(lines: list, max_chars: int) -> list:
+    """Packs lines into chunks of at most `max_chars` characters, splitting over-long lines."""
+    chunks, current = [], ""
+    for line in lines:
+        while len(line) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + 1 + len(line) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_module_chunks(protocol: dict, max_chars: int = MAX_CHUNK_CHARS) -> list:
+    """
+    Splits the indexed modules of a trial into the text chunks stored in the vector index.
+
+    Vector ids are derived from the NCT ID, module and chunk position, so re-ingesting a trial
+    overwrites its vectors instead of duplicating them.
+
+    Args:
+        protocol (dict): The "protocolSection" of a ClinicalTrials.gov study.
+        max_chars (int, optional): Longest chunk text. Defaults to MAX_CHUNK_CHARS.
+
+    Returns:
+        list: Chunks as {"id", "nctId", "module", "text"}.
+    """
+    nct_id = protocol["identificationModule"]["nctId"]
+    chunks = []
+    for module in INDEXED_MODULES:
+        lines = _flatten(protocol.get(module) or {})
+        for position, text in enumerate(_split_chunks(lines, max_chars)):
+            chunks.append({"id": f"{nct_id}#{module}#{position}", "nctId": nct_id, "module": module, "text": text})
+    return chunks
+
+
+def build_section_texts(protocol: dict) -> dict:
+    """
+    Extracts the texts of the sections stored in t2dm_final_data_samples_processed_embeddings.
+
+    Args:
+        protocol (dict): The "protocolSection" of a ClinicalTrials.gov study.
+
+    Returns:
+        dict: Embedding field (see `EMBEDDING_SECTIONS`) -> text, for the sections the trial has.
+    """
+    criteria = protocol.get("eligibilityModule", {}).get("eligibilityCriteria") or ""
+    exclusion_match = EXCLUSION_HEADING.search(criteria)
+    inclusion = criteria[:exclusion_match.start()] if exclusion_match else criteria
+    exclusion = criteria[exclusion_match.end():] if exclusion_match else ""
+
+    identification = protocol.get("identificationModule", {})
+    outcomes = protocol.get("outcomesModule", {}).get("primaryOutcomes", [])
+    texts = {
+        "inclusionCriteria": INCLUSION_HEADING.sub("", inclusion).strip(),
+        "exclusionCriteria": exclusion.strip(),
+        "officialTitle": (identification.get("officialTitle") or identification.get("briefTitle") or "").strip(),
+        "primaryOutcomes": "\n".join(
+            " - ".join(str(outcome[key]) for key in ("measure", "description", "timeFrame") if outcome.get(key))
+            for outcome in outcomes
+        ).strip(),
+        "conditions": ", ".join(protocol.get("conditionsModule", {}).get("conditions", [])).strip(),
+    }
+    return {section: text[:MAX_CHUNK_CHARS] for section, text in texts.items() if text}
@@ -1,9 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 import pytz
 from trial_document_search.routes import routes
-app = FastAPI()
+from providers.provider_registry import provider_registry
+from trial_document_search.services.search_job_runner import search_job_runner
+from database.trial_analysis.job_status import ensure_bookkeeping_indexes
+from database.trial_analysis.write_behind_queue import bookkeeping_writer
+from trial_document_search.utils.logger_setup import logger
+from observability.metrics import metrics, write_behind_writes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the shared provider clients once and release their connections on shutdown
+    await provider_registry.start()
+    indexes_response = await ensure_bookkeeping_indexes()
+    if indexes_response["success"]:
+        logger.info(indexes_response["message"])
+    else:
+        logger.error(indexes_response["message"])
+    yield
+    # Let accepted background searches finish before the provider clients are closed
+    await search_job_runner.shutdown()
+    # Flush the queued result and status writes while the database client is still open
+    await bookkeeping_writer.close()
+    await provider_registry.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Set Mumbai timezone (IST)
 mumbai_tz = pytz.timezone("Asia/Kolkata")
@@ -29,3 +55,10 @@ async def root():
         "message": "Slices Clinical Trial Service Running",
         "server_started_at": server_start_time
     }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # Search stage and dependency timings in the Prometheus text format, scraped per worker process
+    for state, count in bookkeeping_writer.stats().items():
+        write_behind_writes.labels(state=state).set(count)
+    return PlainTextResponse(metrics.render(), media_type=metrics.content_type)
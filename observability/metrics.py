@@ -0,0 +1,106 @@
+import os
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+# Histogram buckets in seconds, from a millisecond up to the slowest expected dependency call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Histogram buckets of candidate trial counts, up to the deepest retrieval of every criterion
+CANDIDATE_BUCKETS = (0, 10, 25, 50, 100, 200, 400, 800)
+
+
+class MetricsRegistry:
+    """
+    Registry of the service metrics, rendered in the Prometheus text format by GET /metrics.
+
+    The metrics are `prometheus_client` metrics registered on a registry of their own, so only the
+    service metrics are exposed. They are kept per worker process; Prometheus scrapes every worker
+    separately. Recording can be switched off with METRICS_ENABLED=false, which leaves the metrics empty.
+    """
+
+    # Content type of the rendered metrics
+    content_type = CONTENT_TYPE_LATEST
+
+    def __init__(self, enabled: bool = None) -> None:
+        """
+        Args:
+            enabled (bool, optional): Whether observations are recorded (METRICS_ENABLED, default true).
+        """
+        load_dotenv()
+        self.enabled = enabled if enabled is not None else os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self.registry = CollectorRegistry()
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return Counter(name, documentation, labelnames, registry=self.registry)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return Gauge(name, documentation, labelnames, registry=self.registry)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return Histogram(name, documentation, labelnames, registry=self.registry, buckets=buckets)
+
+    def render(self) -> bytes:
+        """Renders every metric in the Prometheus text exposition format."""
+        return generate_latest(self.registry)
+
+
+# Process-wide metrics registry, exposed by GET /metrics in main.py
+metrics = MetricsRegistry()
+
+search_stage_seconds = metrics.histogram(
+    "search_stage_duration_seconds", "Duration of each stage of a document search.", ("stage",)
+)
+search_candidates = metrics.histogram(
+    "search_candidates", "Candidate trials of a document search, at each stage.", ("stage",), CANDIDATE_BUCKETS
+)
+dependency_request_seconds = metrics.histogram(
+    "dependency_request_duration_seconds", "Duration of outbound calls, per dependency, operation and target.",
+    ("dependency", "operation", "target")
+)
+dependency_errors = metrics.counter(
+    "dependency_errors_total", "Failed outbound calls, per dependency, operation and target.",
+    ("dependency", "operation", "target")
+)
+write_behind_writes = metrics.gauge(
+    "write_behind_writes", "Bookkeeping writes of the write-behind queue: pending, written and dropped.", ("state",)
+)
+
+
+def record_stage_duration(stage: str, seconds: float) -> None:
+    """Records the duration of a document search stage."""
+    if metrics.enabled:
+        search_stage_seconds.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def search_stage(stage: str):
+    """Times the enclosed block as a document search stage."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage_duration(stage, time.perf_counter() - started_at)
+
+
+@contextmanager
+def dependency_call(dependency: str, operation: str, target: str = ""):
+    """Times the enclosed outbound call, counting it as an error if it raises."""
+    if not metrics.enabled:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        dependency_errors.labels(dependency=dependency, operation=operation, target=target).inc()
+        raise
+    finally:
+        dependency_request_seconds.labels(dependency=dependency, operation=operation,
+                                          target=target).observe(time.perf_counter() - started_at)
+
+
+def record_candidates(stage: str, count: int) -> None:
+    """Records the number of candidate trials of a search at a stage."""
+    if metrics.enabled:
+        search_candidates.labels(stage=stage).observe(count)
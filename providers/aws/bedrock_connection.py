@@ -3,6 +3,7 @@ import boto3
 import json
 from dotenv import load_dotenv
 from botocore.exceptions import ClientError
+from observability.metrics import dependency_call
 
 
 class BedrockLlamaClient:
@@ -47,14 +48,15 @@ class BedrockLlamaClient:
             dict: Response dictionary with success status, message, and generated text.
         """
         try:
-            response = self.client.invoke_model(
-                modelId=model_id,
-                contentType="application/json",
-                accept="application/json",
-                body=request_payload
-            )
-
-            model_response = json.loads(response["body"].read().decode("utf-8"))
+            with dependency_call("bedrock", "invoke_model", model_id):
+                response = self.client.invoke_model(
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=request_payload
+                )
+
+                model_response = json.loads(response["body"].read().decode("utf-8"))
             return {
                 "success": True,
                 "message": f"Successfully generated text using {model_id}.",
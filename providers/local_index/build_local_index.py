@@ -0,0 +1,209 @@
+"""
+Exports the vectors and metadata of the Pinecone index into a versioned local vector index.
+
+Usage:
+    python -m providers.local_index.build_local_index --output /data/local_index
+    python -m providers.local_index.build_local_index --output /data/local_index --nlist 1024 --no-activate
+
+Serve the index with VECTOR_STORE_BACKEND=local and LOCAL_VECTOR_INDEX_PATH=<output>. The new version
+is written to a temporary directory, renamed into place once complete and then made current, so a
+running service never sees a half-written index. An IVF index is trained when the export holds at
+least IVF_MIN_VECTORS vectors, or when --nlist is given.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import numpy as np
+from dotenv import load_dotenv
+from providers.pinecone.pinecone_connection import PineconeVectorStore
+from providers.local_index.local_vector_store import (
+    ASSIGNMENTS_FILE, CENTROIDS_FILE, CURRENT_FILE, IDS_FILE, MANIFEST_FILE, METADATA_FILE, SCAN_CHUNK_ROWS,
+    VECTORS_FILE
+)
+
+# Below this many vectors an exact search is fast enough and no IVF index is trained by default
+IVF_MIN_VECTORS = 100000
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 50000,
+              seed: int = 0) -> tuple:
+    """
+    Trains a spherical k-means IVF index on L2-normalized vectors.
+
+    Args:
+        vectors (np.ndarray): (rows, dimension) L2-normalized vectors.
+        nlist (int): Number of IVF lists.
+        iterations (int, optional): k-means iterations. Defaults to 10.
+        sample_size (int, optional): Vectors the centroids are trained on. Defaults to 50000.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        tuple: ((nlist, dimension) float32 centroids, (rows,) int32 list of every vector)
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))])
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for list_id in range(nlist):
+            members = sample[assignments == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[list_id] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+    assignments = np.concatenate([
+        np.argmax(vectors[offset:offset + SCAN_CHUNK_ROWS] @ centroids.T, axis=1)
+        for offset in range(0, len(vectors), SCAN_CHUNK_ROWS)
+    ]).astype(np.int32)
+    return centroids.astype(np.float32), assignments
+
+
+def write_local_index(output: str, ids: list, vectors: np.ndarray, metadata: list, version: str = None,
+                      nlist: int = None, source: str = None, activate: bool = True) -> dict:
+    """
+    Writes vectors and their metadata as a new local vector index version.
+
+    Args:
+        output (str): Index root directory.
+        ids (list): Vector ids.
+        vectors (np.ndarray): (rows, dimension) vectors, in the order of `ids`. Normalized while written.
+        metadata (list): Metadata of every vector (must hold "nctId" and "module").
+        version (str, optional): Version name. Defaults to a UTC timestamp.
+        nlist (int, optional): IVF lists. Defaults to 4 * sqrt(rows) from IVF_MIN_VECTORS vectors, else none.
+        source (str, optional): Description of where the vectors come from, kept in the manifest.
+        activate (bool, optional): Whether to point CURRENT at the new version. Defaults to True.
+
+    Returns:
+        dict: Manifest of the written version.
+    """
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    final_path = os.path.join(output, version)
+    if os.path.exists(final_path):
+        raise FileExistsError(f"Local vector index version already exists: {final_path}")
+
+    staging_path = os.path.join(output, f".{version}.tmp")
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+
+    row_count, dimension = vectors.shape
+    normalized = np.lib.format.open_memmap(os.path.join(staging_path, VECTORS_FILE), mode="w+",
+                                           dtype=np.float32, shape=(row_count, dimension))
+    for offset in range(0, row_count, SCAN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[offset:offset + SCAN_CHUNK_ROWS], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        normalized[offset:offset + SCAN_CHUNK_ROWS] = chunk / norms
+    normalized.flush()
+
+    if nlist is None:
+        nlist = int(4 * np.sqrt(row_count)) if row_count >= IVF_MIN_VECTORS else 0
+    nlist = min(nlist, row_count)
+    if nlist:
+        centroids, assignments = train_ivf(normalized, nlist)
+        np.save(os.path.join(staging_path, CENTROIDS_FILE), centroids)
+        np.save(os.path.join(staging_path, ASSIGNMENTS_FILE), assignments)
+    del normalized
+
+    manifest = {
+        "version": version,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "dimension": dimension,
+        "count": row_count,
+        "dtype": "float32",
+        "metric": "cosine",
+        "nlist": nlist,
+    }
+    with open(os.path.join(staging_path, IDS_FILE), "w") as ids_file:
+        json.dump(list(ids), ids_file)
+    with open(os.path.join(staging_path, METADATA_FILE), "w") as metadata_file:
+        json.dump(list(metadata), metadata_file)
+    with open(os.path.join(staging_path, MANIFEST_FILE), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    os.rename(staging_path, final_path)
+    if activate:
+        current_tmp = os.path.join(output, f".{CURRENT_FILE}.tmp")
+        with open(current_tmp, "w") as current_file:
+            current_file.write(version)
+        os.replace(current_tmp, os.path.join(output, CURRENT_FILE))
+    return manifest
+
+
+def build_local_index(output: str, namespace: str = "", version: str = None, nlist: int = None,
+                      batch_size: int = 100, activate: bool = True) -> dict:
+    """
+    Exports a namespace of the Pinecone index into a local vector index.
+
+    Args:
+        output (str): Index root directory.
+        namespace (str, optional): Namespace to export. Defaults to the default namespace.
+        version (str, optional): Version name. Defaults to a UTC timestamp.
+        nlist (int, optional): IVF lists (see `write_local_index`).
+        batch_size (int, optional): Vectors fetched per request. Defaults to 100.
+        activate (bool, optional): Whether to point CURRENT at the new version. Defaults to True.
+
+    Returns:
+        dict: Manifest of the written version.
+    """
+    vector_store = PineconeVectorStore()
+    index = vector_store.pinecone_index
+    namespaces = index.describe_index_stats().namespaces
+    capacity = namespaces[namespace].vector_count if namespace in namespaces else 0
+    if capacity == 0:
+        raise ValueError(f"Namespace {namespace!r} of {vector_store.index_name} holds no vectors")
+
+    os.makedirs(output, exist_ok=True)
+    export_path = os.path.join(output, ".export.tmp.npy")
+    vectors = np.lib.format.open_memmap(export_path, mode="w+", dtype=np.float32,
+                                        shape=(capacity, vector_store.dimension))
+    ids, metadata = [], []
+    started_at = time.perf_counter()
+    try:
+        for page_ids in index.list(namespace=namespace):
+            for offset in range(0, len(page_ids), batch_size):
+                fetched = index.fetch(ids=page_ids[offset:offset + batch_size], namespace=namespace).vectors
+                for vector_id, vector in fetched.items():
+                    # Vectors upserted after describe_index_stats() are left for the next export
+                    if len(ids) >= capacity:
+                        break
+                    vectors[len(ids)] = vector.values
+                    ids.append(vector_id)
+                    metadata.append(dict(vector.metadata or {}))
+            print(f"Exported {len(ids)}/{capacity} vectors ({time.perf_counter() - started_at:.1f}s)")
+
+        manifest = write_local_index(output, ids, vectors[:len(ids)], metadata, version=version, nlist=nlist,
+                                     source=f"pinecone:{vector_store.index_name}/{namespace}", activate=activate)
+    finally:
+        del vectors
+        os.remove(export_path)
+
+    print(f"Built local vector index {manifest['version']} with {manifest['count']} vectors "
+          f"and {manifest['nlist']} IVF lists in {time.perf_counter() - started_at:.1f}s")
+    return manifest
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export the Pinecone index into a local vector index.")
+    parser.add_argument("--output", default=os.getenv("LOCAL_VECTOR_INDEX_PATH"), help="Index root directory")
+    parser.add_argument("--namespace", default="", help="Namespace to export (default namespace if omitted)")
+    parser.add_argument("--version", default=None, help="Version name (defaults to a UTC timestamp)")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (0 for exact search only)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Vectors fetched per request")
+    parser.add_argument("--no-activate", action="store_true", help="Do not make the new version current")
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("--output is required when LOCAL_VECTOR_INDEX_PATH is not set")
+
+    build_local_index(output=args.output, namespace=args.namespace, version=args.version, nlist=args.nlist,
+                      batch_size=args.batch_size, activate=not args.no_activate)
+
+
+if __name__ == "__main__":
+    main()
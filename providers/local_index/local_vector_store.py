@@ -0,0 +1,238 @@
+import json
+import os
+import numpy as np
+from providers.vector_store import VectorStore
+from trial_document_search.utils.lru_ttl_cache import LRUTTLCache
+from observability.metrics import dependency_call
+
+MANIFEST_FILE = "manifest.json"
+IDS_FILE = "ids.json"
+METADATA_FILE = "metadata.json"
+VECTORS_FILE = "vectors.npy"
+CENTROIDS_FILE = "ivf_centroids.npy"
+ASSIGNMENTS_FILE = "ivf_assignments.npy"
+CURRENT_FILE = "CURRENT"
+
+# Rows scored per matrix product when scanning the whole index
+SCAN_CHUNK_ROWS = 65536
+
+
+def _metadata_matches(field_value, operator: str, value) -> bool:
+    """Evaluates one Pinecone filter operator on a metadata value (list values match if any element does)."""
+    values = field_value if isinstance(field_value, list) else ([] if field_value is None else [field_value])
+    if operator == "$eq":
+        return value in values
+    if operator == "$ne":
+        return value not in values
+    if operator == "$in":
+        return any(item in value for item in values)
+    if operator == "$nin":
+        return not any(item in value for item in values)
+    if operator == "$exists":
+        return bool(values) == value
+    numbers = [item for item in values if isinstance(item, (int, float)) and not isinstance(item, bool)]
+    if operator == "$gt":
+        return any(item > value for item in numbers)
+    if operator == "$gte":
+        return any(item >= value for item in numbers)
+    if operator == "$lt":
+        return any(item < value for item in numbers)
+    if operator == "$lte":
+        return any(item <= value for item in numbers)
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+class LocalVectorStore(VectorStore):
+    """
+    An in-process vector index, a drop-in for the Pinecone index built from the same vectors and metadata.
+
+    A store root holds one directory per exported version and a CURRENT file naming the active one
+    (see `providers.local_index.build_local_index`). Each version directory contains:
+        - manifest.json: version, source, dimension, row count and number of IVF lists
+        - ids.json and metadata.json: the vector id and metadata of every row
+        - vectors.npy: (rows, dimension) L2-normalized float32 matrix, memory-mapped
+        - ivf_centroids.npy and ivf_assignments.npy: the IVF index, when one was built
+
+    Scores are cosine similarities, as returned by the Pinecone index. Search is exact (a full
+    matrix product) unless an IVF index exists and the search mode allows it, in which case only the
+    `nprobe` lists closest to the query are scored. Pinecone filter expressions ($eq, $ne, $in, $nin,
+    $gt, $gte, $lt, $lte, $exists, $and, $or) are evaluated on the metadata; the `module` equality
+    filter uses a precomputed row index and other filters are cached once evaluated.
+    """
+
+    def __init__(self, root: str, version: str = None, search_mode: str = None, nprobe: int = None) -> None:
+        """
+        Opens an index version.
+
+        Args:
+            root (str): Index root directory.
+            version (str, optional): Version to open. Defaults to the version named in CURRENT.
+            search_mode (str, optional): "exact", "ivf" or "auto" (IVF when the version has one).
+                Defaults to the LOCAL_VECTOR_SEARCH environment variable, or "auto".
+            nprobe (int, optional): IVF lists scored per query. Defaults to LOCAL_VECTOR_NPROBE, or 16.
+
+        Raises:
+            FileNotFoundError: If the index or the requested version does not exist.
+        """
+        if version is None:
+            with open(os.path.join(root, CURRENT_FILE)) as current_file:
+                version = current_file.read().strip()
+
+        self.root = root
+        self.path = os.path.join(root, version)
+        with open(os.path.join(self.path, MANIFEST_FILE)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        with open(os.path.join(self.path, IDS_FILE)) as ids_file:
+            self.ids = json.load(ids_file)
+        with open(os.path.join(self.path, METADATA_FILE)) as metadata_file:
+            self.metadata = json.load(metadata_file)
+
+        self.version = self.manifest["version"]
+        self.index_name = f"local:{self.version}"
+        self.dimension = self.manifest["dimension"]
+        self.vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="r")
+
+        self.module_rows = {}
+        for row, metadata in enumerate(self.metadata):
+            self.module_rows.setdefault(metadata.get("module"), []).append(row)
+        self.module_rows = {module: np.asarray(rows, dtype=np.int64) for module, rows in self.module_rows.items()}
+        self.filter_masks = LRUTTLCache(max_size=256)
+
+        search_mode = (search_mode or os.getenv("LOCAL_VECTOR_SEARCH", "auto")).lower()
+        self.nprobe = nprobe if nprobe is not None else int(os.getenv("LOCAL_VECTOR_NPROBE", "16"))
+        self.centroids = None
+        if search_mode != "exact" and self.manifest.get("nlist"):
+            self.centroids = np.load(os.path.join(self.path, CENTROIDS_FILE))
+            assignments = np.load(os.path.join(self.path, ASSIGNMENTS_FILE))
+            self.list_rows = np.argsort(assignments, kind="stable")
+            self.list_offsets = np.searchsorted(assignments[self.list_rows], np.arange(len(self.centroids) + 1))
+        elif search_mode == "ivf":
+            raise ValueError(f"Local vector index {self.version} has no IVF index")
+
+    def vector_count(self) -> int:
+        return len(self.ids)
+
+    def _filter_mask(self, expression: dict) -> np.ndarray:
+        """Evaluates a Pinecone filter expression into a row mask."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in expression.items():
+            if field in ("$and", "$or"):
+                sub_masks = [self._filter_mask(sub_expression) for sub_expression in condition]
+                mask &= np.logical_and.reduce(sub_masks) if field == "$and" else np.logical_or.reduce(sub_masks)
+                continue
+
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, value in condition.items():
+                if field == "module" and operator == "$eq":
+                    field_mask = np.zeros(len(self.ids), dtype=bool)
+                    field_mask[self.module_rows.get(value, [])] = True
+                else:
+                    field_mask = np.fromiter(
+                        (_metadata_matches(metadata.get(field), operator, value) for metadata in self.metadata),
+                        dtype=bool, count=len(self.metadata)
+                    )
+                mask &= field_mask
+        return mask
+
+    def _candidate_rows(self, filters: dict) -> np.ndarray | None:
+        """Returns the rows passing the filter (None when every row passes)."""
+        if not filters:
+            return None
+        if set(filters) == {"module"} and set(filters["module"]) == {"$eq"}:
+            return self.module_rows.get(filters["module"]["$eq"], np.zeros(0, dtype=np.int64))
+
+        filter_key = json.dumps(filters, sort_keys=True)
+        rows = self.filter_masks.get(filter_key)
+        if rows is None:
+            rows = np.flatnonzero(self._filter_mask(filters))
+            self.filter_masks.set(filter_key, rows)
+        return rows
+
+    def _score(self, query: np.ndarray, rows: np.ndarray | None) -> tuple:
+        """Returns (rows, cosine scores) of the given rows, or of every row."""
+        if rows is None:
+            scores = np.concatenate([
+                self.vectors[offset:offset + SCAN_CHUNK_ROWS] @ query
+                for offset in range(0, len(self.ids), SCAN_CHUNK_ROWS)
+            ]) if len(self.ids) else np.zeros(0, dtype=np.float32)
+            return np.arange(len(self.ids)), scores
+        return rows, self.vectors[rows] @ query
+
+    def _probe_rows(self, query: np.ndarray, candidate_rows: np.ndarray | None) -> np.ndarray:
+        """Returns the rows of the IVF lists closest to the query, restricted to the candidate rows."""
+        nprobe = min(self.nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.sort(np.concatenate([
+            self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]] for list_id in lists
+        ]))
+        if candidate_rows is not None:
+            rows = np.intersect1d(rows, candidate_rows, assume_unique=True)
+        return rows
+
+    def query(self, vector, filters=None, k=5, include_values=True, namespace=None):
+        """
+        Queries the local index for similar vectors.
+
+        Parameters:
+            vector (list): The embedding vector to search.
+            filters (dict, optional): Metadata filters for query.
+            k (int, optional): Number of top results to fetch.
+            include_values (bool, optional): Whether the matches carry their vectors.
+            namespace (str, optional): Only the default namespace (None or "") is available locally.
+
+        Returns:
+            dict: Query results, in the Pinecone response layout.
+        """
+        if namespace:
+            raise ValueError(f"The local vector index has no namespace {namespace!r}")
+        with dependency_call("local_vector_index", "query", self.index_name):
+            return self._query(vector, filters, k, include_values)
+
+    def _query(self, vector, filters, k, include_values):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        candidate_rows = self._candidate_rows(filters)
+        rows = None
+        if self.centroids is not None:
+            rows = self._probe_rows(query, candidate_rows)
+            # Fall back to an exact search when the probed lists hold too few eligible vectors
+            if len(rows) < k:
+                rows = None
+        rows, scores = self._score(query, candidate_rows if rows is None else rows)
+
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))
+
+        matches = []
+        for position in order:
+            row = rows[position]
+            match = {"id": self.ids[row], "score": float(scores[position]), "metadata": self.metadata[row]}
+            if include_values:
+                match["values"] = self.vectors[row].tolist()
+            matches.append(match)
+        return {"matches": matches}
+
+
+def open_local_vector_store(root: str = None) -> LocalVectorStore:
+    """
+    Opens the current version of the configured local vector index.
+
+    Args:
+        root (str, optional): Index root directory. Defaults to the LOCAL_VECTOR_INDEX_PATH environment variable.
+
+    Returns:
+        LocalVectorStore: The opened index.
+
+    Raises:
+        ValueError: If no index root is configured.
+    """
+    root = root or os.getenv("LOCAL_VECTOR_INDEX_PATH")
+    if not root:
+        raise ValueError("LOCAL_VECTOR_INDEX_PATH is not set in environment variables.")
+    return LocalVectorStore(root)
@@ -0,0 +1,39 @@
+# Inputs per embeddings request accepted by the OpenAI API
+MAX_EMBEDDING_INPUTS = 2048
+# Estimated tokens per embeddings request. The API rejects requests above 300,000 tokens, and the
+# estimate of `estimate_tokens` can fall short of the real count, so this leaves a third of headroom.
+MAX_EMBEDDING_REQUEST_TOKENS = 200000
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the tokens of an English text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def split_embedding_batches(texts: list, batch_size: int = MAX_EMBEDDING_INPUTS,
+                            max_tokens: int = MAX_EMBEDDING_REQUEST_TOKENS) -> list:
+    """
+    Splits texts into embeddings requests, by number of inputs and by estimated tokens.
+
+    Args:
+        texts (list): Texts to embed, in order.
+        batch_size (int, optional): Texts per request (at most MAX_EMBEDDING_INPUTS).
+        max_tokens (int, optional): Estimated tokens per request (see `estimate_tokens`).
+
+    Returns:
+        list: Consecutive batches (lists of texts) covering the texts in order. A text estimated above
+              `max_tokens` is sent alone.
+    """
+    batch_size = max(1, min(batch_size, MAX_EMBEDDING_INPUTS))
+    batches = []
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
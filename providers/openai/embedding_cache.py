@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import unicodedata
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+from bson.binary import Binary
+from pymongo import UpdateOne
+from database.mongo_db_connection import MongoDBDAO, AsyncMongoDBDAO
+from trial_document_search.utils.lru_ttl_cache import LRUTTLCache
+
+
+class EmbeddingCache:
+    """
+    A two-tier cache for text embeddings keyed by (model, normalized text hash).
+
+    The first tier is an in-process LRU with size and TTL eviction. The second tier is a shared
+    MongoDB collection, so every worker and every restart benefits from embeddings computed once.
+    Vectors are persisted as raw float64 bytes, which round-trips them without any loss.
+    """
+
+    def __init__(self, max_size: int = None, ttl_seconds: float = None, collection_name: str = None,
+                 persistent: bool = None) -> None:
+        """
+        Initializes the cache. Unset arguments are read from the environment.
+
+        Args:
+            max_size (int, optional): Entries kept in memory (EMBEDDING_CACHE_MAX_SIZE, default 4096).
+            ttl_seconds (float, optional): In-memory entry lifetime (EMBEDDING_CACHE_TTL_SECONDS, default 86400).
+            collection_name (str, optional): Mongo collection of the persistent tier
+                                             (EMBEDDING_CACHE_COLLECTION, default "embedding_cache").
+            persistent (bool, optional): Whether the Mongo tier is used (EMBEDDING_CACHE_PERSISTENT, default true).
+        """
+        load_dotenv()
+
+        self.memory = LRUTTLCache(
+            max_size=max_size if max_size is not None else int(os.getenv("EMBEDDING_CACHE_MAX_SIZE", "4096")),
+            ttl_seconds=ttl_seconds if ttl_seconds is not None else float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400")),
+        )
+        self.collection_name = collection_name or os.getenv("EMBEDDING_CACHE_COLLECTION", "embedding_cache")
+        self.persistent = (persistent if persistent is not None
+                           else os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true")
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        # Mongo clients are only opened once the persistent tier is actually used
+        self._dao = None
+        self._async_dao = None
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Builds the cache key for `text` embedded with `model`."""
+        normalized_text = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+        return f"{model}:{hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()}"
+
+    def use_async_dao(self, async_dao: AsyncMongoDBDAO) -> None:
+        """Makes the persistent tier reuse an existing (shared) async DAO."""
+        self._async_dao = async_dao
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters of both tiers."""
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "memory_size": len(self.memory),
+        }
+
+    def _lookup_memory(self, keys: list) -> dict:
+        found = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+        self.memory_hits += len(found)
+        return found
+
+    def _remember(self, persisted_documents: list) -> dict:
+        found = {}
+        for document in persisted_documents:
+            vector = np.frombuffer(document["vector"], dtype=np.float64)
+            self.memory.set(document["_id"], vector)
+            found[document["_id"]] = vector
+        self.persistent_hits += len(found)
+        return found
+
+    def _persist_operations(self, vectors: dict, model: str) -> list:
+        for key, vector in vectors.items():
+            self.memory.set(key, np.asarray(vector, dtype=np.float64))
+        return [
+            UpdateOne(
+                {"_id": key},
+                {"$setOnInsert": {
+                    "model": model,
+                    "vector": Binary(np.asarray(vector, dtype=np.float64).tobytes()),
+                    "createdAt": datetime.now(),
+                }},
+                upsert=True,
+            )
+            for key, vector in vectors.items()
+        ]
+
+    def get_many(self, keys: list) -> dict:
+        """Returns the cached vectors for `keys`, looking up the persistent tier for memory misses."""
+        found = self._lookup_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.persistent:
+            try:
+                self._dao = self._dao or MongoDBDAO()
+                found |= self._remember(self._dao.find(self.collection_name, {"_id": {"$in": missing}}))
+            except Exception as e:
+                print(f"Embedding cache lookup failed: {e}")
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, vectors: dict, model: str) -> None:
+        """Stores `vectors` (key -> embedding) in both tiers."""
+        operations = self._persist_operations(vectors, model)
+        if operations and self.persistent:
+            try:
+                self._dao = self._dao or MongoDBDAO()
+                self._dao.bulk_write(self.collection_name, operations)
+            except Exception as e:
+                print(f"Embedding cache write failed: {e}")
+
+    async def get_many_async(self, keys: list) -> dict:
+        """Asynchronous counterpart of `get_many`."""
+        found = self._lookup_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.persistent:
+            try:
+                self._async_dao = self._async_dao or AsyncMongoDBDAO()
+                found |= self._remember(await self._async_dao.find(self.collection_name, {"_id": {"$in": missing}}))
+            except Exception as e:
+                print(f"Embedding cache lookup failed: {e}")
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set_many_async(self, vectors: dict, model: str) -> None:
+        """Asynchronous counterpart of `set_many`."""
+        operations = self._persist_operations(vectors, model)
+        if operations and self.persistent:
+            try:
+                self._async_dao = self._async_dao or AsyncMongoDBDAO()
+                await self._async_dao.bulk_write(self.collection_name, operations)
+            except Exception as e:
+                print(f"Embedding cache write failed: {e}")
+
+
+# Process-wide cache shared by every OpenAIClient
+embedding_cache = EmbeddingCache()
@@ -1,7 +1,9 @@
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import numpy as np
+from providers.openai.embedding_cache import EmbeddingCache, embedding_cache
+from observability.metrics import dependency_call
 
 
 class OpenAIClient:
@@ -11,7 +13,7 @@ class OpenAIClient:
     This class provides methods to generate responses using OpenAI's chat models and create text embeddings.
     """
 
-    def __init__(self, max_tokens: int = 4000, temperature: float = 0.1) -> None:
+    def __init__(self, max_tokens: int = 4000, temperature: float = 0.1, cache: EmbeddingCache = None) -> None:
         """
         Initializes the OpenAIClient with API credentials and default parameters.
 
@@ -19,6 +21,8 @@ class OpenAIClient:
             max_tokens (int, optional): Maximum number of tokens to generate in a response. Defaults to 4000.
             temperature (float, optional): Controls randomness in responses. Higher values (e.g., 1.0) produce more varied outputs,
                                           while lower values (e.g., 0.2) make it more deterministic. Defaults to 0.7.
+            cache (EmbeddingCache, optional): Cache consulted before every embeddings request.
+                                              Defaults to the process-wide embedding cache.
 
         Raises:
             ValueError: If the OpenAI API key is not set in environment variables.
@@ -32,6 +36,8 @@ class OpenAIClient:
         self.max_tokens = max_tokens
         self.temperature = temperature
         self.client = OpenAI()
+        self.async_client = AsyncOpenAI()
+        self.embedding_cache = cache if cache is not None else embedding_cache
 
     def generate_text(self, messages: list[dict], model: str = "gpt-4o",
                       response_format: dict = None, stream: bool = False) -> dict:
@@ -55,14 +61,15 @@ class OpenAIClient:
             "data": None
         }
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                response_format=response_format if response_format else None,
-                stream=stream,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
-            )
+            with dependency_call("openai", "chat_completions", model):
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format if response_format else None,
+                    stream=stream,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature
+                )
             final_response.update({
                 "success": True,
                 "message": "Successfully generated text.",
@@ -78,6 +85,7 @@ class OpenAIClient:
     def generate_embeddings(self, text: str, model: str = "text-embedding-3-small") -> dict:
         """
         Generates an embedding vector for the given text using OpenAI's embedding model.
+        Previously embedded texts are served from the embedding cache.
 
         Args:
             text (str): The input text to generate an embedding for.
@@ -92,13 +100,102 @@ class OpenAIClient:
             "data": None
         }
         try:
-            embedding_response = self.client.embeddings.create(input=[text], model=model)
-            embeddings = np.array(embedding_response.data[0].embedding).reshape(1, -1)
+            cache_key = self.embedding_cache.make_key(text, model)
+            cached = self.embedding_cache.get_many([cache_key])
+            if cache_key in cached:
+                embedding = cached[cache_key]
+            else:
+                with dependency_call("openai", "embeddings", model):
+                    embedding_response = self.client.embeddings.create(input=[text], model=model)
+                embedding = np.array(embedding_response.data[0].embedding)
+                self.embedding_cache.set_many({cache_key: embedding}, model)
 
             final_response.update({
                 "success": True,
                 "message": "Successfully generated embedding.",
-                "data": embeddings
+                "data": np.array(embedding).reshape(1, -1)
+            })
+        except Exception as e:
+            error_message = f"An error occurred while generating embeddings: {e}"
+            print(error_message)
+            final_response["message"] = error_message
+
+        return final_response
+
+    async def generate_embeddings_async(self, text: str, model: str = "text-embedding-3-small") -> dict:
+        """
+        Asynchronous counterpart of `generate_embeddings` that does not block the event loop.
+
+        Args:
+            text (str): The input text to generate an embedding for.
+            model (str, optional): The OpenAI embedding model to use. Defaults to "text-embedding-3-small".
+
+        Returns:
+            dict: A dictionary containing the embedding vector, success status, and message.
+        """
+        final_response = {
+            "success": False,
+            "message": "Failed to generate embedding.",
+            "data": None
+        }
+        try:
+            cache_key = self.embedding_cache.make_key(text, model)
+            cached = await self.embedding_cache.get_many_async([cache_key])
+            if cache_key in cached:
+                embedding = cached[cache_key]
+            else:
+                with dependency_call("openai", "embeddings", model):
+                    embedding_response = await self.async_client.embeddings.create(input=[text], model=model)
+                embedding = np.array(embedding_response.data[0].embedding)
+                await self.embedding_cache.set_many_async({cache_key: embedding}, model)
+
+            final_response.update({
+                "success": True,
+                "message": "Successfully generated embedding.",
+                "data": np.array(embedding).reshape(1, -1)
+            })
+        except Exception as e:
+            error_message = f"An error occurred while generating embeddings: {e}"
+            print(error_message)
+            final_response["message"] = error_message
+
+        return final_response
+
+    async def generate_batch_embeddings_async(self, texts: list[str], model: str = "text-embedding-3-small") -> dict:
+        """
+        Generates embedding vectors for several texts with a single embeddings request.
+        Only texts missing from the embedding cache are sent to OpenAI.
+
+        Args:
+            texts (list[str]): The input texts to generate embeddings for.
+            model (str, optional): The OpenAI embedding model to use. Defaults to "text-embedding-3-small".
+
+        Returns:
+            dict: A dictionary containing a (len(texts), dimension) embedding matrix in input order,
+                  success status, and message.
+        """
+        final_response = {
+            "success": False,
+            "message": "Failed to generate embeddings.",
+            "data": None
+        }
+        try:
+            cache_keys = [self.embedding_cache.make_key(text, model) for text in texts]
+            embeddings = await self.embedding_cache.get_many_async(list(dict.fromkeys(cache_keys)))
+
+            missing = {key: text for key, text in zip(cache_keys, texts) if key not in embeddings}
+            if missing:
+                with dependency_call("openai", "embeddings", model):
+                    embedding_response = await self.async_client.embeddings.create(input=list(missing.values()), model=model)
+                ordered_data = sorted(embedding_response.data, key=lambda item: item.index)
+                generated = {key: np.array(item.embedding) for key, item in zip(missing.keys(), ordered_data)}
+                await self.embedding_cache.set_many_async(generated, model)
+                embeddings |= generated
+
+            final_response.update({
+                "success": True,
+                "message": f"Successfully generated {len(texts)} embeddings ({len(missing)} requested from OpenAI).",
+                "data": np.array([embeddings[key] for key in cache_keys])
             })
         except Exception as e:
             error_message = f"An error occurred while generating embeddings: {e}"
@@ -0,0 +1,163 @@
+"""
+Writes the trial facets used by filter pushdown onto every vector of the Pinecone index.
+
+Usage:
+    python -m providers.pinecone.backfill_filter_metadata
+    python -m providers.pinecone.backfill_filter_metadata --namespace "" --workers 16 --force
+
+By default the default namespace and every module namespace of the index are backfilled, since module
+queries read the metadata of the copies. Vectors already carrying the current filter metadata version
+are skipped, so an interrupted run can simply be restarted. Enable PINECONE_FILTER_PUSHDOWN once the
+backfill has completed.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from database.mongo_db_connection import MongoDBDAO
+from providers.pinecone.module_namespaces import ALL_MODULES_NAMESPACE, MODULE_NAMESPACES
+from providers.pinecone.pinecone_connection import PineconeVectorStore
+from trial_document_search.utils.similar_trial_documents_utils.compile_pinecone_filter import (
+    FILTER_METADATA_VERSION, build_filter_metadata
+)
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import (
+    FACET_SOURCE_PROJECTION, extract_trial_facets
+)
+
+
+def load_filter_metadata(dao: MongoDBDAO, nct_ids: list) -> dict:
+    """Returns nctId -> Pinecone filter metadata for the given trials."""
+    docs = dao.find(
+        "t2dm_data_preprocessed",
+        {"protocolSection.identificationModule.nctId": {"$in": nct_ids}},
+        FACET_SOURCE_PROJECTION
+    )
+    return {
+        doc["protocolSection"]["identificationModule"]["nctId"]: build_filter_metadata(
+            extract_trial_facets(doc["protocolSection"])
+        )
+        for doc in docs
+    }
+
+
+def backfill_namespaces(index) -> list:
+    """Returns the namespaces holding copies of the vectors: the default namespace and every module namespace."""
+    namespaces = index.describe_index_stats().namespaces or {}
+    return [ALL_MODULES_NAMESPACE] + [namespace for namespace in MODULE_NAMESPACES.values() if namespace in namespaces]
+
+
+def _update_vectors(index, dao: MongoDBDAO, executor: ThreadPoolExecutor, vector_ids: list, namespace: str,
+                    force: bool, counts: dict) -> None:
+    """Fetches the vectors and sets the filter metadata of the ones without the current version (or all if forced)."""
+    vectors = index.fetch(ids=vector_ids, namespace=namespace).vectors
+    counts["scanned"] += len(vectors)
+
+    pending = {
+        vector_id: vector.metadata or {}
+        for vector_id, vector in vectors.items()
+        if force or (vector.metadata or {}).get("filterMetadataVersion") != FILTER_METADATA_VERSION
+    }
+    counts["skipped"] += len(vectors) - len(pending)
+    if not pending:
+        return
+
+    nct_ids = list({metadata["nctId"] for metadata in pending.values() if metadata.get("nctId")})
+    filter_metadata = load_filter_metadata(dao, nct_ids)
+
+    updates = []
+    for vector_id, metadata in pending.items():
+        trial_metadata = filter_metadata.get(metadata.get("nctId"))
+        if trial_metadata is None:
+            counts["unmatched"] += 1
+            continue
+        updates.append(executor.submit(index.update, id=vector_id, set_metadata=trial_metadata, namespace=namespace))
+    for update in updates:
+        update.result()
+    counts["updated"] += len(updates)
+
+
+def backfill_filter_metadata(namespaces: list = None, batch_size: int = 100, workers: int = 8,
+                             force: bool = False) -> dict:
+    """
+    Sets the facet metadata of every vector in the given namespaces of the index.
+
+    Args:
+        namespaces (list, optional): Namespaces to backfill. Defaults to the default namespace and every
+            module namespace of the index (see `backfill_namespaces`), since module queries read the
+            metadata of the copies.
+        batch_size (int, optional): Vectors fetched per request. Defaults to 100.
+        workers (int, optional): Concurrent metadata update requests. Defaults to 8.
+        force (bool, optional): Rewrite vectors that already carry the current metadata version.
+
+    Returns:
+        dict: Namespace -> counts of scanned, updated, skipped and unmatched vectors.
+    """
+    vector_store = PineconeVectorStore()
+    index = vector_store.pinecone_index
+    dao = MongoDBDAO("SSP-dev")
+    namespaces = backfill_namespaces(index) if namespaces is None else namespaces
+    results = {}
+    started_at = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for namespace in namespaces:
+            counts = results[namespace] = {"scanned": 0, "updated": 0, "skipped": 0, "unmatched": 0}
+            for page_ids in index.list(namespace=namespace):
+                for offset in range(0, len(page_ids), batch_size):
+                    _update_vectors(index, dao, executor, page_ids[offset:offset + batch_size], namespace, force,
+                                    counts)
+
+                print(f"Backfill progress of namespace '{namespace}': {counts} "
+                      f"({time.perf_counter() - started_at:.1f}s)")
+
+    return results
+
+
+def refresh_filter_metadata(nct_ids: list, namespaces: list = None, workers: int = 8, dao: MongoDBDAO = None) -> dict:
+    """
+    Rewrites the facet metadata of the vectors of specific trials, e.g. after their facets were refreshed.
+
+    Only vectors with ingestion ids ("<nctId>#<module>#<position>") are found by their trial. Vectors with
+    other ids keep their metadata until the next forced backfill.
+
+    Args:
+        nct_ids (list): NCT IDs whose vectors are rewritten.
+        namespaces (list, optional): Namespaces to update. Defaults to the default namespace and every module
+            namespace of the index.
+        workers (int, optional): Concurrent metadata update requests. Defaults to 8.
+        dao (MongoDBDAO, optional): Existing DAO on the source database to reuse.
+
+    Returns:
+        dict: Counts of scanned, updated, skipped and unmatched vectors, across namespaces.
+    """
+    index = PineconeVectorStore().pinecone_index
+    dao = dao or MongoDBDAO("SSP-dev")
+    namespaces = backfill_namespaces(index) if namespaces is None else namespaces
+    counts = {"scanned": 0, "updated": 0, "skipped": 0, "unmatched": 0}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for namespace in namespaces:
+            for nct_id in nct_ids:
+                for page_ids in index.list(prefix=f"{nct_id}#", namespace=namespace):
+                    _update_vectors(index, dao, executor, page_ids, namespace, True, counts)
+
+    return counts
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Backfill Pinecone vector metadata used by filter pushdown.")
+    parser.add_argument("--namespace", default=None,
+                        help="Single namespace to backfill (default and module namespaces if omitted)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Vectors fetched per request")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent metadata update requests")
+    parser.add_argument("--force", action="store_true", help="Rewrite vectors that are already backfilled")
+    args = parser.parse_args()
+
+    results = backfill_filter_metadata(namespaces=None if args.namespace is None else [args.namespace],
+                                       batch_size=args.batch_size, workers=args.workers, force=args.force)
+    print(f"Backfill completed: {results}")
+
+
+if __name__ == "__main__":
+    main()
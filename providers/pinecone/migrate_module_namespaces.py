@@ -0,0 +1,99 @@
+"""
+Copies the vectors of every routed module of the Pinecone index into its own namespace.
+
+Usage:
+    python -m providers.pinecone.migrate_module_namespaces
+    python -m providers.pinecone.migrate_module_namespaces --modules eligibilityModule conditionsModule --workers 16
+
+Criterion queries search the whole index and narrow it with a `module` metadata filter. After this
+migration each module of MODULE_NAMESPACES also lives in a namespace of its own, which a query can
+search without the filter. The source namespace keeps every vector and still serves the unfiltered
+rationale queries. Vectors are copied with their ids, values and metadata (including the filter
+pushdown metadata), so the copy is idempotent and an interrupted run can simply be restarted. Enable
+PINECONE_MODULE_NAMESPACES once the reported namespace counts match the source.
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from providers.pinecone.module_namespaces import MODULE_NAMESPACES
+from providers.pinecone.pinecone_connection import PineconeVectorStore
+
+
+def migrate_module_namespaces(source_namespace: str = "", modules: list = None, batch_size: int = 100,
+                              workers: int = 8) -> dict:
+    """
+    Copies the vectors of the given modules from the source namespace into their module namespaces.
+
+    Args:
+        source_namespace (str, optional): Namespace holding every vector. Defaults to the default namespace.
+        modules (list, optional): Modules to copy. Defaults to every module of MODULE_NAMESPACES.
+        batch_size (int, optional): Vectors fetched and upserted per request. Defaults to 100.
+        workers (int, optional): Concurrent upsert requests. Defaults to 8.
+
+    Returns:
+        dict: Counts of scanned, copied (per module) and skipped vectors, and the vector count of every
+              module namespace after the copy.
+    """
+    modules = modules or list(MODULE_NAMESPACES)
+    vector_store = PineconeVectorStore()
+    index = vector_store.pinecone_index
+    counts = {"scanned": 0, "skipped": 0}
+    copied = Counter()
+    started_at = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for page_ids in index.list(namespace=source_namespace):
+            for offset in range(0, len(page_ids), batch_size):
+                vectors = index.fetch(ids=page_ids[offset:offset + batch_size], namespace=source_namespace).vectors
+                counts["scanned"] += len(vectors)
+
+                by_module = {}
+                for vector_id, vector in vectors.items():
+                    module = (vector.metadata or {}).get("module")
+                    if module not in modules:
+                        counts["skipped"] += 1
+                        continue
+                    by_module.setdefault(module, []).append(
+                        {"id": vector_id, "values": vector.values, "metadata": vector.metadata}
+                    )
+
+                upserts = [
+                    executor.submit(index.upsert, vectors=module_vectors, namespace=MODULE_NAMESPACES[module])
+                    for module, module_vectors in by_module.items()
+                ]
+                for upsert in upserts:
+                    upsert.result()
+                copied.update({module: len(module_vectors) for module, module_vectors in by_module.items()})
+
+            print(f"Migration progress: {counts}, copied {dict(copied)} ({time.perf_counter() - started_at:.1f}s)")
+
+    # Upserts are eventually consistent, so the namespace counts may trail the copy for a short while
+    namespaces = index.describe_index_stats().namespaces
+    counts["copied"] = dict(copied)
+    counts["namespaceVectors"] = {
+        MODULE_NAMESPACES[module]: namespaces[MODULE_NAMESPACES[module]].vector_count
+        if MODULE_NAMESPACES[module] in namespaces else 0
+        for module in modules
+    }
+    return counts
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Copy the vectors of every module into its own Pinecone namespace.")
+    parser.add_argument("--source-namespace", default="", help="Namespace holding every vector (default namespace if omitted)")
+    parser.add_argument("--modules", nargs="+", choices=list(MODULE_NAMESPACES), default=None,
+                        help="Modules to copy (every routed module if omitted)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Vectors fetched and upserted per request")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent upsert requests")
+    args = parser.parse_args()
+
+    counts = migrate_module_namespaces(source_namespace=args.source_namespace, modules=args.modules,
+                                       batch_size=args.batch_size, workers=args.workers)
+    print(f"Migration completed: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+
+# Module -> namespace holding a copy of the vectors of that module, queried instead of a module filter
+MODULE_NAMESPACES = {
+    "eligibilityModule": "eligibilityModule",
+    "conditionsModule": "conditionsModule",
+    "outcomesModule": "outcomesModule",
+    "identificationModule": "identificationModule",
+}
+# Namespace of the unfiltered (rationale) queries: the default namespace, which keeps every vector
+ALL_MODULES_NAMESPACE = ""
+
+
+def module_namespaces_enabled() -> bool:
+    """
+    Whether module queries are routed to the per-module namespaces.
+
+    Only enable PINECONE_MODULE_NAMESPACES once `providers.pinecone.migrate_module_namespaces` has copied
+    the vectors into them. A module whose namespace does not exist in the index is still queried with
+    the module filter on the default namespace.
+    """
+    return os.getenv("PINECONE_MODULE_NAMESPACES", "false").lower() == "true"
+
+
+def module_namespaces_exist(index) -> bool:
+    """
+    Whether any module namespace already holds vectors, e.g. because the migration has run.
+
+    Args:
+        index: Pinecone index to inspect.
+
+    Returns:
+        bool: True if at least one namespace of MODULE_NAMESPACES exists in the index.
+    """
+    namespaces = index.describe_index_stats().namespaces or {}
+    return any(namespace in namespaces for namespace in MODULE_NAMESPACES.values())
+
+
+def module_namespace(module: str = None) -> str | None:
+    """
+    Returns the namespace a query of the module is routed to.
+
+    Args:
+        module (str, optional): Module the vectors must belong to (None searches every module).
+
+    Returns:
+        str | None: The namespace, or None if the query uses a module filter on the default namespace.
+    """
+    if module is None:
+        return ALL_MODULES_NAMESPACE
+    if not module_namespaces_enabled():
+        return None
+    return MODULE_NAMESPACES.get(module)
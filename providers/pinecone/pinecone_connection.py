@@ -1,10 +1,15 @@
+import asyncio
 import time
 import os
 from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
+from providers.vector_store import VectorStore
+from observability.metrics import dependency_call
 
 
-class PineconeVectorStore:
+class PineconeVectorStore(VectorStore):
+    supports_namespaces = True
+
     def __init__(self, index_name="final-similarity-1", dimension=1536, metric="cosine", cloud="aws",
                  region="us-east-1"):
         # Load environment variables
@@ -28,6 +33,7 @@ class PineconeVectorStore:
 
         # Initialize the Pinecone Vector Store
         self.pinecone_index = self.pc.Index(self.index_name)
+        self._namespaces = None
 
     def _setup_index(self):
         existing_indexes = [index_info["name"] for index_info in self.pc.list_indexes()]
@@ -42,7 +48,7 @@ class PineconeVectorStore:
             while not self.pc.describe_index(self.index_name).status["ready"]:
                 time.sleep(1)
 
-    def query(self, vector, filters=None, k=5):
+    def query(self, vector, filters=None, k=5, include_values=True, namespace=None):
         """
         Queries the Pinecone index for similar vectors.
 
@@ -50,15 +56,58 @@ class PineconeVectorStore:
             vector (list): The embedding vector to search.
             filters (dict, optional): Metadata filters for query.
             k (int, optional): Number of top results to fetch.
+            include_values (bool, optional): Whether the matches carry their vectors. Leaving them out
+                keeps the response to ids, scores and metadata.
+            namespace (str, optional): Namespace to search. Defaults to the default namespace.
+
+        Returns:
+            dict: Query results.
+        """
+        with dependency_call("pinecone", "query", self.index_name):
+            return self.pinecone_index.query(
+                vector=vector,
+                top_k=k,
+                include_values=include_values,
+                include_metadata=True,
+                filter=filters,
+                namespace=namespace
+            )
+
+    async def query_async(self, vector, filters=None, k=5, include_values=True, namespace=None):
+        """
+        Queries the Pinecone index without blocking the event loop.
+
+        The pinecone client only ships a synchronous HTTP transport, so the request is
+        executed in the default thread pool executor.
+
+        Parameters:
+            vector (list): The embedding vector to search.
+            filters (dict, optional): Metadata filters for query.
+            k (int, optional): Number of top results to fetch.
+            include_values (bool, optional): Whether the matches carry their vectors. Leaving them out
+                keeps the response to ids, scores and metadata.
+            namespace (str, optional): Namespace to search. Defaults to the default namespace.
 
         Returns:
             dict: Query results.
         """
-        return self.pinecone_index.query(
-            vector=vector,
-            top_k=k,
-            include_values=True,
-            include_metadata=True,
-            filter=filters
-        )
+        return await asyncio.to_thread(self.query, vector=vector, filters=filters, k=k,
+                                       include_values=include_values, namespace=namespace)
+
+    def namespaces(self) -> set:
+        """
+        Returns the namespaces of the index, read once and then cached for the life of the process.
+
+        Namespaces only appear when a migration runs (see `migrate_module_namespaces`), which is
+        followed by a restart to enable PINECONE_MODULE_NAMESPACES.
+        """
+        if self._namespaces is None:
+            with dependency_call("pinecone", "describe_index_stats", self.index_name):
+                self._namespaces = set(self.pinecone_index.describe_index_stats().namespaces or {})
+        return self._namespaces
 
+    def vector_count(self) -> int:
+        """
+        Returns the number of vectors in the index, across namespaces.
+        """
+        return self.pinecone_index.describe_index_stats().total_vector_count
@@ -1,25 +1,64 @@
-from providers.pinecone.pinecone_connection import PineconeVectorStore
-from providers.openai.openai_connection import OpenAIClient
-from database.mongo_db_connection import MongoDBDAO
+from providers.pinecone.module_namespaces import module_namespace
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.similar_trial_documents_utils.compile_pinecone_filter import compile_pinecone_filter
+from trial_document_search.utils.similar_trial_documents_utils.retrieval_depth_policy import RetrievalDepthPolicy
 
 
-def query_pinecone_db(query: str, module: str = None) -> dict:
-    """Query Pinecone for documents related to the query and module."""
+async def _query_matches(embedding: list, pinecone_filter: dict, namespace: str, depth_policy: RetrievalDepthPolicy,
+                         restrictive_filters: bool) -> list:
+    """Queries a namespace, deeper while the depth policy asks for it, and returns the kept matches."""
+    k = depth_policy.initial_depth(restrictive_filters)
+    while True:
+        results = (await provider_registry.vector_store.query_async(
+            vector=embedding,
+            filters=pinecone_filter,
+            k=k,
+            include_values=False,
+            namespace=namespace
+        ))['matches']
+        deeper_k = depth_policy.next_depth([match['score'] for match in results], k) if results else None
+        if deeper_k is None:
+            return depth_policy.trim(results)
+        k = deeper_k
+
+
+async def query_pinecone_db(query: str, module: str = None, embedding: list = None, document_filters: dict = None,
+                            depth_policy: RetrievalDepthPolicy = None, restrictive_filters: bool = False) -> dict:
+    """Query Pinecone for documents related to the query and module.
+
+    A precomputed embedding of the query can be passed to skip the embeddings request. Document
+    filters, when given, are compiled into the Pinecone metadata filter so that the top-k only
+    contains eligible trials. The query is lean: matches carry ids, scores and metadata, not their
+    vectors. Its top-k is chosen by `depth_policy` (see `RetrievalDepthPolicy`), which may query again
+    deeper or trim the matches; `restrictive_filters` tells it that filters will be applied after
+    retrieval. With PINECONE_MODULE_NAMESPACES enabled, a module query searches the module's namespace
+    instead of filtering the whole index by module (see `module_namespace`). Only NCT IDs, modules
+    and scores are returned; trial documents are attached to the returned results of a search only
+    (see `hydrate_trial_documents`).
+    """
     response = {"success": False, "message": "Failed to fetch documents", "data": None}
 
     try:
         # Generate embedding
-        embedding = OpenAIClient().generate_embeddings(query)["data"].flatten().tolist()
+        if embedding is None:
+            embedding = (await provider_registry.openai_client.generate_embeddings_async(query))["data"].flatten().tolist()
 
-        # Query Pinecone
-        results = PineconeVectorStore().query(
-            vector=embedding,
-            filters={"module": {"$eq": module}} if module else None,
-            k=30
-        )['matches']
+        # Query Pinecone, in the module's namespace when the index is organized by module
+        depth_policy = depth_policy or RetrievalDepthPolicy()
+        vector_store = provider_registry.vector_store
+        namespace = module_namespace(module) if vector_store.supports_namespaces else None
+        if namespace and namespace not in vector_store.namespaces():
+            # The module namespace is not migrated: use the module filter on the default namespace instead
+            namespace = None
+        if module is not None and namespace is not None:
+            results = await _query_matches(embedding, compile_pinecone_filter(document_filters), namespace,
+                                           depth_policy, restrictive_filters)
+        else:
+            results = await _query_matches(embedding, compile_pinecone_filter(document_filters, module), namespace,
+                                           depth_policy, restrictive_filters)
 
         if not results:
-            return {**response, "message": "No matching documents found"}
+            return {**response, "success": True, "message": "No matching documents found", "data": []}
 
         # Process results
         nct_data = {}
@@ -28,28 +67,20 @@ def query_pinecone_db(query: str, module: str = None) -> dict:
             if nct_id not in nct_data or match['score'] > nct_data[nct_id]['score']:
                 nct_data[nct_id] = {
                     'score': match['score'],
-                    'module': match['metadata']['module'],
-                    'values': match['values']
+                    'module': match['metadata']['module']
                 }
 
-        # Fetch documents from MongoDB
-        docs = MongoDBDAO("SSP-dev").find(
-            "t2dm_final_data_samples_processed",
-            {"nctId": {"$in": list(nct_data.keys())}},
-            {"_id": 0}
-        )
-
         # Prepare final response
         response['data'] = [
             {
                 "nctId": nct_id,
                 "module": data['module'],
                 "similarity_score": int(data['score'] * 100),
-                "document": next(d for d in docs if d["nctId"] == nct_id)
             }
             for nct_id, data in nct_data.items()
             if int(data['score'] * 100) >= 10
         ]
+
         response.update(success=True, message="Successfully fetched documents")
 
     except Exception as e:
@@ -0,0 +1,114 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from database.mongo_db_connection import AsyncMongoDBDAO
+from database.embedding_store.local_embedding_store import LocalEmbeddingStore, open_embedding_store
+from providers.openai.embedding_cache import embedding_cache
+from providers.openai.openai_connection import OpenAIClient
+from providers.pinecone.module_namespaces import module_namespaces_enabled
+from providers.pinecone.pinecone_connection import PineconeVectorStore
+from providers.local_index.local_vector_store import open_local_vector_store
+from providers.vector_store import VectorStore
+
+
+class ProviderRegistry:
+    """
+    Process-wide registry of provider clients.
+
+    The clients are created once in the FastAPI lifespan (`start`) and reused by every request,
+    so connection pools stay warm and the Pinecone index check runs a single time. Accessing a
+    client before `start` (e.g. from a script) creates it lazily.
+    """
+
+    def __init__(self, trials_database_name: str = "SSP-dev") -> None:
+        """
+        Args:
+            trials_database_name (str, optional): Database holding the trial documents and embeddings.
+                                                  Defaults to "SSP-dev".
+        """
+        self.trials_database_name = trials_database_name
+        self._openai_client = None
+        self._vector_store = None
+        self._trials_dao = None
+        self._app_dao = None
+        self._embedding_store = None
+        self._embedding_store_loaded = False
+
+    @property
+    def openai_client(self) -> OpenAIClient:
+        """Shared OpenAI client (sync and async transports)."""
+        if self._openai_client is None:
+            self._openai_client = OpenAIClient()
+        return self._openai_client
+
+    @staticmethod
+    def create_vector_store() -> VectorStore:
+        """
+        Creates the vector store selected by VECTOR_STORE_BACKEND: "pinecone" (default) or "local",
+        the in-process index at LOCAL_VECTOR_INDEX_PATH.
+        """
+        backend = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+        if backend == "local":
+            return open_local_vector_store()
+        if backend == "pinecone":
+            return PineconeVectorStore()
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
+
+    @property
+    def vector_store(self) -> VectorStore:
+        """Shared vector store (Pinecone or the local index, see `create_vector_store`)."""
+        if self._vector_store is None:
+            self._vector_store = self.create_vector_store()
+        return self._vector_store
+
+    @property
+    def trials_dao(self) -> AsyncMongoDBDAO:
+        """Shared DAO for the trial documents database."""
+        if self._trials_dao is None:
+            self._trials_dao = AsyncMongoDBDAO(self.trials_database_name)
+        return self._trials_dao
+
+    @property
+    def app_dao(self) -> AsyncMongoDBDAO:
+        """Shared DAO for the application database (DATABASE_NAME): jobs, results and caches."""
+        if self._app_dao is None:
+            self._app_dao = AsyncMongoDBDAO()
+            embedding_cache.use_async_dao(self._app_dao)
+        return self._app_dao
+
+    @property
+    def embedding_store(self) -> LocalEmbeddingStore | None:
+        """Memory-mapped trial embedding store (EMBEDDING_STORE_PATH), or None if not configured."""
+        if not self._embedding_store_loaded:
+            self._embedding_store = open_embedding_store()
+            self._embedding_store_loaded = True
+        return self._embedding_store
+
+    async def start(self) -> None:
+        """Creates every client up front. The vector store (Pinecone index check or local index load) is created off the event loop."""
+        load_dotenv()
+        self._vector_store = self._vector_store or await asyncio.to_thread(self.create_vector_store)
+        if module_namespaces_enabled() and self._vector_store.supports_namespaces:
+            # Read the namespaces once, so that module queries know which module namespaces exist
+            await asyncio.to_thread(self._vector_store.namespaces)
+        _ = self.openai_client, self.trials_dao, self.app_dao, self.embedding_store
+
+    async def close(self) -> None:
+        """Closes the HTTP and Mongo connection pools held by the clients."""
+        if self._openai_client is not None:
+            await self._openai_client.async_client.close()
+            self._openai_client.client.close()
+        for dao in (self._trials_dao, self._app_dao):
+            if dao is not None:
+                dao.client.close()
+        embedding_cache.use_async_dao(None)
+        self._openai_client = None
+        self._vector_store = None
+        self._trials_dao = None
+        self._app_dao = None
+        self._embedding_store = None
+        self._embedding_store_loaded = False
+
+
+# Process-wide registry, started and closed by the FastAPI lifespan in main.py
+provider_registry = ProviderRegistry()
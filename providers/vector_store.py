@@ -0,0 +1,57 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+
+class VectorStore(ABC):
+    """
+    Interface of the trial vector retrieval backends.
+
+    `query` answers with the Pinecone response layout, {"matches": [{"id", "score", "values", "metadata"}]},
+    best match first (without "values" when `include_values` is False), and accepts Pinecone metadata filter expressions, so callers do not depend on
+    the backend selected by VECTOR_STORE_BACKEND.
+    """
+
+    index_name: str
+    # Whether `query` can target a namespace other than the default one
+    supports_namespaces: bool = False
+
+    @abstractmethod
+    def query(self, vector, filters=None, k=5, include_values=True, namespace=None):
+        """
+        Queries the index for similar vectors.
+
+        Parameters:
+            vector (list): The embedding vector to search.
+            filters (dict, optional): Metadata filters for query.
+            k (int, optional): Number of top results to fetch.
+            include_values (bool, optional): Whether the matches carry their vectors.
+            namespace (str, optional): Namespace to search. Defaults to the default namespace.
+
+        Returns:
+            dict: Query results.
+        """
+
+    async def query_async(self, vector, filters=None, k=5, include_values=True, namespace=None):
+        """
+        Queries the index without blocking the event loop, in the default thread pool executor.
+
+        Parameters:
+            vector (list): The embedding vector to search.
+            filters (dict, optional): Metadata filters for query.
+            k (int, optional): Number of top results to fetch.
+            include_values (bool, optional): Whether the matches carry their vectors.
+            namespace (str, optional): Namespace to search. Defaults to the default namespace.
+
+        Returns:
+            dict: Query results.
+        """
+        return await asyncio.to_thread(self.query, vector=vector, filters=filters, k=k,
+                                       include_values=include_values, namespace=namespace)
+
+    def namespaces(self) -> set:
+        """Returns the namespaces holding vectors. Stores without namespaces only have the default one."""
+        return {""}
+
+    @abstractmethod
+    def vector_count(self) -> int:
+        """Returns the number of vectors in the index."""
@@ -1,5 +1,5 @@
 from typing import Any, Literal, Optional, List, Dict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 class BaseResponse(BaseModel):
     success: bool
@@ -41,6 +41,25 @@ class DocumentFilters(DocumentSearch):
     sampleSizeMax: Optional[str] = ""
     countryLogic: Literal["AND", "OR"] = "OR"
     safetyAssessment: Optional[str] = ""
+    includeDocuments: Optional[bool] = False
+    runAsync: Optional[bool] = False
+    pageSize: Optional[int] = Field(None, ge=1, le=100)
+
+
+class BatchDocumentFilters(BaseModel):
+    searches: List[DocumentFilters] = Field(min_length=1)
+
+    @field_validator("searches")
+    @classmethod
+    def validate_searches(cls, searches: List[DocumentFilters]) -> List[DocumentFilters]:
+        # Every search owns the job log and stored results of its ECID, and batch results are not paged
+        ecids = [search.ecid for search in searches]
+        duplicates = sorted({ecid for ecid in ecids if ecids.count(ecid) > 1})
+        if duplicates:
+            raise ValueError(f"Each search of a batch needs its own ECID, duplicated: {', '.join(duplicates)}")
+        if any(search.pageSize is not None for search in searches):
+            raise ValueError("pageSize is not supported in a batch")
+        return searches
 
 
 class DraftEligibilityCriteria(BaseModel):
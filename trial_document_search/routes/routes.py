@@ -1,11 +1,160 @@
-from fastapi import APIRouter, Response, status
-from trial_document_search.models.routes_models import BaseResponse, DocumentFilters
+import asyncio
+import json
+import os
+from typing import Literal
+from fastapi import APIRouter, Query, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from trial_document_search.models.routes_models import BaseResponse, BatchDocumentFilters, DocumentFilters
 from trial_document_search.services.similar_trail_documents_reterival_service import fetch_similar_trail_documents
+from trial_document_search.services.batch_document_search_service import fetch_similar_trail_documents_batch
+from trial_document_search.services.search_job_runner import search_job_runner
+from trial_document_search.utils.similar_trial_documents_utils.hydrate_trial_documents import hydrate_trial_documents
+from trial_document_search.utils.search_cursors import search_cursors
+from database.trial_analysis.job_status import start_job, get_job
+from database.trial_analysis.store_similar_trials import fetch_similar_trials
 from trial_document_search.utils.logger_setup import logger
 from datetime import datetime
 
 router = APIRouter()
 
+# Content type of each streaming format
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+# Streamed searches still running, referenced so they complete even if the client disconnects
+_streamed_searches = set()
+
+
+def build_search_inputs(request: DocumentFilters) -> dict:
+    """
+    Extracts the user data, search keys, weights and document filters of a search request.
+
+    Args:
+        request (DocumentFilters): The request body containing search criteria.
+
+    Returns:
+        dict: Keyword arguments for `fetch_similar_trail_documents`.
+    """
+    # Extract inputs for user identification
+    user_data = {
+        "userName": request.userName,
+        "ecid": request.ecid
+    }
+
+    # Extract input for Document Search
+    rationale = request.rationale if request.rationale != "" else None
+    condition = request.condition if request.condition != "" else None
+    inclusion_criteria = request.inclusionCriteria if request.inclusionCriteria != "" else None
+    exclusion_criteria = request.exclusionCriteria if request.exclusionCriteria != "" else None
+    trial_outcomes = request.efficacyEndpoints if request.efficacyEndpoints != "" else None
+    title = request.title if request.title != "" else None
+    # To bo added later
+    # objective = request.objective if request.objective != "" else None
+    # interventionType = request.interventionType if request.interventionType != "" else None
+    weights = request.weights
+
+    input_document = {
+        "inclusionCriteria": inclusion_criteria,
+        "exclusionCriteria": exclusion_criteria,
+        "rationale": rationale,
+        "condition": condition,
+        "trialOutcomes": trial_outcomes,
+        "title": title
+    }
+
+    # Lambda function to validate and format dates safely
+    validate_date = lambda date_str: (datetime.strptime(date_str, "%Y-%m-%d").strftime("%Y-%m-%d")
+                                      if date_str else None) if isinstance(date_str,str) and len(date_str) >= 10 else None
+
+    # Document filters
+    phases = request.phase
+    locations = request.country
+    countryLogic = request.countryLogic
+    startDate = validate_date(request.startDate)
+    endDate = validate_date(request.endDate)
+    sponsorType = request.sponsor if request.sponsor != "" else None
+    sampleSizeMin = int(request.sampleSizeMin) if request.sampleSizeMin != "" else None
+    sampleSizeMax = int(request.sampleSizeMax) if request.sampleSizeMax != "" else None
+
+    # To be added later
+    # safetyAssessment = request.safetyAssessment
+
+    document_filters = {
+        "phases": phases,
+        "locations": locations,
+        "countryLogic": countryLogic,
+        "startDate": startDate,
+        "endDate": endDate,
+        "sponsorType": sponsorType,
+        "sampleSizeMin": sampleSizeMin,
+        "sampleSizeMax": sampleSizeMax
+    }
+
+    return {
+        "documents_search_keys": input_document,
+        "custom_weights": weights.model_dump(),
+        "document_filters": document_filters,
+        "user_data": user_data,
+        "include_documents": request.includeDocuments,
+    }
+
+
+async def queue_search(search_inputs: dict, response: Response, base_response: BaseResponse) -> BaseResponse:
+    """
+    Registers the document search job and hands the search to the background worker pool.
+
+    Responds 202 with the job handle, 409 if a search is already running for the ECID, 429 when the
+    worker pool is saturated, or 500 if the job could not be registered.
+    """
+    user_data = search_inputs["user_data"]
+    ecid = user_data["ecid"]
+
+    # Reserve the ECID before the first await, so that concurrent requests for it cannot both be accepted
+    if search_job_runner.status(ecid) is not None:
+        base_response.message = f"A document search is already in progress for ECID: {ecid}"
+        base_response.status_code = status.HTTP_409_CONFLICT
+        response.status_code = status.HTTP_409_CONFLICT
+        return base_response
+
+    registered = asyncio.Event()
+
+    async def run_search() -> dict:
+        await registered.wait()
+        return await fetch_similar_trail_documents(**search_inputs, register_job=False)
+
+    submit_response = search_job_runner.submit(ecid, run_search)
+    if submit_response["success"] is False:
+        base_response.message = submit_response["message"]
+        base_response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        return base_response
+
+    # Register the job before answering, so the status endpoint can find it straight away. The search
+    # only starts once the job is registered, and is cancelled if it could not be.
+    job_registered = False
+    try:
+        start_job_response = await start_job(ecid=ecid, user_name=user_data["userName"], job_id=1)
+        job_registered = start_job_response["success"]
+    finally:
+        if job_registered:
+            registered.set()
+        else:
+            search_job_runner.cancel(ecid)
+
+    if not job_registered:
+        logger.error(start_job_response["message"])
+        base_response.message = start_job_response["message"]
+        base_response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return base_response
+    logger.debug(start_job_response["message"])
+
+    base_response.success = True
+    base_response.message = submit_response["message"]
+    base_response.status_code = status.HTTP_202_ACCEPTED
+    base_response.data = {"ecid": ecid, "status": "queued"}
+    response.status_code = status.HTTP_202_ACCEPTED
+    return base_response
+
 
 @router.post("/search_documents", response_model=BaseResponse)
 async def search_routes_new(request: DocumentFilters, response: Response):
@@ -27,66 +176,21 @@ async def search_routes_new(request: DocumentFilters, response: Response):
     )
 
     try:
-        # Extract inputs for user identification
-        user_data = {
-            "userName": request.userName,
-            "ecid": request.ecid
-        }
-
-        # Extract input for Document Search
-        rationale = request.rationale if request.rationale != "" else None
-        condition = request.condition if request.condition != "" else None
-        inclusion_criteria = request.inclusionCriteria if request.inclusionCriteria != "" else None
-        exclusion_criteria = request.exclusionCriteria if request.exclusionCriteria != "" else None
-        trial_outcomes = request.efficacyEndpoints if request.efficacyEndpoints != "" else None
-        title = request.title if request.title != "" else None
-        # To bo added later
-        # objective = request.objective if request.objective != "" else None
-        # interventionType = request.interventionType if request.interventionType != "" else None
-        weights = request.weights
-
-        input_document = {
-            "inclusionCriteria": inclusion_criteria,
-            "exclusionCriteria": exclusion_criteria,
-            "rationale": rationale,
-            "condition": condition,
-            "trialOutcomes": trial_outcomes,
-            "title": title
-        }
-
-        # Lambda function to validate and format dates safely
-        validate_date = lambda date_str: (datetime.strptime(date_str, "%Y-%m-%d").strftime("%Y-%m-%d")
-                                          if date_str else None) if isinstance(date_str,str) and len(date_str) >= 10 else None
-
-        # Document filters
-        phases = request.phase
-        locations = request.country
-        countryLogic = request.countryLogic
-        startDate = validate_date(request.startDate)
-        endDate = validate_date(request.endDate)
-        sponsorType = request.sponsor if request.sponsor != "" else None
-        sampleSizeMin = int(request.sampleSizeMin) if request.sampleSizeMin != "" else None
-        sampleSizeMax = int(request.sampleSizeMax) if request.sampleSizeMax != "" else None
-
-        # To be added later
-        # safetyAssessment = request.safetyAssessment
-
-        document_filters = {
-            "phases": phases,
-            "locations": locations,
-            "countryLogic": countryLogic,
-            "startDate": startDate,
-            "endDate": endDate,
-            "sponsorType": sponsorType,
-            "sampleSizeMin": sampleSizeMin,
-            "sampleSizeMax": sampleSizeMax
-        }
+        search_inputs = build_search_inputs(request)
+
+        # Run the search in the background and return the job handle straight away
+        if request.runAsync:
+            return await queue_search(search_inputs, response, base_response)
+
+        # Paged searches hydrate each page when it is read, not the whole ranking
+        if request.pageSize:
+            search_inputs["include_documents"] = False
 
         # Fetch similar documents based on the input criteria
-        similar_documents_response = fetch_similar_trail_documents(documents_search_keys=input_document,
-                                                                   custom_weights=weights.model_dump(),
-                                                                   document_filters=document_filters,
-                                                                   user_data=user_data)
+        similar_documents_response = await fetch_similar_trail_documents(**search_inputs)
+
+        # Tell the client whether the result was served from the search result cache
+        response.headers["X-Search-Cache"] = "HIT" if similar_documents_response.get("cached") else "MISS"
 
         # Handle the response from the fetch function
         if similar_documents_response["success"] is False:
@@ -99,6 +203,168 @@ async def search_routes_new(request: DocumentFilters, response: Response):
             base_response.message = similar_documents_response["message"]
             base_response.status_code = status.HTTP_200_OK
             base_response.data = similar_documents_response["data"]
+            if request.pageSize:
+                # Keep the ranking server-side and return its first page with a cursor
+                cursor = search_cursors.open(similar_documents_response["data"], request.pageSize,
+                                             include_documents=request.includeDocuments)
+                base_response.data = (await search_cursors.read_page(cursor))["data"]
+            response.status_code = status.HTTP_200_OK
+            return base_response
+
+    except Exception as e:
+        # Handle unexpected errors and log them
+        logger.error(f"Unexpected error: {e}")
+        base_response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        base_response.message = f"Unexpected error: {e}"
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return base_response
+
+
+def encode_stream_event(event: str, payload: dict, stream_format: str) -> str:
+    """Encodes a search event as one NDJSON line or one server-sent event."""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+    return json.dumps({"event": event, **payload}, default=str) + "\n"
+
+
+@router.post("/search_documents/stream")
+async def stream_search_routes(request: DocumentFilters,
+                               stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format")):
+    """
+    Endpoint streaming a document search as its stages complete, as NDJSON or server-sent events.
+
+    Events: "started", then "candidates" once per criterion with its provisional Pinecone candidates,
+    "filtered" with the candidates passing the document filters, "ranking" with the final weighted
+    ranking, and "complete" (or "error").
+
+    Args:
+        request (DocumentFilters): The request body containing search criteria.
+        stream_format (str, optional): "ndjson" (default) or "sse", passed as the `format` query parameter.
+
+    Returns:
+        StreamingResponse: The event stream, or a BaseResponse error if the request is invalid.
+    """
+    try:
+        search_inputs = build_search_inputs(request)
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=BaseResponse(
+            success=False, status_code=status.HTTP_400_BAD_REQUEST, data=None, message=f"Unexpected error: {e}"
+        ).model_dump())
+
+    events = asyncio.Queue()
+
+    async def on_event(event: str, payload: dict) -> None:
+        # Encode right away: later stages keep updating the documents in place
+        events.put_nowait(encode_stream_event(event, payload, stream_format))
+
+    async def run_search() -> None:
+        try:
+            similar_documents_response = await fetch_similar_trail_documents(**search_inputs, on_event=on_event)
+            await on_event("complete", {key: similar_documents_response[key] for key in ("success", "message", "cached")})
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            await on_event("error", {"message": f"Unexpected error: {e}"})
+        finally:
+            events.put_nowait(None)
+
+    search_task = asyncio.create_task(run_search())
+    _streamed_searches.add(search_task)
+    search_task.add_done_callback(_streamed_searches.discard)
+
+    async def stream_events():
+        yield encode_stream_event("started", {"ecid": request.ecid}, stream_format)
+        while (chunk := await events.get()) is not None:
+            yield chunk
+
+    return StreamingResponse(stream_events(), media_type=STREAM_MEDIA_TYPES[stream_format],
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/search_documents/cursor/{cursor}", response_model=BaseResponse)
+async def search_page_routes(cursor: str, response: Response, offset: int = Query(0, ge=0),
+                             pageSize: int = Query(None, ge=1, le=100)):
+    """
+    Endpoint to read a later page of a paged document search without re-running it.
+
+    Args:
+        cursor (str): Cursor returned with the first page.
+        response (Response): The FastAPI Response object.
+        offset (int, optional): Rank of the first result of the page. Defaults to 0.
+        pageSize (int, optional): Results per page. Defaults to the page size of the search.
+
+    Returns:
+        BaseResponse: A standardized response containing the page or an error message.
+    """
+    base_response = BaseResponse(
+        success=False,
+        status_code=status.HTTP_404_NOT_FOUND,
+        data=None,
+        message="Internal Server Error"
+    )
+
+    try:
+        page_response = await search_cursors.read_page(cursor, offset=offset, page_size=pageSize)
+        base_response.message = page_response["message"]
+        if page_response["success"] is False:
+            response.status_code = status.HTTP_404_NOT_FOUND
+            return base_response
+
+        base_response.success = True
+        base_response.status_code = status.HTTP_200_OK
+        base_response.data = page_response["data"]
+        response.status_code = status.HTTP_200_OK
+        return base_response
+
+    except Exception as e:
+        # Handle unexpected errors and log them
+        logger.error(f"Unexpected error: {e}")
+        base_response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        base_response.message = f"Unexpected error: {e}"
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return base_response
+
+
+@router.post("/search_documents/batch", response_model=BaseResponse)
+async def batch_search_routes(request: BatchDocumentFilters, response: Response):
+    """
+    Endpoint to run many document searches in one call, sharing embeddings, Pinecone queries and
+    MongoDB reads between them.
+
+    Args:
+        request (BatchDocumentFilters): The request body containing the searches.
+        response (Response): The FastAPI Response object.
+
+    Returns:
+        BaseResponse: A standardized response containing one search response per search, in request order.
+    """
+    base_response = BaseResponse(
+        success=False,
+        status_code=status.HTTP_400_BAD_REQUEST,
+        data=None,
+        message="Internal Server Error"
+    )
+
+    try:
+        max_batch_size = int(os.getenv("BATCH_SEARCH_MAX_SIZE", "500"))
+        if len(request.searches) > max_batch_size:
+            base_response.message = f"A batch can hold at most {max_batch_size} searches"
+            response.status_code = status.HTTP_400_BAD_REQUEST
+            return base_response
+
+        batch_response = await fetch_similar_trail_documents_batch(
+            [build_search_inputs(search) for search in request.searches]
+        )
+
+        if batch_response["success"] is False:
+            base_response.message = batch_response["message"]
+            response.status_code = status.HTTP_400_BAD_REQUEST
+            return base_response
+        else:
+            base_response.success = True
+            base_response.message = batch_response["message"]
+            base_response.status_code = status.HTTP_200_OK
+            base_response.data = batch_response["data"]
             response.status_code = status.HTTP_200_OK
             return base_response
 
@@ -108,4 +374,62 @@ async def search_routes_new(request: DocumentFilters, response: Response):
         base_response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         base_response.message = f"Unexpected error: {e}"
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-        return base_response
\ No newline at end of file
+        return base_response
+
+
+@router.get("/search_documents/{ecid}", response_model=BaseResponse, name="search_job_status")
+async def search_job_status(ecid: str, response: Response, includeDocuments: bool = False):
+    """
+    Endpoint to poll a document search started with `runAsync`.
+
+    Args:
+        ecid (str): The ECID the search was started for.
+        response (Response): The FastAPI Response object.
+        includeDocuments (bool, optional): Whether to attach the trial document to each returned result.
+
+    Returns:
+        BaseResponse: The job progress and, once the job has finished, the stored similar trials results.
+    """
+    base_response = BaseResponse(
+        success=False,
+        status_code=status.HTTP_404_NOT_FOUND,
+        data=None,
+        message=f"No document search found for ECID: {ecid}"
+    )
+
+    try:
+        job_response = await get_job(ecid)
+        job = (job_response["data"] or {}).get("documentSearch")
+        if job is None:
+            response.status_code = status.HTTP_404_NOT_FOUND
+            return base_response
+
+        job_state = search_job_runner.status(ecid)
+        if job_state is None:
+            # Not held by this worker: either finished, or still running in another worker process
+            if job.get("completionStatus"):
+                job_state = "completed" if job.get("success") else "failed"
+            else:
+                job_state = "running"
+
+        result = None
+        if job_state in ("completed", "failed"):
+            results_response = await fetch_similar_trials(ecid)
+            result = results_response["data"]
+            if result and includeDocuments:
+                result["similarTrials"], _ = await hydrate_trial_documents(result["similarTrials"])
+
+        base_response.success = True
+        base_response.message = job.get("message", job_response["message"])
+        base_response.status_code = status.HTTP_200_OK
+        base_response.data = {"ecid": ecid, "status": job_state, "job": job, "result": result}
+        response.status_code = status.HTTP_200_OK
+        return base_response
+
+    except Exception as e:
+        # Handle unexpected errors and log them
+        logger.error(f"Unexpected error: {e}")
+        base_response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        base_response.message = f"Unexpected error: {e}"
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return base_response
@@ -0,0 +1,186 @@
+import asyncio
+import os
+from trial_document_search.utils.logger_setup import logger
+from trial_document_search.utils.search_result_cache import search_result_cache, current_corpus_version
+from database.trial_analysis.job_status import start_job
+from trial_document_search.utils.similar_trial_documents_utils.build_embedding_bundles import build_embedding_bundles
+from trial_document_search.utils.similar_trial_documents_utils.fetch_similar_document_using_pinecone import fetch_similar_documents_using_pinecone
+from trial_document_search.utils.similar_trial_documents_utils.combine_and_ensure_unique_documents import combine_and_ensure_unique_documents
+from trial_document_search.utils.similar_trial_documents_utils.fetch_trial_filters import fetch_trial_filters
+from trial_document_search.utils.similar_trial_documents_utils.filter_documents import filter_documents
+from trial_document_search.utils.similar_trial_documents_utils.calculate_weighted_similarity_scores import (
+    TARGET_EMBEDDING_FIELDS, fetch_embedding_documents
+)
+from trial_document_search.utils.similar_trial_documents_utils.rank_search_results import cache_search_results, rank_search_results
+from trial_document_search.utils.similar_trial_documents_utils.hydrate_trial_documents import hydrate_trial_documents
+from trial_document_search.utils.similar_trial_documents_utils.store_similar_trials_and_update_status import store_similar_trials_and_update_status
+
+
+async def _register_job(user_data: dict) -> None:
+    start_job_response = await start_job(ecid=user_data["ecid"], user_name=user_data["userName"], job_id=1)
+    logger.debug(start_job_response["message"])
+
+
+async def fetch_similar_trail_documents_batch(searches: list, max_concurrency: int = None) -> dict:
+    """
+    Run several document searches in one pass, doing the work they share only once.
+
+    The distinct section texts of all searches are embedded in batched requests, each distinct
+    (module, text, pushed down filters) Pinecone query is sent once, and the facets and target
+    embeddings of the union of candidates are read with one query each. Filtering, scoring and
+    ranking then fan out per search. Every search keeps its own job log, stored results and
+    search result cache entry, exactly as with `fetch_similar_trail_documents`; searches that lost a
+    criterion or their filter enrichment are not cached.
+
+    Args:
+        searches (list): Keyword arguments of `fetch_similar_trail_documents` for each search
+                         (see `build_search_inputs`).
+        max_concurrency (int, optional): Searches retrieved at the same time. Defaults to the
+                                         BATCH_SEARCH_CONCURRENCY environment variable, or 8.
+
+    Returns:
+        dict: Response dictionary with success status, message and one response per search, in input order.
+    """
+    final_response = {
+        "success": False,
+        "message": "Failed to process document search batch.",
+        "data": None,
+    }
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("BATCH_SEARCH_CONCURRENCY", "8"))
+
+    responses = [
+        {"ecid": search["user_data"]["ecid"], "success": False, "message": "No Documents Found matching criteria.",
+         "data": None, "cached": False}
+        for search in searches
+    ]
+    trial_documents = [[] for _ in searches]
+    degraded = [False for _ in searches]
+
+    # Create the job log of every search
+    await asyncio.gather(*(_register_job(search["user_data"]) for search in searches))
+    try:
+
+        # Serve the searches already in the search result cache
+        corpus_version = await current_corpus_version()
+        cache_keys = [
+            search_result_cache.make_key(search["documents_search_keys"], search["custom_weights"],
+                                         search["document_filters"],
+                                         {"includeDocuments": search.get("include_documents", False)},
+                                         corpus_version)
+            for search in searches
+        ]
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached_search = search_result_cache.get(cache_key)
+            if cached_search is None:
+                pending.append(index)
+                continue
+            trial_documents[index] = cached_search["trial_documents"]
+            responses[index].update(cached_search["response"], cached=True)
+        logger.debug(f"Batch of {len(searches)} searches, {len(searches) - len(pending)} served from the cache")
+
+        # Embed the distinct section texts of every pending search
+        bundles = dict(zip(pending, await build_embedding_bundles(
+            [searches[index]["documents_search_keys"] for index in pending]
+        )))
+        logger.debug("Embedding bundles generated")
+
+        # Retrieve candidates, sending each distinct Pinecone query once
+        shared_queries = {}
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def _retrieve(index: int) -> dict:
+            async with semaphore:
+                criteria_documents, retrieval_degraded = await fetch_similar_documents_using_pinecone(
+                    searches[index]["documents_search_keys"], bundles[index], searches[index]["document_filters"],
+                    shared_queries=shared_queries
+                )
+            degraded[index] = degraded[index] or retrieval_degraded
+            return combine_and_ensure_unique_documents(criteria_documents)
+
+        unique_documents = dict(zip(pending, await asyncio.gather(*(_retrieve(index) for index in pending))))
+        logger.debug(f"Documents fetched with {len(shared_queries)} distinct Pinecone queries")
+
+        # Read the facets of the union of candidates once
+        candidate_ids = list(dict.fromkeys(nct_id for documents in unique_documents.values() for nct_id in documents))
+        facets_response = await fetch_trial_filters([{"nctId": nct_id} for nct_id in candidate_ids])
+        trial_facets = {doc["nctId"]: doc for doc in facets_response["data"]} if facets_response["success"] else None
+
+        filtered_documents = {}
+        for index in pending:
+            filtered_documents[index], filtering_degraded = await filter_documents(
+                unique_documents[index], searches[index]["document_filters"], trial_facets
+            )
+            degraded[index] = degraded[index] or filtering_degraded
+        logger.debug("Trial documents filtered")
+
+        # Read the target embeddings of the union of filtered candidates once
+        embedding_documents = None
+        dimensions = {len(vector) for bundle in bundles.values() for vector in bundle.values()}
+        if len(dimensions) == 1:
+            modules = list(dict.fromkeys(
+                section for index in pending for section, text in searches[index]["documents_search_keys"].items()
+                if text is not None and section in TARGET_EMBEDDING_FIELDS
+            ))
+            target_ids = list(dict.fromkeys(doc["nctId"] for documents in filtered_documents.values() for doc in documents))
+            if modules and target_ids:
+                embedding_documents = await fetch_embedding_documents(target_ids, modules, dimensions.pop())
+
+        async def _rank(index: int) -> None:
+            search = searches[index]
+            response = responses[index]
+            documents = filtered_documents[index]
+            try:
+                ranking_response = await rank_search_results(documents, search["documents_search_keys"],
+                                                             search["custom_weights"], bundles[index],
+                                                             embedding_documents)
+                response.update(ranking_response)
+                if ranking_response["success"]:
+                    trial_documents[index] = ranking_response["data"]
+            except Exception as e:
+                response["message"] += f"Unexpected error occurred while fetching similar documents: {e}"
+
+        await asyncio.gather(*(_rank(index) for index in pending))
+        logger.debug("Calculated similarity scores")
+
+        # Hydrate the union of returned results of the searches asking for documents, once
+        hydrated = [index for index in pending if searches[index].get("include_documents") and responses[index]["data"]]
+        if hydrated:
+            returned_ids = list(dict.fromkeys(
+                trial["nctId"] for index in hydrated for trial in responses[index]["data"]
+            ))
+            hydrated_trials, hydration_degraded = await hydrate_trial_documents(
+                [{"nctId": nct_id} for nct_id in returned_ids]
+            )
+            documents_map = {trial["nctId"]: trial["document"] for trial in hydrated_trials}
+            for index in hydrated:
+                degraded[index] = degraded[index] or hydration_degraded
+                responses[index]["data"] = [
+                    {**trial, "document": documents_map.get(trial["nctId"])} for trial in responses[index]["data"]
+                ]
+            logger.debug("Returned trial documents hydrated")
+
+        for index in pending:
+            cache_search_results(cache_keys[index], trial_documents[index], responses[index], degraded[index])
+
+        final_response.update(success=True, message=f"Processed {len(searches)} document searches.", data=responses)
+
+    except Exception as e:
+        final_response["message"] += f" Unexpected error occurred while fetching similar documents: {e}"
+        for response in responses:
+            if not response["success"]:
+                response["message"] += f"Unexpected error occurred while fetching similar documents: {e}"
+
+    finally:
+        # Store similar trials and update workflow status of every search
+        await asyncio.gather(*(
+            store_similar_trials_and_update_status(
+                search["user_data"], search["documents_search_keys"] | search["document_filters"],
+                trial_documents[index], responses[index]
+            )
+            for index, search in enumerate(searches)
+        ))
+        logger.debug("Updated similar trials status")
+
+    return final_response
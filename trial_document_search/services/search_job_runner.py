@@ -0,0 +1,90 @@
+import asyncio
+import os
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+from trial_document_search.utils.logger_setup import logger
+
+
+class SearchJobRunner:
+    """
+    A bounded pool of background document searches.
+
+    At most `max_workers` searches run at the same time and at most `max_pending` are accepted
+    (running plus queued); further submissions are rejected so the caller can answer with a retry.
+    Jobs are keyed by ECID and only one job per ECID can be active at a time.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None) -> None:
+        """
+        Args:
+            max_workers (int, optional): Concurrent searches (SEARCH_JOB_WORKERS, default 4).
+            max_pending (int, optional): Accepted searches, running or queued (SEARCH_JOB_MAX_PENDING, default 100).
+        """
+        load_dotenv()
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv("SEARCH_JOB_WORKERS", "4"))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv("SEARCH_JOB_MAX_PENDING", "100"))
+        self._semaphore = None
+        self._tasks = {}
+        self._running = set()
+
+    def status(self, job_id: str) -> str | None:
+        """Returns "running" or "queued" for an active job, or None if the job is not held by this worker."""
+        if job_id in self._running:
+            return "running"
+        return "queued" if job_id in self._tasks else None
+
+    def submit(self, job_id: str, job: Callable[[], Awaitable]) -> dict:
+        """
+        Schedules `job()` in the background.
+
+        Args:
+            job_id (str): Job handle (the ECID).
+            job (Callable[[], Awaitable]): Coroutine function running the search.
+
+        Returns:
+            dict: A dictionary containing the success status and message.
+        """
+        if job_id in self._tasks:
+            return {"success": False, "message": f"A document search is already in progress for ECID: {job_id}"}
+        if len(self._tasks) >= self.max_pending:
+            return {"success": False, "message": "Too many document searches in progress, please retry later"}
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, job))
+        return {"success": True, "message": f"Document search queued for ECID: {job_id}"}
+
+    def cancel(self, job_id: str) -> None:
+        """Cancels an accepted job and releases its ECID straight away."""
+        task = self._tasks.pop(job_id, None)
+        if task is not None:
+            task.cancel()
+        self._running.discard(job_id)
+
+    async def _run(self, job_id: str, job: Callable[[], Awaitable]) -> None:
+        try:
+            async with self._semaphore:
+                self._running.add(job_id)
+                await job()
+        except asyncio.CancelledError:
+            logger.error(f"Document search cancelled for ECID: {job_id}")
+            raise
+        except Exception as e:
+            logger.error(f"Background document search failed for ECID: {job_id}: {e}")
+        finally:
+            self._running.discard(job_id)
+            self._tasks.pop(job_id, None)
+
+    async def shutdown(self, timeout: float = 30) -> None:
+        """Waits up to `timeout` seconds for accepted searches, then cancels the remaining ones."""
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Process-wide runner, shut down by the FastAPI lifespan in main.py
+search_job_runner = SearchJobRunner()
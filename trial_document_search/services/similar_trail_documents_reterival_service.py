@@ -1,13 +1,20 @@
+import time
+from typing import Awaitable, Callable
 from trial_document_search.utils.logger_setup import logger
-from database.trial_analysis.job_status import create_empty_job, add_job
+from observability.metrics import record_candidates, record_stage_duration, search_stage
+from trial_document_search.utils.search_result_cache import search_result_cache, current_corpus_version
+from database.trial_analysis.job_status import start_job
+from trial_document_search.utils.similar_trial_documents_utils.build_embedding_bundle import build_embedding_bundle
 from trial_document_search.utils.similar_trial_documents_utils.fetch_similar_document_using_pinecone import fetch_similar_documents_using_pinecone
 from trial_document_search.utils.similar_trial_documents_utils.combine_and_ensure_unique_documents import combine_and_ensure_unique_documents
 from trial_document_search.utils.similar_trial_documents_utils.filter_documents import filter_documents
-from trial_document_search.utils.similar_trial_documents_utils.store_and_return_empty_response import store_and_return_empty_response
-from trial_document_search.utils.similar_trial_documents_utils.calculate_weighted_similarity_scores import calculate_weighted_similarity_scores
+from trial_document_search.utils.similar_trial_documents_utils.rank_search_results import cache_search_results, rank_search_results
+from trial_document_search.utils.similar_trial_documents_utils.hydrate_trial_documents import hydrate_trial_documents
 from trial_document_search.utils.similar_trial_documents_utils.store_similar_trials_and_update_status import store_similar_trials_and_update_status
 
-def fetch_similar_trail_documents(documents_search_keys: dict, custom_weights: dict, document_filters: dict, user_data: dict) -> dict:
+async def fetch_similar_trail_documents(documents_search_keys: dict, custom_weights: dict, document_filters: dict, user_data: dict,
+                                        include_documents: bool = False, register_job: bool = True,
+                                        on_event: Callable[[str, dict], Awaitable] = None) -> dict:
     """
     Fetch similar documents based on inclusion criteria, exclusion criteria, and trial rationale,
     ensuring unique values in the final list by retaining the entry with the highest similarity score.
@@ -17,56 +24,99 @@ def fetch_similar_trail_documents(documents_search_keys: dict, custom_weights: d
         custom_weights (dict): Dictionary containing custom weights for similarity score calculation.
         document_filters (dict): Dictionary containing filters to apply on documents.
         user_data (dict): Dictionary containing user-specific data.
+        include_documents (bool, optional): Whether to attach the trial document to each returned result.
+        register_job (bool, optional): Whether to create the job log. Background searches register their job
+                                       before being queued and pass False.
+        on_event (Callable, optional): Awaited with intermediate results as the pipeline progresses:
+                                       "candidates" (per criterion), "filtered" and "ranking".
 
     Returns:
-        dict: Response dictionary with success status, message, and data.
+        dict: Response dictionary with success status, message, data, and whether it was served from the
+              search result cache.
     """
     final_response = {
         "success": False,
         "message": "No Documents Found matching criteria.",
         "data": None,
+        "cached": False,
     }
 
     user_inputs = documents_search_keys | document_filters
     trial_documents = []
 
-    # Create an Empty Job Log with no Job
-    create_job_response = create_empty_job(ecid=user_data["ecid"], user_name=user_data["userName"])
-    logger.debug(create_job_response["message"])
+    async def emit(event: str, payload: dict) -> None:
+        if on_event is not None:
+            await on_event(event, payload)
 
-    # Add Document Search Job to Job Log
-    add_job_response = add_job(ecid=user_data["ecid"], job_id=1)
-    logger.debug(add_job_response["message"])
+    started_at = time.perf_counter()
+    if register_job:
+        # Create the Job Log if needed and start the Document Search Job, in one upsert
+        start_job_response = await start_job(ecid=user_data["ecid"], user_name=user_data["userName"], job_id=1)
+        logger.debug(start_job_response["message"])
     try:
 
+        # Serve identical searches against the same corpus version from the search result cache
+        with search_stage("cache_lookup"):
+            cache_key = search_result_cache.make_key(documents_search_keys, custom_weights, document_filters,
+                                                     {"includeDocuments": include_documents},
+                                                     await current_corpus_version())
+            cached_search = search_result_cache.get(cache_key)
+        if cached_search is not None:
+            trial_documents = cached_search["trial_documents"]
+            final_response.update(cached_search["response"], cached=True)
+            logger.debug("Similar documents served from the search result cache")
+            await emit("ranking", {"data": final_response["data"]})
+            return final_response
+
+        # Embed every user section once and share the vectors between retrieval and scoring
+        with search_stage("embedding"):
+            embedding_bundle = await build_embedding_bundle(documents_search_keys)
+        logger.debug("Embedding bundle generated")
+
         # Process each criterion and store the results
         logger.debug(f"Pinecone DB Started")
-        criteria_documents = fetch_similar_documents_using_pinecone(documents_search_keys)
+        with search_stage("retrieval"):
+            criteria_documents, retrieval_degraded = await fetch_similar_documents_using_pinecone(
+                documents_search_keys, embedding_bundle, document_filters,
+                on_criterion_documents=lambda criterion, documents: emit("candidates", {"criterion": criterion, "data": documents})
+            )
+        record_candidates("retrieved", len(criteria_documents))
         logger.debug("Documents fetched")
 
         # Combine all documents and ensure uniqueness by retaining the highest similarity score
-        unique_documents = combine_and_ensure_unique_documents(criteria_documents)
+        with search_stage("combine"):
+            unique_documents = combine_and_ensure_unique_documents(criteria_documents)
+        record_candidates("unique", len(unique_documents))
         logger.debug("Unique documents fetched")
 
-        # Filter documents based on additional filters
-        trial_documents = filter_documents(unique_documents, document_filters)
+        # Filter documents based on additional filters (a safety net when filters were pushed down to Pinecone)
+        trial_documents, filtering_degraded = await filter_documents(unique_documents, document_filters)
+        record_candidates("filtered", len(trial_documents))
         logger.debug("Trial documents fetched")
-
-        if not trial_documents:
-            store_and_return_empty_response(user_data, user_inputs, final_response)
+        await emit("filtered", {"data": trial_documents})
+
+        # Score the candidates and keep the 100 best, ranked by weighted similarity score
+        ranking_response = await rank_search_results(trial_documents, documents_search_keys, custom_weights,
+                                                     embedding_bundle)
+        if not ranking_response["success"]:
+            # Unscored candidates are neither ranked nor stored
+            trial_documents = []
+            final_response["message"] = ranking_response["message"]
             return final_response
-
-        # Calculate weighted average for similarity score
-        calculate_weighted_similarity_scores(trial_documents, documents_search_keys, custom_weights)
-        logger.debug("Calculated similarity scores")
-
-        # Sort trial documents based on weighted similarity score
-        trial_documents = sorted(trial_documents, key=lambda trial_item: trial_item["weighted_similarity_score"], reverse=True)
-        logger.debug("Trial documents sorted by weighted similarity score")
-
-        final_response["data"] = trial_documents[:100]
-        final_response["success"] = True
-        final_response["message"] = "Successfully fetched similar documents extended."
+        trial_documents = ranking_response["data"]
+        logger.debug("Trial documents ranked by weighted similarity score")
+
+        final_response.update(ranking_response)
+        hydration_degraded = False
+        if include_documents and trial_documents:
+            # Hydrate only the results that are returned, once, with a field projection
+            with search_stage("hydrate"):
+                final_response["data"], hydration_degraded = await hydrate_trial_documents(final_response["data"])
+            logger.debug("Returned trial documents hydrated")
+        await emit("ranking", {"data": final_response["data"]})
+        # Results of a run that lost a criterion, its filters or its documents are returned but never cached
+        cache_search_results(cache_key, trial_documents, final_response,
+                             retrieval_degraded or filtering_degraded or hydration_degraded)
 
     except Exception as e:
         final_response["message"] += f"Unexpected error occurred while fetching similar documents: {e}"
@@ -74,7 +124,9 @@ def fetch_similar_trail_documents(documents_search_keys: dict, custom_weights: d
     finally:
         # Store similar trials and update workflow status
         trial_documents = trial_documents
-        store_similar_trials_and_update_status(user_data, user_inputs, trial_documents, final_response)
+        with search_stage("persistence"):
+            await store_similar_trials_and_update_status(user_data, user_inputs, trial_documents, final_response)
         logger.debug("Updated similar trials status")
+        record_stage_duration("total", time.perf_counter() - started_at)
 
     return final_response
\ No newline at end of file
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUTTLCache:
+    """
+    A thread-safe in-process cache with least-recently-used eviction and per-entry expiry.
+
+    Entries are dropped when the cache grows beyond `max_size` (oldest access first) or when
+    they are read after `ttl_seconds` have elapsed since they were stored.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = None) -> None:
+        """
+        Args:
+            max_size (int, optional): Maximum number of entries kept in memory. Defaults to 1024.
+            ttl_seconds (float, optional): Lifetime of an entry in seconds. None disables expiry.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key`, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        """Stores `value` under `key`, evicting the least recently used entries if needed."""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes `key` from the cache and returns its value."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self) -> None:
+        """Removes every entry and resets the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,79 @@
+import os
+import secrets
+from dotenv import load_dotenv
+from trial_document_search.utils.lru_ttl_cache import LRUTTLCache
+from trial_document_search.utils.similar_trial_documents_utils.hydrate_trial_documents import hydrate_trial_documents
+
+
+class SearchCursorStore:
+    """
+    In-process store of ranked search results, so later pages are served without re-running the search.
+
+    A cursor holds the lightweight ranked results (no trial documents) and whether pages should be
+    hydrated. Cursors expire after SEARCH_CURSOR_TTL_SECONDS and are local to the worker process that
+    ran the search.
+    """
+
+    def __init__(self, max_size: int = None, ttl_seconds: float = None) -> None:
+        """
+        Args:
+            max_size (int, optional): Open cursors (SEARCH_CURSOR_MAX_SIZE, default 1024).
+            ttl_seconds (float, optional): Cursor lifetime (SEARCH_CURSOR_TTL_SECONDS, default 1800).
+        """
+        load_dotenv()
+        self.cursors = LRUTTLCache(
+            max_size=max_size if max_size is not None else int(os.getenv("SEARCH_CURSOR_MAX_SIZE", "1024")),
+            ttl_seconds=ttl_seconds if ttl_seconds is not None else float(os.getenv("SEARCH_CURSOR_TTL_SECONDS", "1800")),
+        )
+
+    def open(self, ranked_results: list, page_size: int, include_documents: bool = False) -> str:
+        """Stores ranked results and returns their cursor."""
+        cursor = secrets.token_urlsafe(16)
+        self.cursors.set(cursor, {
+            "results": ranked_results,
+            "pageSize": page_size,
+            "includeDocuments": include_documents,
+        })
+        return cursor
+
+    async def read_page(self, cursor: str, offset: int = 0, page_size: int = None) -> dict:
+        """
+        Reads one page of a cursor, hydrating only that page when the search asked for documents.
+
+        Args:
+            cursor (str): Cursor returned with the first page.
+            offset (int, optional): Rank of the first result of the page. Defaults to 0.
+            page_size (int, optional): Results per page. Defaults to the page size of the first page.
+
+        Returns:
+            dict: Response dictionary with success status, message and the page (results, cursor, offset,
+                  pageSize, total and nextOffset, which is None on the last page).
+        """
+        final_response = {
+            "success": False,
+            "message": f"Search cursor not found or expired: {cursor}",
+            "data": None,
+        }
+        entry = self.cursors.get(cursor)
+        if entry is None:
+            return final_response
+
+        page_size = page_size or entry["pageSize"]
+        total = len(entry["results"])
+        results = entry["results"][offset:offset + page_size]
+        if entry["includeDocuments"] and results:
+            results, _ = await hydrate_trial_documents(results)
+
+        final_response.update(success=True, message="Successfully fetched similar documents page.", data={
+            "results": results,
+            "cursor": cursor,
+            "offset": offset,
+            "pageSize": page_size,
+            "total": total,
+            "nextOffset": offset + page_size if offset + page_size < total else None,
+        })
+        return final_response
+
+
+# Process-wide search cursor store
+search_cursors = SearchCursorStore()
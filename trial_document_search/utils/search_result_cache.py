@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.logger_setup import logger
+from trial_document_search.utils.lru_ttl_cache import LRUTTLCache
+
+
+class SearchResultCache:
+    """
+    In-process cache of whole document search results, keyed by a canonical hash of the request.
+
+    The key covers the search keys, weights, filters and response options together with the corpus
+    version, so entries computed against an older index or corpus are never served. Cached values
+    are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_size: int = None, ttl_seconds: float = None, enabled: bool = None) -> None:
+        """
+        Args:
+            max_size (int, optional): Cached searches (SEARCH_CACHE_MAX_SIZE, default 256).
+            ttl_seconds (float, optional): Entry lifetime (SEARCH_CACHE_TTL_SECONDS, default 900).
+            enabled (bool, optional): Whether results are cached (SEARCH_CACHE_ENABLED, default true).
+        """
+        load_dotenv()
+        self.enabled = enabled if enabled is not None else os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+        self.entries = LRUTTLCache(
+            max_size=max_size if max_size is not None else int(os.getenv("SEARCH_CACHE_MAX_SIZE", "256")),
+            ttl_seconds=ttl_seconds if ttl_seconds is not None else float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "900")),
+        )
+
+    @staticmethod
+    def make_key(documents_search_keys: dict, custom_weights: dict, document_filters: dict, options: dict,
+                 corpus_version: str) -> str:
+        """
+        Builds the canonical cache key of a search.
+
+        Search texts are whitespace-normalized, and the phase and country lists are sorted because
+        their order does not change the result.
+        """
+        canonical_filters = dict(document_filters)
+        for list_filter in ("phases", "locations"):
+            if canonical_filters.get(list_filter):
+                canonical_filters[list_filter] = sorted(canonical_filters[list_filter])
+
+        canonical_request = {
+            "search": {key: " ".join(value.split()) if isinstance(value, str) else value
+                       for key, value in documents_search_keys.items()},
+            "weights": {key: float(value) for key, value in custom_weights.items()},
+            "filters": canonical_filters,
+            "options": options,
+            "corpusVersion": corpus_version,
+        }
+        encoded = json.dumps(canonical_request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        return self.entries.get(key) if self.enabled else None
+
+    def set(self, key: str, value: dict) -> None:
+        if self.enabled:
+            self.entries.set(key, value)
+
+    def invalidate(self) -> None:
+        """Drops every cached search."""
+        self.entries.clear()
+
+
+_corpus_version = {"value": None, "checked_at": 0.0}
+_corpus_version_lock = asyncio.Lock()
+
+
+async def current_corpus_version() -> str:
+    """
+    Returns a fingerprint of the data a search runs against.
+
+    It combines the vector index name and vector count, the local embedding store version, the
+    trial_facets refresh time and the optional CORPUS_VERSION override. It is re-read at most every
+    CORPUS_VERSION_CHECK_SECONDS (default 60), so ingestion or a facet refresh invalidates cached
+    searches within that delay.
+    """
+    check_interval = float(os.getenv("CORPUS_VERSION_CHECK_SECONDS", "60"))
+    async with _corpus_version_lock:
+        if _corpus_version["value"] is not None and time.monotonic() - _corpus_version["checked_at"] < check_interval:
+            return _corpus_version["value"]
+
+        components = {"override": os.getenv("CORPUS_VERSION", "")}
+        try:
+            vector_store = provider_registry.vector_store
+            vector_count = await asyncio.to_thread(vector_store.vector_count)
+            components["index"] = f"{vector_store.index_name}:{vector_count}"
+
+            embedding_store = provider_registry.embedding_store
+            components["embeddingStore"] = embedding_store.version if embedding_store is not None else None
+
+            facets_state = await provider_registry.trials_dao.find_one(
+                "trial_facets_state", {"_id": "trial_facets"}, {"_id": 0, "refreshedAt": 1}
+            )
+            components["facets"] = str((facets_state or {}).get("refreshedAt"))
+        except Exception as e:
+            logger.error(f"Failed to read corpus version: {e}")
+            if _corpus_version["value"] is not None:
+                return _corpus_version["value"]
+
+        _corpus_version["value"] = hashlib.sha256(
+            json.dumps(components, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        _corpus_version["checked_at"] = time.monotonic()
+        return _corpus_version["value"]
+
+
+# Process-wide search result cache
+search_result_cache = SearchResultCache()
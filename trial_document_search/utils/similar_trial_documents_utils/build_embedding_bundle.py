@@ -0,0 +1,18 @@
+from trial_document_search.utils.similar_trial_documents_utils.build_embedding_bundles import build_embedding_bundles
+
+
+async def build_embedding_bundle(documents_search_keys: dict) -> dict:
+    """
+    Embed every non-empty user section once for the whole request.
+
+    All distinct section texts are sent in a single batched embeddings request, and the
+    resulting bundle is shared by the retrieval and the scoring stages.
+
+    Args:
+        documents_search_keys (dict): Dictionary containing search keys for documents.
+
+    Returns:
+        dict: Section name -> embedding vector (list of floats). Empty if embedding failed,
+              in which case each stage falls back to embedding its own inputs.
+    """
+    return (await build_embedding_bundles([documents_search_keys]))[0]
@@ -0,0 +1,46 @@
+import asyncio
+import os
+from providers.openai.embedding_batches import split_embedding_batches
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.logger_setup import logger
+
+
+async def build_embedding_bundles(searches_keys: list, batch_size: int = None) -> list:
+    """
+    Embed every non-empty section of several searches, each distinct text only once.
+
+    The distinct texts of all searches are sent in batched embeddings requests of at most
+    `batch_size` texts, split further to stay within the request token limit (see
+    `split_embedding_batches`), so searches sharing a section text share its embedding.
+
+    Args:
+        searches_keys (list): Search keys (`documents_search_keys`) of each search.
+        batch_size (int, optional): Texts per embeddings request. Defaults to the EMBEDDING_BATCH_SIZE
+            environment variable, or 256.
+
+    Returns:
+        list: One bundle (section name -> embedding vector) per search, in input order. Sections whose
+              batch failed are left out, and each stage embeds them on demand.
+    """
+    if batch_size is None:
+        batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    distinct_texts = list(dict.fromkeys(
+        text for documents_search_keys in searches_keys for text in documents_search_keys.values() if text
+    ))
+    batches = split_embedding_batches(distinct_texts, batch_size)
+
+    embedding_responses = await asyncio.gather(*(
+        provider_registry.openai_client.generate_batch_embeddings_async(batch) for batch in batches
+    ))
+    text_embeddings = {}
+    for batch, embedding_response in zip(batches, embedding_responses):
+        if not embedding_response["success"]:
+            logger.error(f"Failed to build embedding bundle: {embedding_response['message']}")
+            continue
+        text_embeddings |= {text: embedding.tolist() for text, embedding in zip(batch, embedding_response["data"])}
+
+    return [
+        {section: text_embeddings[text] for section, text in documents_search_keys.items()
+         if text and text in text_embeddings}
+        for documents_search_keys in searches_keys
+    ]
@@ -1,10 +1,19 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from providers.openai.openai_connection import OpenAIClient
-from database.mongo_db_connection import MongoDBDAO
+from database.embedding_store.vector_encoding import decode_vector
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.logger_setup import logger
 
+# User document section -> field holding its embedding in t2dm_final_data_samples_processed_embeddings
+TARGET_EMBEDDING_FIELDS = {
+    "inclusionCriteria": "inclusionCriteria",
+    "exclusionCriteria": "exclusionCriteria",
+    "title": "officialTitle",
+    "trialOutcomes": "primaryOutcomes",
+    "condition": "conditions",
+}
 
-def _generate_document_embeddings(document: dict) -> dict:
+
+async def _generate_document_embeddings(document: dict) -> dict:
     """Generates embeddings for each section of the provided document.
 
     Args:
@@ -13,82 +22,153 @@ def _generate_document_embeddings(document: dict) -> dict:
     Returns:
         dict: Dictionary containing section-wise embeddings.
     """
-    openai_client = OpenAIClient()
+    openai_client = provider_registry.openai_client
     return {
-        section: openai_client.generate_embeddings(content)["data"].flatten().tolist()
+        section: (await openai_client.generate_embeddings_async(content))["data"].flatten().tolist()
         for section, content in document.items()
         if content is not None
     }
 
 
-def _calculate_cosine_similarity(user_embedding: list, target_embedding: list) -> float:
-    """Computes cosine similarity between two embeddings.
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row of a matrix, leaving all-zero rows untouched (as sklearn does)."""
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+    norms[norms == 0.0] = 1.0
+    return matrix / norms[:, np.newaxis]
+
+
+def _stack_target_embeddings(documents: list, modules: list, dimension: int) -> tuple:
+    """Stacks the embeddings of the target documents into one matrix per module.
+
+    Embeddings are decoded with `decode_vector`, so both the legacy arrays of doubles and the packed
+    float32, float16 and int8 encodings are read. Documents missing a module embedding, or holding
+    one of the wrong dimension, cannot be scored and are left out.
 
     Args:
-        user_embedding (list): Embedding vector for user input.
-        target_embedding (list): Embedding vector for target document.
+        documents (list): Documents from the embeddings collection.
+        modules (list): User document sections to stack.
+        dimension (int): Expected embedding dimension.
 
     Returns:
-        float: Cosine similarity score.
+        tuple: (list of scored NCT IDs, dict of module -> (n_documents, dimension) float64 matrix)
     """
-    return cosine_similarity(
-        np.array(user_embedding).reshape(1, -1),
-        np.array(target_embedding).reshape(1, -1)
-    )[0][0]
+    nct_ids = []
+    rows = {module: [] for module in modules}
+    for document in documents:
+        vectors = [decode_vector(document.get(TARGET_EMBEDDING_FIELDS[module]), dimension) for module in modules]
+        if any(vector is None for vector in vectors):
+            logger.debug(f"Failed to calculate weighted similarity score for {document.get('nctId')}")
+            continue
+
+        nct_ids.append(document["nctId"])
+        for module, vector in zip(modules, vectors):
+            rows[module].append(vector)
+
+    matrices = {
+        module: np.array(module_rows, dtype=np.float64).reshape(len(nct_ids), dimension)
+        for module, module_rows in rows.items()
+    }
+    return nct_ids, matrices
 
 
-def _calculate_similarity_score(user_embeddings: dict, weights: dict, target_embeddings: dict) -> dict:
-    """Calculates the weighted similarity score between a user input document and a target document.
+def _gather_stored_embeddings(target_documents_ids: list, modules: list, dimension: int) -> tuple:
+    """Reads target embeddings from the local memory-mapped embedding store when one is configured.
+
+    Args:
+        target_documents_ids (list): List of target document NCT IDs.
+        modules (list): User document sections to read.
+        dimension (int): Expected embedding dimension.
+
+    Returns:
+        tuple: (list of NCT IDs read from the store, dict of module -> matrix, list of NCT IDs to read from MongoDB)
+    """
+    embedding_store = provider_registry.embedding_store
+    if embedding_store is None or embedding_store.dimension != dimension:
+        return [], {}, target_documents_ids
+
+    nct_ids, section_matrices, missing_ids = embedding_store.gather(
+        target_documents_ids, [TARGET_EMBEDDING_FIELDS[module] for module in modules]
+    )
+    matrices = {module: section_matrices[TARGET_EMBEDDING_FIELDS[module]] for module in modules}
+    return nct_ids, matrices, missing_ids
+
+
+def _calculate_similarity_scores(user_embeddings: dict, weights: dict, target_matrices: dict) -> tuple:
+    """Calculates cosine and weighted similarity scores of every target document at once.
+
+    Each module's target matrix is normalized once and multiplied with the normalized user
+    embedding in a single stacked product. Stacking keeps one dot product per document, so the
+    scores are bit-for-bit those of a pairwise cosine similarity, and the weighted score
+    accumulates modules in the same order and with the same float64 arithmetic as a per-document loop.
 
     Args:
         user_embeddings (dict): Embedded User input document with different sections.
-        target_embeddings (dict): Embedded target document
         weights (dict): Dictionary containing similarity weights for each section.
+        target_matrices (dict): Module -> (n_documents, dimension) matrix of target embeddings.
 
     Returns:
-        dict: Dictionary with success status, message, and similarity scores.
+        tuple: ((n_documents,) weighted similarity scores, dict of module -> (n_documents,) cosine similarities)
     """
-    try:
-        similarity_scores = {
-            module: _calculate_cosine_similarity(user_embeddings[module], target_embeddings[module])
-            for module in user_embeddings.keys()
-        }
+    similarity_scores = {}
+    for module, user_embedding in user_embeddings.items():
+        user_vector = _normalize_rows(np.asarray(user_embedding, dtype=np.float64).reshape(1, -1))[0]
+        normalized_targets = _normalize_rows(np.asarray(target_matrices[module], dtype=np.float64))
+        similarity_scores[module] = np.matmul(normalized_targets[:, np.newaxis, :], user_vector[:, np.newaxis])[:, 0, 0]
 
-        sum_weights = sum(weights[module] for module in similarity_scores.keys())
-        weighted_similarity_score = (
-                sum(similarity_scores[module] * weights[module] for module in similarity_scores)
-                / sum_weights
-        )
+    sum_weights = sum(weights[module] for module in similarity_scores.keys())
+    weighted_sum = np.zeros(len(next(iter(similarity_scores.values()))), dtype=np.float64)
+    for module, scores in similarity_scores.items():
+        weighted_sum = weighted_sum + scores * weights[module]
 
-        return {
-            "success": True,
-            "message": "Weighted similarity score calculated successfully",
-            "data": {
-                "weighted_similarity_score": weighted_similarity_score,
-                "similarity_scores": similarity_scores,
-            },
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "message": f"Failed to calculate weighted similarity score: {e}",
-            "data": None,
-        }
+    weighted_similarity_scores = weighted_sum / sum_weights
+    return weighted_similarity_scores, similarity_scores
 
 
-def process_similarity_scores(target_documents_ids: list, user_input_document: dict, weights: dict) -> dict:
+async def fetch_embedding_documents(target_documents_ids: list, modules: list, dimension: int) -> dict:
+    """Reads, in a single query, the MongoDB embedding documents of the trials missing from the embedding store.
+
+    Batch searches read the union of their candidates once and pass the result to every
+    `process_similarity_scores` call as `embedding_documents`.
+
+    Args:
+        target_documents_ids (list): List of target document NCT IDs.
+        modules (list): User document sections to project.
+        dimension (int): Embedding dimension of the user sections.
+
+    Returns:
+        dict: nctId -> embedding document.
+    """
+    embedding_store = provider_registry.embedding_store
+    if embedding_store is not None and embedding_store.dimension == dimension:
+        target_documents_ids = [nct_id for nct_id in target_documents_ids if nct_id not in embedding_store.row_index]
+    if not target_documents_ids:
+        return {}
+
+    documents = await provider_registry.trials_dao.find(
+        collection_name="t2dm_final_data_samples_processed_embeddings",
+        query={"nctId": {"$in": target_documents_ids}},
+        projection={"_id": 0, "nctId": 1, **{TARGET_EMBEDDING_FIELDS[module]: 1 for module in modules}}
+    )
+    return {document["nctId"]: document for document in documents}
+
+
+async def process_similarity_scores(target_documents_ids: list, user_input_document: dict, weights: dict,
+                                    embedding_bundle: dict = None, embedding_documents: dict = None) -> dict:
     """Processes similarity scores for a list of target documents against a user input document.
 
     Args:
         target_documents_ids (list): List of target document NCT IDs.
         user_input_document (dict): User-provided document sections.
         weights (dict): Dictionary containing similarity weights.
+        embedding_bundle (dict, optional): Precomputed section embeddings from `build_embedding_bundle`.
+            Sections missing from the bundle are embedded on demand.
+        embedding_documents (dict, optional): Embedding documents prefetched with `fetch_embedding_documents`.
+            Replaces the MongoDB query for the trials missing from the embedding store.
 
     Returns:
         dict: Dictionary with success status, message, and list of similarity scores per document.
     """
     try:
-        trial_target_documents = []
         # Prepare User Document
         user_document = {
             "inclusionCriteria": user_input_document["inclusionCriteria"],
@@ -98,46 +178,71 @@ def process_similarity_scores(target_documents_ids: list, user_input_document: d
             "condition": user_input_document["condition"],
         }
 
-        # Generate Embeddings for User Document
-        user_embeddings = _generate_document_embeddings(user_document)
-
-        print(f"Calculating similarity scores for {len(target_documents_ids)} documents...")
-        counter = 0
-        # Initialize MongoDBDAO
-        mongo_dao = MongoDBDAO(database_name="SSP-dev")
+        # Reuse the request embedding bundle and only embed sections it does not cover
+        embedding_bundle = embedding_bundle or {}
+        user_embeddings = {
+            section: embedding_bundle[section]
+            for section, content in user_document.items()
+            if content is not None and section in embedding_bundle
+        }
+        user_embeddings |= await _generate_document_embeddings({
+            section: content for section, content in user_document.items() if section not in user_embeddings
+        })
+        # Keep the user document section order, which fixes the weighted sum order
+        user_embeddings = {section: user_embeddings[section] for section in user_document if section in user_embeddings}
+        if not user_embeddings:
+            raise ValueError("No user document section to compare against")
 
-        documents = mongo_dao.find(
-            collection_name="t2dm_final_data_samples_processed_embeddings",
-            query={"nctId": {"$in": target_documents_ids}},
-            projection={"_id": 0}
-        )
-        for document in documents:
-            nct_id = document["nctId"]
-            target_embeddings = {
-                "inclusionCriteria": document["inclusionCriteria"],
-                "exclusionCriteria": document["exclusionCriteria"],
-                "title": document["officialTitle"],
-                "trialOutcomes": document["primaryOutcomes"],
-                "condition": document["conditions"],
+        logger.debug(f"Calculating similarity scores for {len(target_documents_ids)} documents...")
+        modules = list(user_embeddings.keys())
+        dimension = len(next(iter(user_embeddings.values())))
+        if sum(weights[module] for module in modules) == 0:
+            return {
+                "success": False,
+                "message": "Failed to process weighted similarity scores: the weights of the searched sections sum to zero",
+                "data": None,
             }
 
-            similarity_response = _calculate_similarity_score(
-                user_embeddings, weights, target_embeddings
-            )
-            counter += 1
-            print(f"{counter}/{len(target_documents_ids)}: {nct_id}")
-            if not similarity_response["success"]:
-                print(f"Failed to calculate weighted similarity score for {nct_id}")
-                continue
+        # Read candidates from the local embedding store first, and only query MongoDB for the rest
+        nct_ids, target_matrices, remaining_ids = _gather_stored_embeddings(target_documents_ids, modules, dimension)
+        if remaining_ids:
+            if embedding_documents is not None:
+                documents = [embedding_documents[nct_id] for nct_id in remaining_ids if nct_id in embedding_documents]
+            else:
+                documents = await provider_registry.trials_dao.find(
+                    collection_name="t2dm_final_data_samples_processed_embeddings",
+                    query={"nctId": {"$in": remaining_ids}},
+                    projection={"_id": 0, "nctId": 1, **{TARGET_EMBEDDING_FIELDS[module]: 1 for module in modules}}
+                )
+            fetched_ids, fetched_matrices = _stack_target_embeddings(documents, modules, dimension)
+            target_matrices = {
+                module: np.concatenate([target_matrices[module], fetched_matrices[module]]) if nct_ids
+                else fetched_matrices[module]
+                for module in modules
+            }
+            nct_ids = nct_ids + fetched_ids
+        if not nct_ids:
+            return {
+                "success": True,
+                "message": "Weighted similarity scores processed successfully",
+                "data": [],
+            }
 
-            trial_target_documents.append({
+        weighted_similarity_scores, similarity_scores = _calculate_similarity_scores(
+            user_embeddings, weights, target_matrices
+        )
+        trial_target_documents = [
+            {
                 "nctId": nct_id,
-                "weighted_similarity_score": similarity_response["data"]["weighted_similarity_score"],
+                "weighted_similarity_score": weighted_similarity_scores[index],
                 "similarity_scores": {
-                    module: weights[module] * value
-                    for module, value in similarity_response["data"]["similarity_scores"].items()
+                    module: weights[module] * scores[index]
+                    for module, scores in similarity_scores.items()
                 },
-            })
+            }
+            for index, nct_id in enumerate(nct_ids)
+        ]
+        logger.debug(f"Calculated similarity scores for {len(trial_target_documents)}/{len(target_documents_ids)} documents")
 
         return {
             "success": True,
@@ -153,24 +258,39 @@ def process_similarity_scores(target_documents_ids: list, user_input_document: d
         }
 
 
-def calculate_weighted_similarity_scores(trial_documents: list, documents_search_keys: dict, custom_weights: dict) -> None:
+async def calculate_weighted_similarity_scores(trial_documents: list, documents_search_keys: dict, custom_weights: dict,
+                                               embedding_bundle: dict = None, embedding_documents: dict = None) -> dict:
     """
     Calculate weighted similarity scores for trial documents.
 
+    The scores are set on the trial documents in place. When scoring fails (e.g. the weights of the
+    searched sections sum to zero), the documents are left unscored and the failed response is returned.
+
     Args:
         trial_documents (list): List of trial documents.
         documents_search_keys (dict): Dictionary containing search keys for documents.
         custom_weights (dict): Dictionary containing custom weights for similarity score calculation.
+        embedding_bundle (dict, optional): Precomputed section embeddings from `build_embedding_bundle`.
+        embedding_documents (dict, optional): Embedding documents prefetched with `fetch_embedding_documents`.
+
+    Returns:
+        dict: The `process_similarity_scores` response, with success status and message.
     """
     nctIds = [item["nctId"] for item in trial_documents]
-    weighted_similarity_scores_response = process_similarity_scores(
+    weighted_similarity_scores_response = await process_similarity_scores(
         target_documents_ids=nctIds,
         user_input_document=documents_search_keys,
         weights=custom_weights,
+        embedding_bundle=embedding_bundle,
+        embedding_documents=embedding_documents,
     )
     if weighted_similarity_scores_response["success"]:
+        # Merge the scores back through an nctId index instead of scanning the candidates for every score
+        documents_by_id = {}
+        for subitem in trial_documents:
+            documents_by_id.setdefault(subitem["nctId"], []).append(subitem)
         for item in weighted_similarity_scores_response["data"]:
-            for subitem in trial_documents:
-                if subitem["nctId"] == item["nctId"]:
-                    subitem["weighted_similarity_score"] = item["weighted_similarity_score"]
-                    subitem["module_similarity_scores"] = item["similarity_scores"]
\ No newline at end of file
+            for subitem in documents_by_id.get(item["nctId"], []):
+                subitem["weighted_similarity_score"] = item["weighted_similarity_score"]
+                subitem["module_similarity_scores"] = item["similarity_scores"]
+    return weighted_similarity_scores_response
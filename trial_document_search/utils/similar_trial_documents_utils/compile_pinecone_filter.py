@@ -0,0 +1,88 @@
+import os
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import date_to_ordinal
+
+# Version of the facet metadata written onto the vectors by the backfill job
+FILTER_METADATA_VERSION = 1
+
+
+def filter_pushdown_enabled() -> bool:
+    """
+    Whether document filters are pushed down into the Pinecone query.
+
+    Only enable PINECONE_FILTER_PUSHDOWN once `providers.pinecone.backfill_filter_metadata` has written
+    the facet metadata onto every vector, otherwise vectors without it can never match a filter.
+    """
+    return os.getenv("PINECONE_FILTER_PUSHDOWN", "false").lower() == "true"
+
+
+def build_filter_metadata(facets: dict) -> dict:
+    """
+    Convert trial facets (see `extract_trial_facets`) into the Pinecone metadata matched by the compiled filters.
+
+    Pinecone metadata cannot hold nulls or empty lists, so missing facets are left out.
+
+    Args:
+        facets (dict): Trial facets.
+
+    Returns:
+        dict: Metadata fields to set on every vector of the trial.
+    """
+    metadata = {
+        "phases": facets.get("phases") or None,
+        "countries": facets.get("locations") or None,
+        "sponsorType": facets.get("sponsorType"),
+        "enrollmentCount": facets.get("enrollmentCount"),
+        "startDateOrdinal": date_to_ordinal(facets.get("startDate")),
+        "endDateOrdinal": date_to_ordinal(facets.get("endDate")),
+        "filterMetadataVersion": FILTER_METADATA_VERSION,
+    }
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+def compile_pinecone_filter(document_filters: dict = None, module: str = None) -> dict | None:
+    """
+    Compile the document filters built in `routes.py` into a Pinecone metadata filter expression.
+
+    The expression mirrors `process_filters`: any requested phase, all (AND) or any (OR) requested
+    countries, the sponsor class, start and completion dates inside the requested window, and the
+    enrollment inside the requested range. Date and enrollment bounds only apply when both ends are set.
+
+    Args:
+        document_filters (dict, optional): Filters as built by the /search_documents route.
+        module (str, optional): Module the vectors must belong to.
+
+    Returns:
+        dict | None: The filter expression, or None if nothing has to be filtered.
+    """
+    document_filters = document_filters or {}
+    clauses = []
+    if module:
+        clauses.append({"module": {"$eq": module}})
+
+    if document_filters.get("phases"):
+        clauses.append({"phases": {"$in": list(document_filters["phases"])}})
+
+    locations = document_filters.get("locations")
+    if locations:
+        if document_filters.get("countryLogic") == "AND":
+            clauses.extend({"countries": {"$in": [location]}} for location in locations)
+        else:
+            clauses.append({"countries": {"$in": list(locations)}})
+
+    if document_filters.get("sponsorType"):
+        clauses.append({"sponsorType": {"$eq": document_filters["sponsorType"]}})
+
+    start_ordinal = date_to_ordinal(document_filters.get("startDate"))
+    end_ordinal = date_to_ordinal(document_filters.get("endDate"))
+    if start_ordinal is not None and end_ordinal is not None:
+        clauses.append({"startDateOrdinal": {"$gte": start_ordinal, "$lte": end_ordinal}})
+        clauses.append({"endDateOrdinal": {"$gte": start_ordinal, "$lte": end_ordinal}})
+
+    sample_size_min = document_filters.get("sampleSizeMin")
+    sample_size_max = document_filters.get("sampleSizeMax")
+    if sample_size_min is not None and sample_size_max is not None:
+        clauses.append({"enrollmentCount": {"$gte": sample_size_min, "$lte": sample_size_max}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
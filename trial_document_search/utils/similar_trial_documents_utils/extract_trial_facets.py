@@ -0,0 +1,111 @@
+# Source fields of t2dm_data_preprocessed needed to derive the facets
+FACET_SOURCE_PROJECTION = {
+    "_id": 0,
+    "protocolSection.identificationModule.nctId": 1,
+    "protocolSection.contactsLocationsModule.locations.country": 1,
+    "protocolSection.designModule.phases": 1,
+    "protocolSection.designModule.enrollmentInfo.count": 1,
+    "protocolSection.statusModule.startDateStruct.date": 1,
+    "protocolSection.statusModule.completionDateStruct.date": 1,
+    "protocolSection.statusModule.lastUpdatePostDateStruct.date": 1,
+    "protocolSection.sponsorCollaboratorsModule.leadSponsor.class": 1,
+}
+
+# Stable codes of the ClinicalTrials.gov phase and lead sponsor class vocabularies
+PHASE_CODES = {"Unknown": 0, "NA": 1, "EARLY_PHASE1": 2, "PHASE1": 3, "PHASE2": 4, "PHASE3": 5, "PHASE4": 6}
+SPONSOR_CODES = {"Unknown": 0, "INDUSTRY": 1, "NIH": 2, "FED": 3, "OTHER_GOV": 4, "INDIV": 5, "NETWORK": 6,
+                 "AMBIG": 7, "OTHER": 8, "UNKNOWN": 9}
+PHASE_NAMES = {code: name for name, code in PHASE_CODES.items()}
+SPONSOR_NAMES = {code: name for name, code in SPONSOR_CODES.items()}
+
+
+def date_to_ordinal(date_str: str) -> int | None:
+    """
+    Convert a (possibly partial) ClinicalTrials.gov date into a sortable YYYYMMDD integer.
+
+    Missing month or day parts default to 1, so "2019-05" becomes 20190501 and "2019" becomes 20190101.
+
+    Args:
+        date_str (str): Date as "YYYY-MM-DD", "YYYY-MM" or "YYYY".
+
+    Returns:
+        int | None: The date ordinal, or None if the date is missing or malformed.
+    """
+    if not isinstance(date_str, str) or not date_str.strip():
+        return None
+    parts = date_str.strip().split("-")
+    try:
+        year = int(parts[0])
+        month = int(parts[1]) if len(parts) > 1 else 1
+        day = int(parts[2][:2]) if len(parts) > 2 else 1
+    except ValueError:
+        return None
+    return year * 10000 + month * 100 + day
+
+
+def extract_trial_facets(protocol: dict) -> dict:
+    """
+    Extract the filterable facets of a trial from its protocol section.
+
+    Args:
+        protocol (dict): The "protocolSection" of a trial document in t2dm_data_preprocessed.
+
+    Returns:
+        dict: locations (unique countries), phases, enrollmentCount, startDate, endDate and sponsorType.
+    """
+    return {
+        "locations": list({loc["country"] for loc in
+                           protocol.get("contactsLocationsModule", {}).get("locations", []) if loc.get("country")}),
+        "phases": protocol.get("designModule", {}).get("phases", ["Unknown"]),
+        "enrollmentCount": protocol.get("designModule", {}).get("enrollmentInfo", {}).get("count", 0),
+        "startDate": protocol.get("statusModule", {}).get("startDateStruct", {}).get("date"),
+        "endDate": protocol.get("statusModule", {}).get("completionDateStruct", {}).get("date"),
+        "sponsorType": protocol.get("sponsorCollaboratorsModule", {}).get("leadSponsor", {}).get("class", "Unknown")
+    }
+
+
+def encode_trial_facets(nct_id: str, facets: dict) -> dict:
+    """
+    Encode trial facets into the compact record stored in the trial_facets collection.
+
+    Countries are deduplicated and sorted, dates are stored both as given and as sortable ordinals,
+    and phases and sponsor class are stored as codes (unrecognised values map to "Unknown").
+
+    Args:
+        nct_id (str): The trial NCT ID.
+        facets (dict): Facets as returned by `extract_trial_facets`.
+
+    Returns:
+        dict: The facet record.
+    """
+    return {
+        "nctId": nct_id,
+        "countries": sorted(set(facets["locations"])),
+        "phaseCodes": sorted({PHASE_CODES.get(phase, PHASE_CODES["Unknown"]) for phase in facets["phases"] or ["Unknown"]}),
+        "sponsorCode": SPONSOR_CODES.get(facets["sponsorType"], SPONSOR_CODES["Unknown"]),
+        "enrollmentCount": facets["enrollmentCount"] or 0,
+        "startDate": facets["startDate"],
+        "endDate": facets["endDate"],
+        "startDateOrdinal": date_to_ordinal(facets["startDate"]),
+        "endDateOrdinal": date_to_ordinal(facets["endDate"]),
+    }
+
+
+def decode_trial_facets(record: dict) -> dict:
+    """
+    Decode a trial_facets record back into the facets attached to trial documents.
+
+    Args:
+        record (dict): A record built by `encode_trial_facets`.
+
+    Returns:
+        dict: locations, phases, enrollmentCount, startDate, endDate and sponsorType.
+    """
+    return {
+        "locations": list(record["countries"]),
+        "phases": [PHASE_NAMES[code] for code in record["phaseCodes"]],
+        "enrollmentCount": record["enrollmentCount"],
+        "startDate": record["startDate"],
+        "endDate": record["endDate"],
+        "sponsorType": SPONSOR_NAMES[record["sponsorCode"]],
+    }
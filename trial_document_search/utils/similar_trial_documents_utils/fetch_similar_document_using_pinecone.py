@@ -1,18 +1,67 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable
 from providers.pinecone.query_pinecone_db import query_pinecone_db
+from trial_document_search.utils.logger_setup import logger
+from trial_document_search.utils.similar_trial_documents_utils.compile_pinecone_filter import (
+    compile_pinecone_filter, filter_pushdown_enabled
+)
+from trial_document_search.utils.similar_trial_documents_utils.retrieval_depth_policy import RetrievalDepthPolicy
 
+# Search key -> Pinecone module filter used for retrieval (None searches every module)
+CRITERIA_MODULES = {
+    "inclusionCriteria": "eligibilityModule",
+    "exclusionCriteria": "eligibilityModule",
+    "rationale": None,
+    "condition": "conditionsModule",
+    "trialOutcomes": "outcomesModule",
+    "title": "identificationModule",
+}
 
-def fetch_similar_documents_using_pinecone(documents_search_keys: dict) -> list:
+
+async def fetch_similar_documents_using_pinecone(documents_search_keys: dict, embedding_bundle: dict = None,
+                                                 document_filters: dict = None, max_concurrency: int = None,
+                                                 shared_queries: dict = None,
+                                                 on_criterion_documents: Callable[[str, list], Awaitable] = None) -> tuple:
     """
-    Process all criteria (inclusion, exclusion, rationale, conditions, outcomes, title) and return combined documents.
+    Process all criteria (inclusion, exclusion, rationale, conditions, outcomes, title) concurrently
+    and return combined documents.
+
+    A failing criterion is logged and contributes no documents, so the remaining criteria still
+    produce results; the retrieval is then reported as degraded, so that its results are not cached.
+    The time spent on each criterion is logged once all of them have completed.
 
     Args:
         documents_search_keys (dict): Dictionary containing search keys for documents.
+        embedding_bundle (dict, optional): Precomputed section embeddings from `build_embedding_bundle`.
+            Criteria missing from the bundle are embedded on demand.
+        document_filters (dict, optional): Filters pushed down into the Pinecone query when
+            PINECONE_FILTER_PUSHDOWN is enabled. `process_filters` still applies them afterwards.
+        max_concurrency (int, optional): Maximum number of criteria retrieved at the same time.
+            Defaults to the MAX_CONCURRENT_CRITERIA environment variable, or 6.
+        shared_queries (dict, optional): Pinecone queries shared between the searches of a batch, keyed by
+            module, text, pushed down filters and whether filters follow retrieval. Each distinct query is
+            only sent once.
+        on_criterion_documents (Callable, optional): Awaited with the criterion name and its documents as soon
+            as each criterion completes, e.g. to stream provisional candidates.
 
     Returns:
-        list: List of documents processed from all criteria.
+        tuple: (list of documents processed from all criteria, whether any criterion failed)
     """
+    embedding_bundle = embedding_bundle or {}
+    pushed_down_filters = document_filters if filter_pushdown_enabled() else None
+    # Filters that are not pushed down drop matches after retrieval, so the policy starts deeper
+    restrictive_filters = pushed_down_filters is None and compile_pinecone_filter(document_filters) is not None
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("MAX_CONCURRENT_CRITERIA", "6"))
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    criteria_timings = {}
+    failed_criteria = []
+    filters_key = json.dumps(pushed_down_filters, sort_keys=True, default=str)
 
-    def _process_criteria(criteria: str, module: str = None) -> list:
+    async def _process_criteria(criteria_name: str, criteria: str, module: str = None) -> list:
         """
         Process a single search criteria, query the Pinecone DB, validate documents,
         and return a list of documents with high similarity scores.
@@ -20,53 +69,55 @@ def fetch_similar_documents_using_pinecone(documents_search_keys: dict) -> list:
         if not criteria:
             return []
 
-        pinecone_response = query_pinecone_db(query=criteria, module=module)
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                query = lambda: query_pinecone_db(query=criteria, module=module,
+                                                  embedding=embedding_bundle.get(criteria_name),
+                                                  document_filters=pushed_down_filters,
+                                                  depth_policy=RetrievalDepthPolicy(shares=len(CRITERIA_MODULES)),
+                                                  restrictive_filters=restrictive_filters)
+                if shared_queries is None:
+                    pinecone_response = await query()
+                else:
+                    query_key = (module, criteria, filters_key, restrictive_filters)
+                    if query_key not in shared_queries:
+                        shared_queries[query_key] = asyncio.ensure_future(query())
+                    pinecone_response = await asyncio.shield(shared_queries[query_key])
+            except Exception as e:
+                logger.error(f"Failed to retrieve documents for {criteria_name}: {e}")
+                failed_criteria.append(criteria_name)
+                return []
+            finally:
+                criteria_timings[criteria_name] = round((time.perf_counter() - started_at) * 1000, 2)
+
+        if not pinecone_response["success"]:
+            logger.error(f"Failed to retrieve documents for {criteria_name}: {pinecone_response['message']}")
+            failed_criteria.append(criteria_name)
+            return []
+        if not pinecone_response["data"]:
+            logger.debug(f"No documents retrieved for {criteria_name}: {pinecone_response['message']}")
+            return []
 
         # generate a final data list
         final_list = []
         for ele in pinecone_response["data"]:
             new_item = {
                 "nctId": ele["nctId"],
-                "module": ele["module"],
+                "module": ele["module"] if module else "trialRationale",
                 "similarity_score": ele["similarity_score"],
             }
             final_list.append(new_item)
 
+        if on_criterion_documents is not None:
+            await on_criterion_documents(criteria_name, final_list)
         return final_list
-    inclusion_criteria_documents = _process_criteria(
-        documents_search_keys.get("inclusionCriteria"),
-        module="eligibilityModule",
-    )
-    exclusion_criteria_documents = _process_criteria(
-        documents_search_keys.get("exclusionCriteria"),
-        module="eligibilityModule",
-    )
-    trial_rationale_documents = _process_criteria(
-        documents_search_keys.get("rationale"),
-    )
-    for item in trial_rationale_documents:
-        item["module"] = "trialRationale"
-
-    trial_conditions_documents = _process_criteria(
-        documents_search_keys.get("condition"),
-        module="conditionsModule",
-    )
-
-    trial_outcomes_documents = _process_criteria(
-        documents_search_keys.get("trialOutcomes"),
-        module="outcomesModule",
-    )
 
-    trial_title_documents = _process_criteria(
-        documents_search_keys.get("title"),
-        module="identificationModule",
-    )
+    criteria_documents = await asyncio.gather(*(
+        _process_criteria(criteria_name, documents_search_keys.get(criteria_name), module=module)
+        for criteria_name, module in CRITERIA_MODULES.items()
+    ))
+    logger.info(f"Criteria retrieval timings (ms): {criteria_timings}")
 
-    return (
-        inclusion_criteria_documents
-        + exclusion_criteria_documents
-        + trial_rationale_documents
-        + trial_conditions_documents
-        + trial_outcomes_documents
-        + trial_title_documents
-    )
\ No newline at end of file
+    # Keep the combined list in criteria order regardless of completion order
+    return [document for documents in criteria_documents for document in documents], bool(failed_criteria)
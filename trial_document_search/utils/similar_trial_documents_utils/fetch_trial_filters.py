@@ -1,9 +1,16 @@
 from trial_document_search.utils.logger_setup import logger
-from database.mongo_db_connection import MongoDBDAO
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import (
+    FACET_SOURCE_PROJECTION, decode_trial_facets, extract_trial_facets
+)
 
 
-def fetch_trial_filters(trial_documents: list) -> dict:
-    """Enrich trial documents with location, phase, and other metadata."""
+async def fetch_trial_filters(trial_documents: list) -> dict:
+    """Enrich trial documents with location, phase, and other metadata.
+
+    Facets are read from the compact trial_facets collection. Trials without a facet record yet are
+    derived from t2dm_data_preprocessed, projecting only the fields the facets need.
+    """
     response = {
         "success": False,
         "message": "Failed to filter trials by country",
@@ -11,34 +18,38 @@ def fetch_trial_filters(trial_documents: list) -> dict:
     }
 
     try:
-        # Fetch documents from MongoDB
+        # Fetch facet records from MongoDB
         nct_ids = [t["nctId"] for t in trial_documents]
-        docs = MongoDBDAO("SSP-dev").find(
-            "t2dm_data_preprocessed",
-            {"protocolSection.identificationModule.nctId": {"$in": nct_ids}},
+        records = await provider_registry.trials_dao.find(
+            "trial_facets",
+            {"nctId": {"$in": nct_ids}},
             {"_id": 0}
         )
 
         # Create lookup dictionary
-        doc_map = {d["protocolSection"]["identificationModule"]["nctId"]: d for d in docs}
+        facets_map = {record["nctId"]: decode_trial_facets(record) for record in records}
+
+        # Fall back to the source documents for trials not materialized yet
+        missing_ids = [nct_id for nct_id in nct_ids if nct_id not in facets_map]
+        if missing_ids:
+            docs = await provider_registry.trials_dao.find(
+                "t2dm_data_preprocessed",
+                {"protocolSection.identificationModule.nctId": {"$in": missing_ids}},
+                FACET_SOURCE_PROJECTION
+            )
+            facets_map |= {
+                d["protocolSection"]["identificationModule"]["nctId"]: extract_trial_facets(d["protocolSection"])
+                for d in docs
+            }
+            logger.debug(f"Derived facets of {len(docs)} trials missing from trial_facets")
 
         # Enrich each trial document
         for trial in trial_documents:
-            doc = doc_map.get(trial["nctId"])
-            if not doc:
+            facets = facets_map.get(trial["nctId"])
+            if not facets:
                 continue
 
-            protocol = doc["protocolSection"]
-            trial.update({
-                "locations": list({loc["country"] for loc in
-                                   protocol.get("contactsLocationsModule", {}).get("locations", [])}),
-                "phases": protocol.get("designModule", {}).get("phases", ["Unknown"]),
-                "enrollmentCount": protocol.get("designModule", {}).get("enrollmentInfo", {}).get("count", 0),
-                "startDate": protocol.get("statusModule", {}).get("startDateStruct", {}).get("date"),
-                "endDate": protocol.get("statusModule", {}).get("completionDateStruct", {}).get("date"),
-                "sponsorType": protocol.get("sponsorCollaboratorsModule", {}).get("leadSponsor", {}).get("class",
-                                                                                                         "Unknown")
-            })
+            trial.update(facets)
 
         response.update({
             "success": True,
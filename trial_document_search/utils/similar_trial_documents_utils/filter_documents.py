@@ -1,19 +1,32 @@
 from trial_document_search.utils.similar_trial_documents_utils.fetch_trial_filters import fetch_trial_filters
 from trial_document_search.utils.similar_trial_documents_utils.process_trial_filters import process_filters
-def filter_documents(unique_documents: dict, document_filters: dict) -> list:
+from observability.metrics import search_stage
+async def filter_documents(unique_documents: dict, document_filters: dict, trial_facets: dict = None) -> tuple:
     """
     Filter documents based on additional filters.
 
+    If the facets of the documents cannot be fetched, the documents are returned unfiltered and the
+    filtering is reported as degraded, so that the results are not cached.
+
     Args:
         unique_documents (dict): Dictionary of unique documents.
         document_filters (dict): Dictionary containing filters to apply on documents.
+        trial_facets (dict, optional): nctId -> facets already fetched for these documents (e.g. once for
+            every search of a batch). Skips the facets query when given.
 
     Returns:
-        list: List of filtered documents.
+        tuple: (list of filtered documents, whether the filter enrichment failed)
     """
-    fetch_add_documents_filter_response = fetch_trial_filters(trial_documents=list(unique_documents.values()))
+    if trial_facets is not None:
+        trial_documents_with_filters = [doc | trial_facets.get(doc["nctId"], {}) for doc in unique_documents.values()]
+        with search_stage("process_filters"):
+            return process_filters(documents=trial_documents_with_filters, filters=document_filters), False
+
+    with search_stage("filter_enrichment"):
+        fetch_add_documents_filter_response = await fetch_trial_filters(trial_documents=list(unique_documents.values()))
     if fetch_add_documents_filter_response["success"]:
         trial_documents_with_filters = fetch_add_documents_filter_response["data"]
-        trial_documents = process_filters(documents=trial_documents_with_filters, filters=document_filters)
-        return trial_documents
-    return list(unique_documents.values())
\ No newline at end of file
+        with search_stage("process_filters"):
+            trial_documents = process_filters(documents=trial_documents_with_filters, filters=document_filters)
+        return trial_documents, False
+    return list(unique_documents.values()), True
\ No newline at end of file
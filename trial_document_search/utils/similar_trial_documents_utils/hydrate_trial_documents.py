@@ -0,0 +1,41 @@
+import os
+from providers.provider_registry import provider_registry
+from trial_document_search.utils.logger_setup import logger
+
+# Fields of t2dm_final_data_samples_processed returned with a trial: its title and the sections it is scored on
+DEFAULT_DOCUMENT_FIELDS = ("officialTitle", "conditions", "inclusionCriteria", "exclusionCriteria", "primaryOutcomes")
+
+async def hydrate_trial_documents(trial_documents: list, fields: list = None) -> tuple:
+    """
+    Attach the trial document to each of the given (already ranked) results with a single query.
+
+    Only the results actually returned to the caller should be hydrated. The input items are not
+    modified, so the lightweight results stored for the ECID stay free of full trial documents.
+
+    Args:
+        trial_documents (list): Ranked trial results containing at least an "nctId".
+        fields (list, optional): Document fields to project. Defaults to the comma-separated
+            HYDRATE_DOCUMENT_FIELDS environment variable, or DEFAULT_DOCUMENT_FIELDS when unset.
+
+    Returns:
+        tuple: (copies of the results with a "document" key (None if the trial document is missing),
+               whether the trial documents could not be read)
+    """
+    if fields is None:
+        fields = [field.strip() for field in os.getenv("HYDRATE_DOCUMENT_FIELDS", "").split(",") if field.strip()]
+    projection = {"_id": 0, "nctId": 1, **{field: 1 for field in fields or DEFAULT_DOCUMENT_FIELDS}}
+
+    degraded = False
+    try:
+        docs = await provider_registry.trials_dao.find(
+            "t2dm_final_data_samples_processed",
+            {"nctId": {"$in": [trial["nctId"] for trial in trial_documents]}},
+            projection
+        )
+    except Exception as e:
+        logger.error(f"Failed to hydrate trial documents: {e}")
+        docs = []
+        degraded = True
+
+    doc_map = {doc["nctId"]: doc for doc in docs}
+    return [{**trial, "document": doc_map.get(trial["nctId"])} for trial in trial_documents], degraded
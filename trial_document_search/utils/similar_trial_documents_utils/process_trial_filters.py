@@ -1,43 +1,90 @@
+import numpy as np
 from trial_document_search.utils.logger_setup import logger
+from trial_document_search.utils.similar_trial_documents_utils.extract_trial_facets import SPONSOR_CODES, date_to_ordinal
+
+# Stand-in for missing dates and enrollment counts; it never falls inside a requested range
+MISSING_VALUE = -1
+
+
+def _bitsets(values_per_document: list, vocabulary: list) -> np.ndarray:
+    """Encodes each document's values as a bitset over `vocabulary` (one uint64 word per 64 values)."""
+    positions = {value: position for position, value in enumerate(vocabulary)}
+    bitsets = np.zeros((len(values_per_document), max(1, (len(vocabulary) + 63) // 64)), dtype=np.uint64)
+    for row, values in enumerate(values_per_document):
+        for value in values or []:
+            position = positions.get(value)
+            if position is not None:
+                bitsets[row, position // 64] |= np.uint64(1 << (position % 64))
+    return bitsets
+
+
+def _matches_any(bitsets: np.ndarray, required: np.ndarray) -> np.ndarray:
+    return ((bitsets & required) != 0).any(axis=1)
+
+
+def _matches_all(bitsets: np.ndarray, required: np.ndarray) -> np.ndarray:
+    return ((bitsets & required) == required).all(axis=1)
+
+
+def _ordinals(dates: list) -> np.ndarray:
+    ordinals = (date_to_ordinal(date) for date in dates)
+    return np.fromiter((MISSING_VALUE if ordinal is None else ordinal for ordinal in ordinals),
+                       dtype=np.int64, count=len(dates))
 
 
 def process_filters(documents: list, filters: dict) -> list:
-    """Filter documents based on multiple criteria with different logics."""
+    """Filter documents based on multiple criteria with different logics.
+
+    Only the facets of active filters are laid out as columns: phase and country bitsets over the
+    requested values, sponsor codes, integer date ordinals and enrollment counts. Every filter is then
+    evaluated as a vectorized boolean mask. Dates are compared as ordinals, so partial dates such as
+    "2019-05" (read as 2019-05-01) compare correctly. A document missing a facet that an active filter
+    needs does not pass that filter.
+    """
     try:
-        def passes_phases(doc):
-            return not filters['phases'] or any(p in filters['phases'] for p in doc['phases'])
+        mask = np.ones(len(documents), dtype=bool)
 
-        def passes_locations(doc):
-            if not filters['locations']:
-                return True
+        if filters['phases']:
+            requested = list(filters['phases'])
+            phases = _bitsets([doc.get('phases') for doc in documents], requested)
+            mask &= _matches_any(phases, _bitsets([requested], requested)[0])
+
+        if filters['locations']:
+            requested = list(filters['locations'])
+            countries = _bitsets([doc.get('locations') for doc in documents], requested)
+            required = _bitsets([requested], requested)[0]
             if filters['countryLogic'] == 'AND':
-                return all(loc in doc['locations'] for loc in filters['locations'])
-            return any(loc in doc['locations'] for loc in filters['locations'])
-
-        def passes_sponsor(doc):
-            return not filters['sponsorType'] or doc['sponsorType'] == filters['sponsorType']
-
-        def passes_dates(doc):
-            if not (filters['startDate'] and filters['endDate']):
-                return True
-            return (filters['startDate'] <= doc['startDate'] <= filters['endDate'] and
-                    filters['startDate'] <= doc['endDate'] <= filters['endDate'])
-
-        def passes_sample_size(doc):
-            if None in (filters['sampleSizeMin'], filters['sampleSizeMax']):
-                return True
-            return filters['sampleSizeMin'] <= doc['enrollmentCount'] <= filters['sampleSizeMax']
-
-        filtered = [
-            doc for doc in documents
-            if all([ passes_phases(doc), passes_locations(doc), passes_sponsor(doc), passes_dates(doc),
-                passes_sample_size(doc)
-            ])
-        ]
+                mask &= _matches_all(countries, required)
+            else:
+                mask &= _matches_any(countries, required)
+
+        if filters['sponsorType']:
+            sponsor_codes = dict(SPONSOR_CODES)
+            sponsor_codes.setdefault(filters['sponsorType'], len(sponsor_codes))
+            sponsors = np.fromiter((sponsor_codes.get(doc.get('sponsorType'), MISSING_VALUE) for doc in documents),
+                                   dtype=np.int64, count=len(documents))
+            mask &= sponsors == sponsor_codes[filters['sponsorType']]
+
+        if filters['startDate'] and filters['endDate']:
+            window_start = date_to_ordinal(filters['startDate'])
+            window_end = date_to_ordinal(filters['endDate'])
+            start_dates = _ordinals([doc.get('startDate') for doc in documents])
+            end_dates = _ordinals([doc.get('endDate') for doc in documents])
+            mask &= (window_start <= start_dates) & (start_dates <= window_end)
+            mask &= (window_start <= end_dates) & (end_dates <= window_end)
+
+        if None not in (filters['sampleSizeMin'], filters['sampleSizeMax']):
+            enrollment = np.fromiter(
+                (MISSING_VALUE if doc.get('enrollmentCount') is None else doc['enrollmentCount'] for doc in documents),
+                dtype=np.int64, count=len(documents)
+            )
+            mask &= (filters['sampleSizeMin'] <= enrollment) & (enrollment <= filters['sampleSizeMax'])
+
+        filtered = [doc for doc, passes in zip(documents, mask) if passes]
 
         logger.debug(f"Filtered {len(filtered)} documents")
         return filtered
 
     except Exception as e:
         logger.error(f"Failed to apply filters: {e}")
-        return documents
\ No newline at end of file
+        return documents
@@ -0,0 +1,63 @@
+from trial_document_search.utils.logger_setup import logger
+from observability.metrics import record_candidates, search_stage
+from trial_document_search.utils.search_result_cache import search_result_cache
+from trial_document_search.utils.similar_trial_documents_utils.calculate_weighted_similarity_scores import calculate_weighted_similarity_scores
+from trial_document_search.utils.similar_trial_documents_utils.rank_trial_documents import rank_trial_documents
+
+
+async def rank_search_results(trial_documents: list, documents_search_keys: dict, custom_weights: dict,
+                              embedding_bundle: dict = None, embedding_documents: dict = None) -> dict:
+    """
+    Score the filtered candidates of a search and keep the 100 best, ranked by weighted similarity score.
+
+    Shared by the single and the batch document search, so that both rank and report results alike.
+
+    Args:
+        trial_documents (list): Filtered candidate trial documents.
+        documents_search_keys (dict): Dictionary containing search keys for documents.
+        custom_weights (dict): Dictionary containing custom weights for similarity score calculation.
+        embedding_bundle (dict, optional): Precomputed section embeddings from `build_embedding_bundle`.
+        embedding_documents (dict, optional): Embedding documents prefetched with `fetch_embedding_documents`.
+
+    Returns:
+        dict: Response dictionary with success status, message and the ranked trial documents.
+    """
+    if not trial_documents:
+        return {"success": True, "message": "No Documents Found matching criteria.", "data": []}
+
+    with search_stage("scoring"):
+        scores_response = await calculate_weighted_similarity_scores(trial_documents, documents_search_keys,
+                                                                     custom_weights, embedding_bundle,
+                                                                     embedding_documents)
+    if not scores_response["success"]:
+        return {"success": False, "message": scores_response["message"], "data": None}
+    logger.debug("Calculated similarity scores")
+
+    with search_stage("sort"):
+        ranked_documents = rank_trial_documents(trial_documents, k=100)
+    record_candidates("ranked", len(ranked_documents))
+    return {"success": True, "message": "Successfully fetched similar documents extended.", "data": ranked_documents}
+
+
+def cache_search_results(cache_key: str, trial_documents: list, response: dict, degraded: bool = False) -> None:
+    """
+    Store a successful search in the search result cache.
+
+    Degraded searches (a criterion or the filter enrichment failed) are answered but not cached, so that
+    a short dependency outage is not served for the whole cache lifetime.
+
+    Args:
+        cache_key (str): Cache key of the search (see `SearchResultCache.make_key`).
+        trial_documents (list): Ranked trial documents of the search.
+        response (dict): The search response.
+        degraded (bool, optional): Whether the search ran degraded.
+    """
+    if not response["success"]:
+        return
+    if degraded:
+        logger.warning("Degraded document search: results will not be cached")
+        return
+    search_result_cache.set(cache_key, {
+        "trial_documents": trial_documents,
+        "response": {key: response[key] for key in ("success", "message", "data")},
+    })
@@ -0,0 +1,18 @@
+import heapq
+
+
+def rank_trial_documents(trial_documents: list, k: int = 100) -> list:
+    """
+    Select the k best scored trial documents, in descending order of weighted similarity score.
+
+    Only the top k are ordered (a bounded heap, O(n log k)) instead of sorting every candidate.
+    Ties keep their candidate order, exactly as a stable full sort would.
+
+    Args:
+        trial_documents (list): Scored trial documents.
+        k (int, optional): Number of documents to keep. Defaults to 100.
+
+    Returns:
+        list: The top k trial documents, best first.
+    """
+    return heapq.nlargest(k, trial_documents, key=lambda trial_item: trial_item["weighted_similarity_score"])
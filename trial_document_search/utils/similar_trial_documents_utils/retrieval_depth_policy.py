@@ -0,0 +1,111 @@
+import os
+
+# Score spread between the best and the last match below which the cut-off is considered arbitrary
+FLAT_SCORE_SPREAD = 0.05
+# Score gap to the best match beyond which matches are dropped when the top results dominate
+DOMINANT_SCORE_GAP = 0.15
+# Depth multiplier for filtered searches whose filters are only applied after retrieval
+RESTRICTIVE_FILTER_FACTOR = 2
+
+
+class RetrievalDepthPolicy:
+    """
+    Chooses the top-k of the Pinecone query of each criterion of a search.
+
+    With ADAPTIVE_TOP_K disabled (the default) every criterion is queried at RETRIEVAL_TOP_K (30).
+    Enabled, the depth adapts to the query:
+
+    - other queries start with a shallow probe of ADAPTIVE_TOP_K_MIN matches. When its last match
+      already scores more than DOMINANT_SCORE_GAP below the best, every deeper match would be trimmed
+      (see below), so the probe is kept. Otherwise the query is repeated at RETRIEVAL_TOP_K;
+    - restrictive filters that are only applied after retrieval start the query deeper, since most
+      matches will be filtered out;
+    - a flat score distribution (the last match scores within FLAT_SCORE_SPREAD of the best) doubles
+      the depth and queries again, as equally good trials lie beyond the cut-off;
+    - when the top results dominate, matches scoring more than DOMINANT_SCORE_GAP below the best are
+      dropped, down to ADAPTIVE_TOP_K_MIN, so that fewer weak candidates are scored.
+
+    Depth beyond RETRIEVAL_TOP_K is drawn from a budget of ADAPTIVE_TOP_K_BUDGET matches per search,
+    split into equal fixed shares, one per criterion. One policy is created per criterion, so the
+    depth of a criterion never depends on how fast the other criteria of the search complete.
+    """
+
+    def __init__(self, enabled: bool = None, base_k: int = None, min_k: int = None, max_k: int = None,
+                 budget: int = None, shares: int = 1) -> None:
+        """
+        Args:
+            enabled (bool, optional): Whether the depth adapts (ADAPTIVE_TOP_K, default false).
+            base_k (int, optional): Default depth (RETRIEVAL_TOP_K, default 30).
+            min_k (int, optional): Smallest depth results are trimmed to (ADAPTIVE_TOP_K_MIN, default 10).
+            max_k (int, optional): Largest depth of a query (ADAPTIVE_TOP_K_MAX, default 120).
+            budget (int, optional): Matches beyond the default depth available to the whole search
+                (ADAPTIVE_TOP_K_BUDGET, default 180).
+            shares (int, optional): Number of equal shares the budget is split into; the policy gets one.
+        """
+        self.enabled = enabled if enabled is not None else os.getenv("ADAPTIVE_TOP_K", "false").lower() == "true"
+        self.base_k = base_k if base_k is not None else int(os.getenv("RETRIEVAL_TOP_K", "30"))
+        self.min_k = min(self.base_k, min_k if min_k is not None else int(os.getenv("ADAPTIVE_TOP_K_MIN", "10")))
+        self.max_k = max(self.base_k, max_k if max_k is not None else int(os.getenv("ADAPTIVE_TOP_K_MAX", "120")))
+        budget = budget if budget is not None else int(os.getenv("ADAPTIVE_TOP_K_BUDGET", "180"))
+        self.remaining_budget = budget // max(1, shares)
+
+    def _deepen(self, k: int, wanted: int) -> int:
+        """Raises the depth from `k` towards `wanted`, within the maximum depth and the remaining budget."""
+        extra = max(0, min(wanted, self.max_k) - k)
+        extra = min(extra, self.remaining_budget)
+        self.remaining_budget -= extra
+        return k + extra
+
+    def initial_depth(self, restrictive_filters: bool = False) -> int:
+        """
+        Returns the depth of the first query of a criterion.
+
+        Args:
+            restrictive_filters (bool, optional): Whether filters will drop matches after retrieval.
+
+        Returns:
+            int: The top-k to query.
+        """
+        if not self.enabled:
+            return self.base_k
+        if not restrictive_filters:
+            return self.min_k
+        return self._deepen(self.base_k, self.base_k * RESTRICTIVE_FILTER_FACTOR)
+
+    def next_depth(self, scores: list, k: int) -> int | None:
+        """
+        Returns the depth to query again at, if the scores of the last query call for a deeper one.
+
+        Args:
+            scores (list): Scores of the matches of the last query, best first.
+            k (int): Depth of the last query.
+
+        Returns:
+            int | None: The deeper top-k, or None to keep the matches.
+        """
+        # Fewer matches than requested means the index (or the pushed down filter) is exhausted
+        if not self.enabled or len(scores) < k:
+            return None
+        if k < self.base_k:
+            # A probe whose last match is outside the dominant gap already holds every match `trim` keeps
+            return None if scores[0] - scores[-1] > DOMINANT_SCORE_GAP else self.base_k
+        if scores[0] - scores[-1] > FLAT_SCORE_SPREAD:
+            return None
+        deeper = self._deepen(k, k * 2)
+        return deeper if deeper > k else None
+
+    def trim(self, matches: list) -> list:
+        """
+        Drops the tail of the matches when the top results dominate.
+
+        Args:
+            matches (list): Query matches, best first.
+
+        Returns:
+            list: The matches to keep, best first.
+        """
+        if not self.enabled or len(matches) <= self.min_k:
+            return matches
+        cutoff = matches[0]["score"] - DOMINANT_SCORE_GAP
+        kept = sum(1 for match in matches if match["score"] >= cutoff)
+        return matches[:max(kept, self.min_k)]
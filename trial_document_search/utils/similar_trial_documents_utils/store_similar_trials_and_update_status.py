@@ -1,35 +1,45 @@
-from database.trial_analysis.store_similar_trials import store_similar_trials
-from database.trial_analysis.update_workflow_status import update_workflow_status
+from database.trial_analysis.store_similar_trials import build_similar_trials_document
+from database.trial_analysis.job_status import job_update_query
+from database.trial_analysis.write_behind_queue import bookkeeping_writer
 from trial_document_search.utils.logger_setup import logger
 from datetime import datetime
-from database.trial_analysis.job_status import update_job
 
-def store_similar_trials_and_update_status(user_data: dict, user_inputs: dict, trial_documents: list, final_response: dict) -> None:
+async def store_similar_trials_and_update_status(user_data: dict, user_inputs: dict, trial_documents: list, final_response: dict) -> None:
     """
     Store similar trials and update workflow status.
 
+    The writes are queued on the write-behind queue, so the response does not wait for them. The
+    workflow state and the job log are only updated once the results are stored; if the results
+    cannot be stored, the job log records the search as failed instead.
+
     Args:
         user_data (dict): Dictionary containing user-specific data.
         user_inputs (dict): Dictionary containing user inputs.
         trial_documents (list): List of trial documents.
         final_response (dict): Dictionary containing final response.
     """
-    db_response = store_similar_trials(
-        user_name=user_data["userName"],
-        ecid=user_data["ecid"],
-        user_input=user_inputs,
-        similar_trials=trial_documents,
-    )
-    status_response = update_workflow_status(ecid=user_data["ecid"], step="trial-services")
-    logger.debug(status_response)
-    logger.debug(db_response)
+    ecid = user_data["ecid"]
+
     # Update Job Log Status
     update_values = {"documentSearch.completionStatus": True,
                      "documentSearch.success": final_response["success"],
                      "documentSearch.finishedAt": datetime.now(),
                      "documentSearch.message": final_response["message"],
                      }
-    update_status_response = update_job(ecid=user_data["ecid"],
-                                        job_id=1,
-                                        update_fields=update_values)
-    logger.debug(update_status_response["message"])
\ No newline at end of file
+    failure_values = {**update_values,
+                      "documentSearch.success": False,
+                      "documentSearch.message": "Failed to store similar trials results",
+                      }
+
+    await bookkeeping_writer.insert(
+        "similar_trials_results",
+        build_similar_trials_document(user_data["userName"], ecid, user_inputs, trial_documents),
+        then=[
+            ("workflow-states", {"ecid": ecid, "step": "trial-services"}, {"status": "completed", "updatedAt": datetime.now()}),
+            ("job_status", job_update_query(ecid, 1, update_values), {**update_values, "updatedAt": datetime.now()}),
+        ],
+        otherwise=[
+            ("job_status", job_update_query(ecid, 1, failure_values), {**failure_values, "updatedAt": datetime.now()}),
+        ],
+    )
+    logger.debug(f"Queued similar trials results and status updates for ECID: {ecid}")